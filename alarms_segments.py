@@ -1,61 +1,72 @@
+import argparse
 import pandas as pd
 from pathlib import Path
-from datetime import timedelta, datetime
+
+from segments import empty_state, load_state, save_state, update_segments
+from storage import locate_table, read_table, write_table
+from timestamps import to_local
 
 # Пути к файлам
 input_dir = Path('final_data')
 alarms_file = input_dir / 'alarms_optimized.csv'
 alarms_segments_file = input_dir / 'alarms_segments.csv'
+# Состояние онлайн-детектора: последняя обработанная минута и открытые алармы
+alarms_state_file = input_dir / 'alarms_state.json'
+
+alarm_cols = ['MIDDLE_LEVEL_ALARM', 'HIGH_LEVEL_ALARM', 'BURNER_HIGH_ALARM', 'HOPPER_FULL_ALARM',
+              'LOW_AIR_PRESSURE_ALARM', 'GENERAL_ALARM', 'AIR_OVERHEATED']
+
+parser = argparse.ArgumentParser(description='Построение отрезков активности алармов')
+parser.add_argument('--incremental', action='store_true',
+                    help=f'обработать только строки новее состояния {alarms_state_file} и обновить таблицу отрезков')
+parser.add_argument('--source', default=str(alarms_file),
+                    help='таблица с флагами алармов: минутная (по умолчанию) или посекундная alarms.csv')
+args = parser.parse_args()
+
+# Без сохраненного состояния или таблицы отрезков строим все заново
+incremental = args.incremental and alarms_state_file.exists() and locate_table(alarms_segments_file).exists()
+state = load_state(alarms_state_file) if incremental else empty_state()
 
-# Читаем данные
-alarms_df = pd.read_csv(alarms_file)
-alarms_df['DateTime'] = pd.to_datetime(alarms_df['Date'] + ' ' + alarms_df['Time'], format='%d-%m-%Y %H:%M:%S', errors='coerce') + timedelta(hours=3)
+# Читаем только нужные колонки. Отрезки ищутся по меткам в поясе данных,
+# в местное время переводятся только границы готовых отрезков
+alarms_df = read_table(args.source, columns=['DateTime'] + alarm_cols)
 alarms_df = alarms_df.dropna(subset=['DateTime'])
 
-# Преобразуем 'true'/'false' в 1/0
-alarm_cols = ['MIDDLE_LEVEL_ALARM', 'HIGH_LEVEL_ALARM', 'BURNER_HIGH_ALARM', 'HOPPER_FULL_ALARM', 
-              'LOW_AIR_PRESSURE_ALARM', 'GENERAL_ALARM', 'AIR_OVERHEATED']
-for col in alarm_cols:
-    alarms_df[col] = alarms_df[col].map({'true': 1, 'false': 0}).fillna(0).astype(int)
-
-# Функция для создания отрезков
-def process_alarms(df):
-    segments = []
-    
-    for col in alarm_cols:
-        active = False
-        start_time = None
-        prev_time = None
-        
-        for index, row in df.iterrows():
-            if row[col] == 1 and not active:
-                start_time = row['DateTime']
-                active = True
-            elif row[col] == 0 and active:
-                end_time = prev_time if prev_time else row['DateTime']
-                duration = (end_time - start_time).total_seconds() / 60  # в минутах
-                segments.append({'Alarm_Type': col, 'Start': start_time, 'End': end_time, 'Duration': duration})
-                active = False
-            prev_time = row['DateTime']
-        
-        if active:  # Если аларм не закончился
-            end_time = df['DateTime'].iloc[-1]
-            duration = (end_time - start_time).total_seconds() / 60
-            segments.append({'Alarm_Type': col, 'Start': start_time, 'End': end_time, 'Duration': duration})
-    
-    return pd.DataFrame(segments)
-
-# Создаём таблицу сегментов
-alarms_segments = process_alarms(alarms_df)
+# Отрезки активности всех алармов за один проход, пропуски флагов считаем
+# неактивными. Открытые отрезки остаются в состоянии до следующего запуска
+closed, opened, new_state = update_segments(state, alarms_df, alarm_cols)
+new_segments = pd.concat([closed, opened], ignore_index=True)
+for col in ['Start', 'End']:
+    new_segments[col] = to_local(new_segments[col])  # UTC -> местное время
+
+if incremental:
+    # Из прежней таблицы убираем отрезки, которые были открыты: они пришли заново
+    alarms_segments = read_table(alarms_segments_file)
+    alarms_segments['Start'] = pd.to_datetime(alarms_segments['Start'])
+    alarms_segments['End'] = pd.to_datetime(alarms_segments['End'])
+    previous_open = pd.Series(list(state['open'].values()), dtype='datetime64[ns]')
+    previous_open = set(zip(state['open'], to_local(previous_open)))
+    kept = [key not in previous_open for key in zip(alarms_segments['Alarm_Type'], alarms_segments['Start'])]
+    alarms_segments = pd.concat([alarms_segments[kept], new_segments], ignore_index=True)
+    print(f"Продолжение с {state['last_time']}: закрыто отрезков {len(closed)}")
+else:
+    alarms_segments = new_segments
+
+# Порядок как при полном построении: по типу аларма, внутри типа - по началу
+order = alarms_segments['Alarm_Type'].astype(str).map({col: i for i, col in enumerate(alarm_cols)})
+alarms_segments = alarms_segments.assign(order=order).sort_values(['order', 'Start'], kind='stable')
+alarms_segments = alarms_segments.drop(columns='order').reset_index(drop=True)
 
 # Сохраняем в CSV
 if not alarms_segments.empty:
-    alarms_segments.to_csv(alarms_segments_file, index=False)
-    print(f"Сегменты алармов сохранены в {alarms_segments_file}")
+    output_path = write_table(alarms_segments, alarms_segments_file)
+    print(f"Сегменты алармов сохранены в {output_path}")
     print(alarms_segments.head())
 else:
     print("Нет данных для создания сегментов алармов.")
+save_state(new_state, alarms_state_file)
+print(f"Открытых алармов: {len(opened)}, состояние сохранено в {alarms_state_file}")
 
 # Пример вывода первых 5 строк
 print(f"Первые 5 строк из {alarms_segments_file}:")
-print(alarms_segments.head().to_string())
\ No newline at end of file
+print(alarms_segments.head().to_string())
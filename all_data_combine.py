@@ -1,6 +1,17 @@
+import argparse
+import numpy as np
 import pandas as pd
+from datetime import timedelta
 from pathlib import Path
 
+from clock_offset import align_perten
+from combine_state import (empty_state, gap_ranges, interpolate_gaps, match_free_rows, range_rows, resume,
+                           sample_keys, save_state, state_file)
+from drop_mass import row_bin_volume
+from matching import grain_status
+from modes import mode_intervals, resolve_mode
+from storage import read_table, write_table
+
 # Пути к файлам
 input_dir = Path('input')
 output_dir = Path('output')
@@ -9,29 +20,41 @@ moistures_file = input_dir / 'moistures_temps_v1.csv'
 perten_file = input_dir / 'perten_data_v3.csv'
 mode_file = input_dir / 'mode_optimized.csv'
 output_file = output_dir / 'moistures_temps_mass.csv'
+mode_intervals_file = output_dir / 'mode_intervals.csv'
 
-# Создаем выходную директорию
-output_dir.mkdir(parents=True, exist_ok=True)
+# Максимальная разница во времени между пробой Perten и строкой сушилки
+match_tolerance = timedelta(hours=1)
 
-# Загружаем данные
-moistures_df = pd.read_csv(moistures_file)
-perten_df = pd.read_csv(perten_file)
-mode_df = pd.read_csv(mode_file)
+parser = argparse.ArgumentParser(description='Объединение минут сушилки с пробами Perten')
+parser.add_argument('--incremental', action='store_true',
+                    help='подставить только новые пробы Perten и новые строки сушилки, '
+                         'пересчитав интерполяцию лишь в затронутых промежутках')
+args = parser.parse_args()
 
-# Функция преобразования даты и времени
-def parse_time(df):
-    return pd.to_datetime(df['Date'] + ' ' + df['Time'], format='%d-%m-%Y %H:%M:%S', errors='coerce')
+# Создаем выходную директорию
+output_dir.mkdir(parents=True, exist_ok=True)
 
-# Преобразуем дату-время
-moistures_df['DateTime'] = parse_time(moistures_df)
-perten_df['DateTime'] = parse_time(perten_df)
-mode_df['DateTime'] = parse_time(mode_df)
+# Загружаем данные (DateTime строится при чтении), из режимов - только нужные колонки
+mode_columns = ['FILLING', 'DRYING', 'RECYCLING', 'EMPTY', 'SHUTDOWN', 'STOP', 'COOLING', 'MANUAL']
+moistures_df = read_table(moistures_file)
+perten_df = read_table(perten_file)
+mode_df = read_table(mode_file, columns=['DateTime'] + mode_columns)
 
 # Удаляем некорректные даты и сортируем
 moistures_df = moistures_df.dropna(subset=['DateTime']).sort_values('DateTime').reset_index(drop=True)
 perten_df = perten_df.dropna(subset=['DateTime']).sort_values('DateTime').reset_index(drop=True)
 mode_df = mode_df.dropna(subset=['DateTime']).sort_values('DateTime').reset_index(drop=True)
 
+# Ключ пробы строится по времени на часах Perten, до сдвига в date_back и сверки часов
+perten_df['sample_key'] = sample_keys(perten_df)
+
+# Сверяем часы Perten с показаниями, записанными сушилкой: если они расходятся,
+# метки Perten переводятся на часы сушилки с учетом дрейфа
+perten_df, estimate, resorted = align_perten(perten_df, moistures_df)
+if estimate is not None:
+    print(f"Часы Perten сдвинуты на {estimate['offset']:.0f} с (пар показаний: {estimate['pairs']}), "
+          f"строк переставлено: {resorted}")
+
 # Переименовываем колонки в perten_df
 perten_df = perten_df.rename(columns={
     'Grain': 'perten_Grain',
@@ -40,105 +63,108 @@ perten_df = perten_df.rename(columns={
     'Temp': 'perten_Temperature'
 })
 
-# Функция классификации зерна
-def classify_grain(row):
-    grain = row['perten_Grain'].lower() if isinstance(row['perten_Grain'], str) else ''
-    moisture = row['perten_Moisture']
-
-    if grain == 'raps':
-        if moisture > 9.5:
-            return 'wet'
-        elif 7 <= moisture <= 9.5:
-            return 'dry'
-        else:
-            return 'overdry'
-    else:
-        if moisture > 14.5:
-            return 'wet'
-        elif 12 <= moisture <= 14.5:
-            return 'dry'
-        else:
-            return 'overdry'
-
-# Создаем копию moistures_df
-combined_df = moistures_df.copy()
+# Прежний результат и состояние: при --incremental обрабатываются только новые
+# строки сушилки и новые пробы, иначе все строится заново
+state, previous = empty_state(), None
+if args.incremental:
+    state, previous = resume(output_file, moistures_df['DateTime'], perten_df['sample_key'])
+    if previous is None:
+        print("Состояние объединения не подходит к данным, строим заново")
+first_new = state['rows']
+
+# Новые строки сушилки с пустыми колонками проб
+new_rows = moistures_df.iloc[first_new:].copy()
 
 # Добавляем колонки для сухого и влажного зерна
 for col in ['Grain', 'Moisture', 'Nature', 'Temperature']:
-    combined_df[f'perten_dry_{col}'] = ''
-    combined_df[f'perten_wet_{col}'] = ''
-
-combined_df['tested'] = ''  # Добавляем колонку tested
-
-# Отслеживаем использованные индексы
-used_perten = set()
+    new_rows[f'perten_dry_{col}'] = ''
+    new_rows[f'perten_wet_{col}'] = ''
 
-# Подстановка данных Perten
-for p_idx, p_row in perten_df.iterrows():
-    if p_idx in used_perten:
-        continue
+new_rows['tested'] = ''  # Добавляем колонку tested
 
-    available = combined_df[combined_df['perten_dry_Grain'] == '']
-    if available.empty:
-        break
-
-    time_diff = (available['DateTime'] - p_row['DateTime']).abs()
-    closest_idx = time_diff.idxmin()
-
-    grain_status = classify_grain(p_row)
-
-    if grain_status in ['dry', 'overdry']:
-        combined_df.at[closest_idx, 'perten_dry_Grain'] = p_row['perten_Grain']
-        combined_df.at[closest_idx, 'perten_dry_Moisture'] = p_row['perten_Moisture']
-        combined_df.at[closest_idx, 'perten_dry_Nature'] = p_row['perten_Nature']
-        combined_df.at[closest_idx, 'perten_dry_Temperature'] = p_row['perten_Temperature']
-    else:  # wet
-        combined_df.at[closest_idx, 'perten_wet_Grain'] = p_row['perten_Grain']
-        combined_df.at[closest_idx, 'perten_wet_Moisture'] = p_row['perten_Moisture']
-        combined_df.at[closest_idx, 'perten_wet_Nature'] = p_row['perten_Nature']
-        combined_df.at[closest_idx, 'perten_wet_Temperature'] = p_row['perten_Temperature']
-
-    combined_df.at[closest_idx, 'tested'] = 'real'
-    used_perten.add(p_idx)
+# Добавляем колонку `mode`
+new_rows = new_rows.merge(mode_df[['DateTime'] + mode_columns], on='DateTime', how='left')
 
-# Заполнение пропущенных значений интерполяцией
-for col in ['perten_dry_Moisture', 'perten_dry_Nature', 'perten_dry_Temperature',
-            'perten_wet_Moisture', 'perten_wet_Nature', 'perten_wet_Temperature']:
-    combined_df[col] = pd.to_numeric(combined_df[col], errors='coerce')
-    combined_df[col] = combined_df[col].interpolate(method='linear', limit_direction='both')
+# Определяем `mode` по первому `True` в порядке приоритета флагов
+new_rows['mode'] = resolve_mode(new_rows, mode_columns)
 
-# Округляем до 3 знаков после запятой
-for col in ['perten_dry_Moisture', 'perten_dry_Nature', 'perten_dry_Temperature',
-            'perten_wet_Moisture', 'perten_wet_Nature', 'perten_wet_Temperature']:
-    combined_df[col] = combined_df[col].round(3)
+# Удаляем временные столбцы mode-файла
+new_rows.drop(columns=mode_columns, inplace=True)
+
+if previous is None:
+    combined_df = new_rows.reset_index(drop=True)
+else:
+    # Пустые значения прежней таблицы читаются как пропуски, категории - как строки,
+    # значения проб приводятся к float
+    for col in ['perten_dry_Grain', 'perten_wet_Grain', 'tested', 'mode']:
+        previous[col] = previous[col].astype(object).fillna('')
+    for col in ['Moisture', 'Nature', 'Temperature']:
+        previous[[f'perten_dry_{col}', f'perten_wet_{col}']] = previous[[f'perten_dry_{col}', f'perten_wet_{col}']].astype(float)
+    combined_df = pd.concat([previous, new_rows], ignore_index=True) if len(new_rows) else previous
+appended = np.arange(first_new, len(combined_df))
+
+# Подстановка новых проб Perten: каждая проба занимает ближайшую свободную строку,
+# пробы дальше match_tolerance от любой свободной строки не подставляются
+new_samples = perten_df[~perten_df['sample_key'].isin(state['samples'])]
+taken = [row for row, _ in state['samples'].values()]
+matches = match_free_rows(new_samples['DateTime'], combined_df['DateTime'], taken, match_tolerance)
+matched = new_samples[matches >= 0]
+rows = matches[matches >= 0]
+unmatched_count = int((matches < 0).sum())
+if unmatched_count:
+    print(f"Пробы Perten без строки сушилки в пределах {match_tolerance}: {unmatched_count}")
+
+is_dry = grain_status(matched['perten_Grain'], matched['perten_Moisture']) != 'wet'
+for prefix, mask in [('perten_dry', is_dry), ('perten_wet', ~is_dry)]:
+    for col in ['Grain', 'Moisture', 'Nature', 'Temperature']:
+        combined_df.loc[rows[mask], f'{prefix}_{col}'] = matched[f'perten_{col}'].to_numpy()[mask]
+combined_df.loc[rows, 'tested'] = 'real'
+state['samples'].update({key: [int(row), 'dry' if dry else 'wet']
+                         for key, row, dry in zip(matched['sample_key'], rows, is_dry)})
+
+# Заполнение пропущенных значений интерполяцией с округлением до 3 знаков.
+# Узлы - все подставленные пробы, пересчитываются только промежутки вокруг
+# новых проб и новых строк
+samples = pd.DataFrame([[key, row, kind] for key, (row, kind) in state['samples'].items()],
+                       columns=['sample_key', 'row', 'kind'])
+sample_values = perten_df.set_index('sample_key')
+gaps = {}
+for prefix, kind in [('perten_dry', 'dry'), ('perten_wet', 'wet')]:
+    kind_samples = samples[samples['kind'] == kind]
+    touched = np.concatenate([rows[is_dry if kind == 'dry' else ~is_dry], appended])
+    for col in ['Moisture', 'Nature', 'Temperature']:
+        values = pd.to_numeric(sample_values.loc[kind_samples['sample_key'], f'perten_{col}'], errors='coerce')
+        valid = values.notna().to_numpy()
+        knots = kind_samples['row'].to_numpy()[valid]
+        gaps[f'{prefix}_{col}'] = gap_ranges(knots, touched, len(combined_df))
+        combined_df[f'{prefix}_{col}'] = interpolate_gaps(combined_df[f'{prefix}_{col}'], knots,
+                                                          values.to_numpy()[valid], gaps[f'{prefix}_{col}'])
 
 # Заполняем `tested` у интерполированных значений
 combined_df['tested'] = combined_df['tested'].fillna('calculated')
 
-# Добавляем колонку `mode`
-combined_df = combined_df.merge(mode_df[['DateTime', 'FILLING', 'DRYING', 'RECYCLING', 'EMPTY',
-                                         'SHUTDOWN', 'STOP', 'COOLING', 'MANUAL']],
-                                on='DateTime', how='left')
-
-# Определяем `mode` по первому `True`
-def get_mode(row):
-    for col in ['FILLING', 'DRYING', 'RECYCLING', 'EMPTY', 'SHUTDOWN', 'STOP', 'COOLING', 'MANUAL']:
-        if row[col] is True:
-            return col
-    return ''
+# Отрезки режимов: по ним считаются часы работы в режимах за любой период
+if len(appended):
+    intervals_path = write_table(mode_intervals(combined_df), mode_intervals_file)
+    print(f"Отрезки режимов сохранены в {intervals_path}")
 
-combined_df['mode'] = combined_df.apply(get_mode, axis=1)
-
-# Удаляем временные столбцы mode-файла
-combined_df.drop(columns=['FILLING', 'DRYING', 'RECYCLING', 'EMPTY', 'SHUTDOWN', 'STOP', 'COOLING', 'MANUAL'],
-                 inplace=True)
+# Вычисляем массу drop (натура, умноженная на объем бункера сушилки)
+# в строках, где изменилась натура сухой пробы
+if 'drop_mass' not in combined_df.columns:
+    combined_df['drop_mass'] = np.nan
+mass_rows = range_rows(gaps['perten_dry_Nature'])
+combined_df.loc[mass_rows, 'drop_mass'] = (combined_df.loc[mass_rows, 'perten_dry_Nature']
+                                           * row_bin_volume(combined_df.loc[mass_rows])).round(3)
+print(f"Новых проб: {len(matched)}, новых строк: {len(appended)}, пересчитано строк: {len(mass_rows)}")
 
-# Вычисляем массу drop (nature * 497.2)
-combined_df['drop_mass'] = (combined_df['perten_dry_Nature'] * 497.2).round(3)
+# Состояние для следующего запуска
+state['rows'] = len(combined_df)
+state['last_row_time'] = combined_df['DateTime'].iloc[-1] if len(combined_df) else None
 
 # Удаляем `DateTime` перед сохранением
 combined_df = combined_df.drop(columns=['DateTime'])
 
 # Сохраняем результат
-combined_df.to_csv(output_file, index=False)
-print(f"Данные сохранены в {output_file}")
\ No newline at end of file
+output_path = write_table(combined_df, output_file)
+save_state(state, state_file(output_file))
+print(f"Данные сохранены в {output_path}")
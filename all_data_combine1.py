@@ -1,7 +1,17 @@
+import argparse
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from datetime import timedelta
 
+from drop_mass import drop_dry_mass
+from clock_offset import align_perten
+from combine_state import (empty_state, gap_ranges, interpolate_gaps, match_free_rows, range_rows, resume,
+                           row_runs, sample_keys, save_state, state_file)
+from matching import grain_status
+from modes import mode_intervals, resolve_mode
+from storage import read_table, write_table
+
 # Пути к файлам
 input_dir = Path('input')
 output_dir = Path('output')
@@ -10,29 +20,45 @@ moistures_file = input_dir / 'moistures_temps_v1.csv'
 perten_file = input_dir / 'perten_data_v3.csv'
 mode_file = input_dir / 'mode_optimized.csv'
 output_file = output_dir / 'moistures_temps_mass3.csv'
+# Свой файл отрезков: в mode_intervals.csv пишет all_data_combine, его таблица идет в final_data
+mode_intervals_file = output_dir / 'mode_intervals3.csv'
 
-# Создаем выходную директорию
-output_dir.mkdir(parents=True, exist_ok=True)
+# Максимальная разница во времени между пробой Perten и строкой сушилки
+match_tolerance = timedelta(hours=1)
+# Окно смены вида зерна: проба другого вида раньше этого срока после
+# предыдущей принятой пробы считается переходной
+grain_switch_window = timedelta(hours=2)
 
-# Загружаем данные
-moistures_df = pd.read_csv(moistures_file)
-perten_df = pd.read_csv(perten_file)
-mode_df = pd.read_csv(mode_file)
+parser = argparse.ArgumentParser(description='Объединение минут сушилки с пробами Perten и массой сухого зерна')
+parser.add_argument('--incremental', action='store_true',
+                    help='подставить только новые пробы Perten и новые строки сушилки, '
+                         'пересчитав интерполяцию и массы лишь в затронутых промежутках')
+args = parser.parse_args()
 
-# Функция преобразования даты и времени
-def parse_time(df):
-    return pd.to_datetime(df['Date'] + ' ' + df['Time'], format='%d-%m-%Y %H:%M:%S', errors='coerce')
+# Создаем выходную директорию
+output_dir.mkdir(parents=True, exist_ok=True)
 
-# Преобразуем дату-время
-moistures_df['DateTime'] = parse_time(moistures_df)
-perten_df['DateTime'] = parse_time(perten_df)
-mode_df['DateTime'] = parse_time(mode_df)
+# Загружаем данные (DateTime строится при чтении), из режимов - только нужные колонки
+mode_columns = ['FILLING', 'DRYING', 'RECYCLING', 'EMPTY', 'SHUTDOWN', 'STOP', 'COOLING', 'MANUAL']
+moistures_df = read_table(moistures_file)
+perten_df = read_table(perten_file)
+mode_df = read_table(mode_file, columns=['DateTime'] + mode_columns)
 
 # Удаляем некорректные даты и сортируем
 moistures_df = moistures_df.dropna(subset=['DateTime']).sort_values('DateTime').reset_index(drop=True)
 perten_df = perten_df.dropna(subset=['DateTime']).sort_values('DateTime').reset_index(drop=True)
 mode_df = mode_df.dropna(subset=['DateTime']).sort_values('DateTime').reset_index(drop=True)
 
+# Ключ пробы строится по времени на часах Perten, до сдвига в date_back и сверки часов
+perten_df['sample_key'] = sample_keys(perten_df)
+
+# Сверяем часы Perten с показаниями, записанными сушилкой: если они расходятся,
+# метки Perten переводятся на часы сушилки с учетом дрейфа
+perten_df, estimate, resorted = align_perten(perten_df, moistures_df)
+if estimate is not None:
+    print(f"Часы Perten сдвинуты на {estimate['offset']:.0f} с (пар показаний: {estimate['pairs']}), "
+          f"строк переставлено: {resorted}")
+
 # Переименовываем колонки в perten_df
 perten_df = perten_df.rename(columns={
     'Grain': 'perten_Grain',
@@ -41,121 +67,142 @@ perten_df = perten_df.rename(columns={
     'Temp': 'perten_Temperature'
 })
 
-# Функция классификации зерна
-def classify_grain(row):
-    grain = row['perten_Grain'].lower() if isinstance(row['perten_Grain'], str) else ''
-    moisture = row['perten_Moisture']
-    if grain == 'raps':
-        return 'wet' if moisture > 9.5 else 'dry' if 7 <= moisture <= 9.5 else 'overdry'
-    else:
-        return 'wet' if moisture > 14.5 else 'dry' if 12 <= moisture <= 14.5 else 'overdry'
+# Прежний результат и состояние: при --incremental обрабатываются только новые
+# строки сушилки и новые пробы, иначе все строится заново
+state, previous = empty_state(), None
+if args.incremental:
+    state, previous = resume(output_file, moistures_df['DateTime'], perten_df['sample_key'])
+    if previous is None:
+        print("Состояние объединения не подходит к данным, строим заново")
+first_new = state['rows']
 
-# Создаем копию moistures_df
-combined_df = moistures_df.copy()
+# Новые строки сушилки с пустыми колонками проб
+new_rows = moistures_df.iloc[first_new:].copy()
 
 # Добавляем колонки perten
 for col in ['Grain', 'Moisture', 'Nature', 'Temperature']:
-    combined_df[f'perten_dry_{col}'] = ''
-    combined_df[f'perten_wet_{col}'] = ''
-combined_df['tested'] = ''
-combined_df['dry_mass'] = 0.0
+    new_rows[f'perten_dry_{col}'] = ''
+    new_rows[f'perten_wet_{col}'] = ''
+new_rows['tested'] = ''
+new_rows['dry_mass'] = 0.0
+new_rows['GRAIN_TYPE'] = ''
 
-# Отслеживаем использованные индексы и последние данные
-used_perten = set()
-last_grain = None
-last_time = None
-
-# Подстановка данных Perten
-for p_idx, p_row in perten_df.iterrows():
-    if p_idx in used_perten:
-        continue
-
-    available = combined_df[combined_df['perten_dry_Grain'] == '']
-    if available.empty:
-        break
+# Объединяем с mode_df по DateTime
+new_rows = new_rows.merge(mode_df[['DateTime'] + mode_columns], on='DateTime', how='left')
 
-    time_diff = (available['DateTime'] - p_row['DateTime']).abs()
-    closest_idx = time_diff.idxmin()
+# Определяем `mode` по первому `True` в порядке приоритета флагов
+new_rows['mode'] = resolve_mode(new_rows, mode_columns)
 
-    # Проверка на 2 часа между разными типами зерна
-    if (last_grain and last_grain != p_row['perten_Grain'].lower() and 
-        last_time and (p_row['DateTime'] - last_time) < timedelta(hours=2)):
+# Удаляем временные столбцы из mode_df
+new_rows.drop(columns=mode_columns, inplace=True)
+
+# Подставленные пробы из состояния: ключ, строка, вид
+samples = pd.DataFrame([[key, row, kind] for key, (row, kind) in state['samples'].items()],
+                       columns=['sample_key', 'row', 'kind'])
+sample_values = perten_df.set_index('sample_key')
+
+if previous is None:
+    combined_df = new_rows.reset_index(drop=True)
+else:
+    # Виды зерна проб в результат не пишутся: восстанавливаем их по состоянию.
+    # Пустые значения читаются как пропуски, категории - как строки
+    for kind in ['dry', 'wet']:
+        previous[f'perten_{kind}_Grain'] = ''
+        kind_samples = samples[samples['kind'] == kind]
+        previous.loc[kind_samples['row'], f'perten_{kind}_Grain'] = \
+            sample_values.loc[kind_samples['sample_key'], 'perten_Grain'].to_numpy()
+    for col in ['tested', 'GRAIN_TYPE', 'mode']:
+        previous[col] = previous[col].astype(object).fillna('')
+    for col in ['Moisture', 'Nature', 'Temperature']:
+        previous[[f'perten_dry_{col}', f'perten_wet_{col}']] = previous[[f'perten_dry_{col}', f'perten_wet_{col}']].astype(float)
+    combined_df = pd.concat([previous, new_rows], ignore_index=True) if len(new_rows) else previous
+appended = np.arange(first_new, len(combined_df))
+
+# Переходные пробы. Этим all_data_combine1 отличается от all_data_combine: после
+# смены вида зерна в сушилке еще идет прежнее зерно, и проба нового вида
+# раньше grain_switch_window после предыдущей принятой пробы не описывает
+# строки вокруг себя. Такая проба пропускается целиком. match_tolerance
+# ограничивает только расстояние до строки сушилки и таких проб не отсекает
+accepted = []
+last_grain = None
+last_time = None
+for grain, time in zip(perten_df['perten_Grain'].astype(str).str.lower(), perten_df['DateTime']):
+    if last_grain and last_grain != grain and last_time and (time - last_time) < grain_switch_window:
+        accepted.append(False)
         continue
-
-    grain_status = classify_grain(p_row)
-    prefix = 'perten_dry' if grain_status in ['dry', 'overdry'] else 'perten_wet'
-
-    combined_df.at[closest_idx, f'{prefix}_Grain'] = p_row['perten_Grain']
-    combined_df.at[closest_idx, f'{prefix}_Moisture'] = p_row['perten_Moisture']
-    combined_df.at[closest_idx, f'{prefix}_Nature'] = p_row['perten_Nature']
-    combined_df.at[closest_idx, f'{prefix}_Temperature'] = p_row['perten_Temperature']
-    combined_df.at[closest_idx, 'tested'] = 'real'
-
-    used_perten.add(p_idx)
-    last_grain = p_row['perten_Grain'].lower()
-    last_time = p_row['DateTime']
-
-# Интерполяция числовых значений
-for col in ['perten_dry_Moisture', 'perten_dry_Nature', 'perten_dry_Temperature',
-            'perten_wet_Moisture', 'perten_wet_Nature', 'perten_wet_Temperature']:
-    combined_df[col] = pd.to_numeric(combined_df[col], errors='coerce')
-    combined_df[col] = combined_df[col].interpolate(method='linear', limit_direction='both').round(3)
+    accepted.append(True)
+    last_grain = grain
+    last_time = time
+perten_df = perten_df[accepted].reset_index(drop=True)
+
+# Подстановка новых проб Perten: каждая проба занимает ближайшую свободную строку,
+# пробы дальше match_tolerance от любой свободной строки не подставляются
+new_samples = perten_df[~perten_df['sample_key'].isin(state['samples'])]
+taken = samples['row'].to_numpy()
+matches = match_free_rows(new_samples['DateTime'], combined_df['DateTime'], taken, match_tolerance)
+matched = new_samples[matches >= 0]
+rows = matches[matches >= 0]
+unmatched_count = int((matches < 0).sum())
+if unmatched_count:
+    print(f"Пробы Perten без строки сушилки в пределах {match_tolerance}: {unmatched_count}")
+
+is_dry = grain_status(matched['perten_Grain'], matched['perten_Moisture']) != 'wet'
+for prefix, mask in [('perten_dry', is_dry), ('perten_wet', ~is_dry)]:
+    for col in ['Grain', 'Moisture', 'Nature', 'Temperature']:
+        combined_df.loc[rows[mask], f'{prefix}_{col}'] = matched[f'perten_{col}'].to_numpy()[mask]
+combined_df.loc[rows, 'tested'] = 'real'
+state['samples'].update({key: [int(row), 'dry' if dry else 'wet']
+                         for key, row, dry in zip(matched['sample_key'], rows, is_dry)})
+samples = pd.DataFrame([[key, row, kind] for key, (row, kind) in state['samples'].items()],
+                       columns=['sample_key', 'row', 'kind'])
+
+# Интерполяция числовых значений с округлением до 3 знаков. Узлы - все
+# подставленные пробы, пересчитываются только промежутки вокруг новых проб и строк
+gaps = {}
+for prefix, kind in [('perten_dry', 'dry'), ('perten_wet', 'wet')]:
+    kind_samples = samples[samples['kind'] == kind]
+    touched = np.concatenate([rows[is_dry if kind == 'dry' else ~is_dry], appended])
+    for col in ['Moisture', 'Nature', 'Temperature']:
+        values = pd.to_numeric(sample_values.loc[kind_samples['sample_key'], f'perten_{col}'], errors='coerce')
+        valid = values.notna().to_numpy()
+        knots = kind_samples['row'].to_numpy()[valid]
+        gaps[f'{prefix}_{col}'] = gap_ranges(knots, touched, len(combined_df))
+        combined_df[f'{prefix}_{col}'] = interpolate_gaps(combined_df[f'{prefix}_{col}'], knots,
+                                                          values.to_numpy()[valid], gaps[f'{prefix}_{col}'])
 
 # Заполняем 'tested' как 'calculated' для интерполированных значений
 combined_df['tested'] = combined_df['tested'].replace('', 'calculated')
 
 # Расчёт массы для всех строк с dry/overdry и изменением DROPS_SCORE
-for idx in combined_df.index:
-    if idx == 0:  # Пропускаем первую строку, так как нет предыдущего drop
-        continue
-    
-    current_drop = combined_df.at[idx, 'DROPS_SCORE']
-    prev_drop = combined_df.at[idx - 1, 'DROPS_SCORE']
-    moisture = combined_df.at[idx, 'perten_dry_Moisture']
-    nature = combined_df.at[idx, 'perten_dry_Nature']
-    grain = combined_df.at[idx, 'perten_dry_Grain'].lower() if combined_df.at[idx, 'perten_dry_Grain'] else ''
-
-    # Проверка условий: dry/overdry, изменение drop, не ноль
-    is_dry_or_overdry = (grain == 'raps' and 0 < moisture <= 9.5) or (grain != 'raps' and 0 < moisture <= 14.5)
-    if (is_dry_or_overdry and prev_drop is not None and current_drop != prev_drop and current_drop != 0 and nature):
-        combined_df.at[idx, 'dry_mass'] = round(nature * 497.2, 3)
-
-# Заполняем GRAIN_TYPE на основе perten_dry_Grain и perten_wet_Grain с учётом непрерывности
-def determine_grain_type(row):
-    if row['perten_dry_Grain']:
-        return row['perten_dry_Grain']
-    elif row['perten_wet_Grain']:
-        return row['perten_wet_Grain']
-    return None  # Если нет данных, временно ставим None
-
-# Применяем функцию для получения базовых значений
-combined_df['GRAIN_TYPE_temp'] = combined_df.apply(determine_grain_type, axis=1)
-
-# Заполняем GRAIN_TYPE с учётом непрерывности (ffill)
-combined_df['GRAIN_TYPE'] = combined_df['GRAIN_TYPE_temp'].fillna(method='ffill').fillna('')
-
-# Удаляем временный столбец
-combined_df.drop(columns=['GRAIN_TYPE_temp'], inplace=True)
-
-# Объединяем с mode_df по DateTime
-combined_df = combined_df.merge(
-    mode_df[['DateTime', 'FILLING', 'DRYING', 'RECYCLING', 'EMPTY', 'SHUTDOWN', 'STOP', 'COOLING', 'MANUAL']],
-    on='DateTime', how='left'
-)
-
-# Функция для определения режима
-def get_mode(row):
-    mode_columns = ['FILLING', 'DRYING', 'RECYCLING', 'EMPTY', 'SHUTDOWN', 'STOP', 'COOLING', 'MANUAL']
-    for col in mode_columns:
-        if row[col] is True:
-            return col
-    return ''
-
-# Добавляем столбец mode
-combined_df['mode'] = combined_df.apply(get_mode, axis=1)
-
-# Удаляем временные столбцы из mode_df
-combined_df.drop(columns=['FILLING', 'DRYING', 'RECYCLING', 'EMPTY', 'SHUTDOWN', 'STOP', 'COOLING', 'MANUAL'], inplace=True)
+# (натура сухой пробы, умноженная на объем бункера сушилки). Пересчитываются
+# сбросы в промежутках, где изменилась сухая проба; для сравнения счетчика
+# берется и строка перед промежутком
+mass_rows = np.concatenate([range_rows(gaps['perten_dry_Moisture']), range_rows(gaps['perten_dry_Nature']),
+                            rows[is_dry], appended])
+for start, end in row_runs(mass_rows):
+    first = max(start - 1, 0)
+    mass = drop_dry_mass(combined_df.iloc[first:end + 1])
+    combined_df.loc[start:end, 'dry_mass'] = mass.loc[start:end].to_numpy()
+
+# Заполняем GRAIN_TYPE видом зерна пробы (сухой, иначе влажной) с учётом
+# непрерывности (ffill). Пересчет идет от предыдущей пробы с видом зерна до следующей,
+# значение перед промежутком продолжается в него
+grain_temp = combined_df['perten_dry_Grain'].replace('', np.nan).fillna(combined_df['perten_wet_Grain'].replace('', np.nan))
+grain_rows = np.concatenate([rows, appended])
+for start, end in gap_ranges(np.flatnonzero(grain_temp.notna().to_numpy()), grain_rows, len(combined_df)):
+    before = combined_df['GRAIN_TYPE'].iloc[start - 1] if start > 0 else ''
+    part = pd.concat([pd.Series([before or None]), grain_temp.iloc[start:end + 1]], ignore_index=True)
+    combined_df.loc[start:end, 'GRAIN_TYPE'] = part.ffill().iloc[1:].fillna('').to_numpy()
+
+# Отрезки режимов: по ним считаются часы работы в режимах за любой период
+if len(appended):
+    intervals_path = write_table(mode_intervals(combined_df), mode_intervals_file)
+    print(f"Отрезки режимов сохранены в {intervals_path}")
+print(f"Новых проб: {len(matched)}, новых строк: {len(appended)}, пересчитано масс: {len(np.unique(mass_rows))}")
+
+# Состояние для следующего запуска
+state['rows'] = len(combined_df)
+state['last_row_time'] = combined_df['DateTime'].iloc[-1] if len(combined_df) else None
 
 # Определяем порядок колонок
 column_order = [
@@ -167,5 +214,6 @@ column_order = [
 ]
 
 # Сохраняем результат с заданным порядком колонок
-combined_df.drop(columns=['DateTime'])[column_order].to_csv(output_file, index=False)
-print(f"Данные сохранены в {output_file}")
\ No newline at end of file
+output_path = write_table(combined_df[column_order], output_file)
+save_state(state, state_file(output_file))
+print(f"Данные сохранены в {output_path}")
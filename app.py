@@ -1,29 +1,49 @@
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from dash import Dash, dcc, html, Input, Output
+from dash import Dash, dcc, html, Input, Output, State
 from pathlib import Path
-from datetime import timedelta, datetime
 import base64
 import io
+import json
+
+from modes import mode_intervals
+from pipeline import script_sources
+from report_cache import cached_call, data_version, plain, results_cache, warm_cache
+from storage import locate_table, read_table
+from rollups import choose_level, level_seconds, load_rollup, local_shift_start, local_shift_type, rollup_dir
+from segments import interval_hours, interval_index, overlap_periods, segment_lines, value_periods
+from timestamps import to_local
 
 # Пути к файлам
 input_dir = Path('final_data')
 moistures_file = input_dir / 'moistures_temps_mass.csv'
 settings_file = input_dir / 'settings_optimized.csv'
 alarms_segments_file = input_dir / 'alarms_segments.csv'
-
-# Читаем данные
-df = pd.read_csv(moistures_file)
-settings_df = pd.read_csv(settings_file)
-alarms_segments = pd.read_csv(alarms_segments_file)
-
-# Преобразуем DateTime и смещаем на +3 часа
-df['DateTime'] = pd.to_datetime(df['Date'] + ' ' + df['Time'], format='%d-%m-%Y %H:%M:%S') + timedelta(hours=3)
-settings_df['DateTime'] = pd.to_datetime(settings_df['Date'] + ' ' + settings_df['Time'], format='%d-%m-%Y %H:%M:%S') + timedelta(hours=3)
+mode_intervals_file = input_dir / 'mode_intervals.csv'
+
+# Читаем только нужные колонки (DateTime строится при чтении)
+df = read_table(moistures_file, columns=['GRAIN_TYPE', 'DROPS_SCORE', 'ACTUAL_BURNERS_TEMP', 'perten_dry_Moisture',
+                                         'perten_wet_Moisture', 'dry_mass', 'mode'])
+settings_df = read_table(settings_file, columns=['DROPS_SET_TIMER', 'SET_BURNERS_TEMP'])
+alarms_segments = read_table(alarms_segments_file)
+
+# Пирамида агрегатов для графиков по времени: уровни читаются из final_data/rollups
+# (если пирамида не построена, считаются в памяти) и переводятся в местное время
+rollups = {level: load_rollup('moistures_temps_mass', level, source=df) for level in level_seconds}
+for table in rollups.values():
+    table['DateTime'] = to_local(table['DateTime'])
+
+# Переводим DateTime из UTC в местное время сушилки
+df['DateTime'] = to_local(df['DateTime'])
+settings_df['DateTime'] = to_local(settings_df['DateTime'])
 alarms_segments['Start'] = pd.to_datetime(alarms_segments['Start'])
 alarms_segments['End'] = pd.to_datetime(alarms_segments['End'])
 
+# Интервальный индекс алармов и периоды сушки каждого вида зерна для фильтра
+alarms_index = interval_index(alarms_segments)
+grain_periods = {grain: value_periods(df, 'GRAIN_TYPE', grain) for grain in df['GRAIN_TYPE'].dropna().unique()}
+
 # Объединяем данные
 df = df.merge(settings_df[['DateTime', 'DROPS_SET_TIMER', 'SET_BURNERS_TEMP']], on='DateTime', how='left')
 
@@ -43,37 +63,32 @@ df['Moisture_Status'] = df.apply(classify_moisture, axis=1)
 # Поступающая влажность и возврат
 df['Moisture_Diff'] = df['perten_wet_Moisture'] - df['perten_dry_Moisture']
 df['Incoming_Wet'] = df['Moisture_Diff'].apply(lambda x: x if x > 1 else None)
-avg_incoming_wet = df[df['Incoming_Wet'].notna()].groupby('GRAIN_TYPE')['perten_wet_Moisture'].agg(['mean', 'min']).reset_index()
+avg_incoming_wet = df[df['Incoming_Wet'].notna()].groupby('GRAIN_TYPE', observed=True)['perten_wet_Moisture'].agg(['mean', 'min']).reset_index()
 returned_mass = df[df['Moisture_Diff'].notna() & (df['Moisture_Diff'] <= 1)]['dry_mass'].sum()
 
 # Определение смены (день: 8:00-20:00, ночь: 20:00-8:00)
-def get_shift(datetime_obj):
-    hour = datetime_obj.hour
-    date = datetime_obj.date()
-    if 8 <= hour < 20:
-        shift_start = datetime(date.year, date.month, date.day, 8, 0)
-        return shift_start, 'Day'
-    else:
-        if hour < 8:
-            shift_start = datetime(date.year, date.month, date.day, 0, 0) - timedelta(hours=4)
-        else:
-            shift_start = datetime(date.year, date.month, date.day, 20, 0)
-        return shift_start, 'Night'
-
-df['Shift_Start'], df['Shift_Type'] = zip(*df['DateTime'].apply(get_shift))
-shift_productivity = df.groupby(['Shift_Start', 'Shift_Type'])['dry_mass'].sum().reset_index()
-shift_productivity['Shift_Start'] = pd.to_datetime(shift_productivity['Shift_Start'])
-
-# Время работы режимов
-df['Time_Diff'] = df['DateTime'].shift(-1) - df['DateTime']
-df['Time_Diff'] = df['Time_Diff'].fillna(timedelta(seconds=0)).dt.total_seconds() / 3600
-mode_times = df.groupby('mode')['Time_Diff'].sum().reset_index()
+df['Shift_Start'] = local_shift_start(df['DateTime'])
+df['Shift_Type'] = local_shift_type(df['Shift_Start'])
+
+# Масса по сменам - уровень смен из пирамиды
+shift_productivity = rollups['shift'][['DateTime', 'Shift_Type', 'dry_mass_sum']].rename(
+    columns={'DateTime': 'Shift_Start', 'dry_mass_sum': 'dry_mass'})
+
+# Время работы режимов: часы суммируются по отрезкам режимов из final_data
+# (если таблица не построена, отрезки строятся по строкам данных)
+if locate_table(mode_intervals_file).exists():
+    mode_intervals_df = read_table(mode_intervals_file)
+    for col in ['Start', 'End']:
+        mode_intervals_df[col] = to_local(pd.to_datetime(mode_intervals_df[col]))
+else:
+    mode_intervals_df = mode_intervals(df)
+mode_times = interval_hours(mode_intervals_df, 'mode').rename('Time_Diff').reset_index()
 total_work_time = mode_times[mode_times['mode'] != 'STOP']['Time_Diff'].sum()
 
 # Сушёное зерно: масса и влажность
-dry_mass_stats = df.groupby('GRAIN_TYPE').agg({'dry_mass': 'sum', 'perten_dry_Moisture': ['min', 'mean']}).reset_index()
+dry_mass_stats = df.groupby('GRAIN_TYPE', observed=True).agg({'dry_mass': 'sum', 'perten_dry_Moisture': ['min', 'mean']}).reset_index()
 dry_mass_stats.columns = ['GRAIN_TYPE', 'Total_Dry_Mass', 'Min_Dry_Moisture', 'Mean_Dry_Moisture']
-moisture_by_grain = df.groupby(['GRAIN_TYPE', 'Moisture_Status'])['dry_mass'].sum().reset_index()
+moisture_by_grain = df.groupby(['GRAIN_TYPE', 'Moisture_Status'], observed=True)['dry_mass'].sum().reset_index()
 
 # Корреляции
 grain_types = df['GRAIN_TYPE'].dropna().unique()
@@ -95,7 +110,7 @@ for grain in grain_types:
 texts = {
     'en': {
         'title': "Grainstate: Grain Drying Analytics",
-        'intro': "This report provides detailed analytics for grain drying performance over the period {} - {} (Local Time, UTC+3), collected using Perten AM5200A and Grainstate systems. Select a grain type below to filter data and receive operator recommendations based on statistical analysis of moisture, mass, and alarm trends.",
+        'intro': "This report provides detailed analytics for grain drying performance over the period {} - {} (Local Time, Europe/Tallinn), collected using Perten AM5200A and Grainstate systems. Select a grain type below to filter data and receive operator recommendations based on statistical analysis of moisture, mass, and alarm trends.",
         'summary': "Key Results",
         'total_mass': "Total dried mass: {:.0f} kg",
         'drops': "Number of drops: {}",
@@ -106,6 +121,7 @@ texts = {
         'mass_pie': "Dried Mass by Grain Type (%)",
         'moisture_bar': "Dried Mass by Moisture Status (kg)",
         'shift_line': "Dried Mass by Shift (kg, Day: 8:00-20:00, Night: 20:00-8:00)",
+        'temp_trend': "Burner Temperature Over Time (°C, interval: {})",
         'dry_moisture_bar': "Dry Moisture by Grain Type (%)",
         'settings_scatter': "Set Temperature vs Dry Moisture",
         'alarms_timeline': "Dryer Alarms Timeline (Segments)",
@@ -126,11 +142,12 @@ texts = {
         },
         'conclusion': "Why Grainstate?",
         'conclusion_text': "Real-time drying optimization. Contact us for a demo: info@grainstate.com",
-        'download': "Download data for {} (CSV)"
+        'download': "Download data for {} (CSV)",
+        'wet_moisture_fig': "Incoming Moisture (%)"
     },
     'et': {
         'title': "Grainstate: Teravilja kuivatamise analüütika",
-        'intro': "See aruanne annab üksikasjaliku ülevaate teravilja kuivatamise tulemustest perioodil {} - {} (Kohalik aeg, UTC+3), kogutud Perten AM5200A ja Grainstate süsteemide abil. Vali allpool teravilja tüüp, et filtreerida andmeid ja saada operaatori soovitusi, mis põhinevad niiskuse, massi ja häirete statistilisel analüüsil.",
+        'intro': "See aruanne annab üksikasjaliku ülevaate teravilja kuivatamise tulemustest perioodil {} - {} (Kohalik aeg, Europe/Tallinn), kogutud Perten AM5200A ja Grainstate süsteemide abil. Vali allpool teravilja tüüp, et filtreerida andmeid ja saada operaatori soovitusi, mis põhinevad niiskuse, massi ja häirete statistilisel analüüsil.",
         'summary': "Peamised tulemused",
         'total_mass': "Kuivatatud teravilja mass: {:.0f} kg",
         'drops': "Tühjendamiste arv: {}",
@@ -141,6 +158,7 @@ texts = {
         'mass_pie': "Kuivatatud mass teravilja tüübi järgi (%)",
         'moisture_bar': "Kuivatatud mass niiskuse staatuse järgi (kg)",
         'shift_line': "Kuivatatud mass vahetuste järgi (kg, Päev: 8:00-20:00, Öö: 20:00-8:00)",
+        'temp_trend': "Põleti temperatuur ajas (°C, intervall: {})",
         'dry_moisture_bar': "Kuiva niiskus teravilja tüübi järgi (%)",
         'settings_scatter': "Määratud temperatuur vs Kuiv niiskus",
         'alarms_timeline': "Kuivati häirete ajajoon (segmendid)",
@@ -161,17 +179,40 @@ texts = {
         },
         'conclusion': "Miks Grainstate?",
         'conclusion_text': "Reaalajas kuivatamise optimeerimine. Võtke ühendust demo jaoks: info@grainstate.com",
-        'download': "Laadi alla andmed {} jaoks (CSV)"
+        'download': "Laadi alla andmed {} jaoks (CSV)",
+        'wet_moisture_fig': "Sissetulev niiskus (%)"
     }
 }
 
-# Функция для создания ссылки на скачивание CSV
-def create_download_link(df, filename, title):
+# Тексты для клиента: период отчета и часы работы подставлены заранее,
+# остальные значения подставляет клиентский колбэк
+client_texts = {}
+for lang, t in texts.items():
+    notes = {**t['notes'], 'general': [note.format(total_work_time) if i == 2 else note for i, note in enumerate(t['notes']['general'])]}
+    client_texts[lang] = {**t, 'notes': notes,
+                          'intro': t['intro'].format(df['DateTime'].min().strftime('%d-%m-%Y'), df['DateTime'].max().strftime('%d-%m-%Y'))}
+
+# Ссылка на скачивание CSV: данные передаются в href, подпись ставится на клиенте
+def csv_href(df):
     csv_buffer = io.StringIO()
     df.to_csv(csv_buffer, index=False)
-    csv_string = csv_buffer.getvalue()
-    b64 = base64.b64encode(csv_string.encode()).decode()
-    return html.A(title, href=f"data:text/csv;base64,{b64}", download=filename, style={'color': '#2980b9', 'textDecoration': 'underline'})
+    b64 = base64.b64encode(csv_buffer.getvalue().encode()).decode()
+    return f"data:text/csv;base64,{b64}"
+
+def download_link(link_id, filename, href=None):
+    return html.Div(html.A(id=link_id, href=href, download=filename, style={'color': '#2980b9', 'textDecoration': 'underline'}))
+
+# Виды зерна для фильтра
+grain_options = [grain for grain in df['GRAIN_TYPE'].dropna().unique() if grain]
+
+# Графики, не зависящие от фильтра, строятся один раз. Заголовки графиков
+# ставит клиент по выбранному языку (margin_t=None убирает отступ, который px
+# ставит у графиков без заголовка)
+wet_moisture_fig = px.bar(avg_incoming_wet, x='GRAIN_TYPE', y=['mean', 'min'], barmode='group', text_auto='.1f')
+wet_moisture_fig.update_layout(margin_t=None, font={'size': 14}, dragmode='pan', xaxis={'fixedrange': True}, yaxis={'fixedrange': True})
+
+mode_fig = px.pie(mode_times, names='mode', values='Time_Diff', hole=0.4, color_discrete_sequence=px.colors.qualitative.Pastel)
+mode_fig.update_layout(margin_t=None, font={'size': 14}, dragmode='pan')
 
 # Инициализируем Dash
 app = Dash(__name__)
@@ -185,8 +226,21 @@ styles = {
     'graph': {'margin': '20px 0', 'border': '1px solid #ddd', 'borderRadius': '5px', 'backgroundColor': '#fff'}
 }
 
-# Макет
+# Макет. В dcc.Store лежат тексты обоих языков (передаются один раз), значения
+# сводки и графики без заголовков по выбранному зерну
 app.layout = html.Div([
+    dcc.Store(id='texts', data=client_texts),
+    dcc.Store(id='summary-values'),
+    dcc.Store(id='wet_moisture_table-figure', data=plain(wet_moisture_fig)),
+    dcc.Store(id='mode-pie-figure', data=plain(mode_fig)),
+    dcc.Store(id='mass-pie-figure'),
+    dcc.Store(id='moisture-bar-figure'),
+    dcc.Store(id='shift-line-figure'),
+    dcc.Store(id='temp-trend-figure'),
+    dcc.Store(id='dry-moisture-bar-figure'),
+    dcc.Store(id='settings-scatter-figure'),
+    dcc.Store(id='alarms_timeline-figure'),
+
     html.H1(id='title', style=styles['header']),
     html.P(id='intro', style=styles['text']),
     
@@ -202,7 +256,7 @@ app.layout = html.Div([
     html.Label(id='grain_filter_label', style=styles['text']),
     dcc.Dropdown(
         id='grain-filter',
-        options=[{'label': grain, 'value': grain} for grain in df['GRAIN_TYPE'].dropna().unique() if grain],
+        options=[{'label': grain, 'value': grain} for grain in grain_options],
         value=None,
         multi=False,
         style={'width': '50%', 'margin': '10px auto', 'padding': '5px', 'fontSize': '20px'},
@@ -220,173 +274,216 @@ app.layout = html.Div([
         html.P(id='returned', style=styles['text']),
         html.P(id='wet_moisture', style=styles['text']),
         dcc.Graph(id='wet_moisture_table'),
-        html.Div(id='wet_moisture_data')
+        download_link('wet_moisture_data', 'wet_moisture.csv', csv_href(avg_incoming_wet))
     ], style={'backgroundColor': '#ecf0f1', 'padding': '15px', 'borderRadius': '5px'}),
 
     dcc.Graph(id='mode-pie', style=styles['graph']),
-    html.Div(id='mode_data'),
+    download_link('mode_data', 'mode_times.csv', csv_href(mode_times)),
     dcc.Graph(id='mass-pie', style=styles['graph']),
-    html.Div(id='mass_data'),
+    download_link('mass_data', 'dry_mass_stats.csv'),
     dcc.Graph(id='moisture-bar', style=styles['graph']),
-    html.Div(id='moisture_data'),
+    download_link('moisture_data', 'moisture_by_grain.csv'),
     dcc.Graph(id='shift-line', style=styles['graph']),
-    html.Div(id='shift_data'),
+    download_link('shift_data', 'shift_mass.csv'),
+    dcc.Graph(id='temp-trend', style=styles['graph']),
+    download_link('temp_trend_data', 'burner_temp.csv'),
     dcc.Graph(id='dry-moisture-bar', style=styles['graph']),
-    html.Div(id='dry_moisture_data'),
+    download_link('dry_moisture_data', 'dry_moisture_stats.csv'),
     dcc.Graph(id='settings-scatter', style=styles['graph']),
-    html.Div(id='settings_data'),
+    download_link('settings_data', 'settings_data.csv'),
     html.H3(id='alarms_timeline_title', style={**styles['text'], 'fontSize': '24px'}),
     dcc.Graph(id='alarms_timeline', style=styles['graph']),
-    html.Div(id='alarms_data'),
+    download_link('alarms_data', 'alarms_segments.csv'),
 
     html.H3(id='conclusion', style={**styles['text'], 'fontSize': '24px'}),
     html.P(id='conclusion_text', style=styles['text'])
 ], style=styles['container'])
 
-# Callback
-@app.callback(
-    [Output('title', 'children'),
-     Output('intro', 'children'),
-     Output('grain_filter_label', 'children'),
-     Output('operator_notes', 'children'),
-     Output('notes_intro', 'children'),
-     Output('notes_list', 'children'),
-     Output('summary', 'children'),
-     Output('total_mass', 'children'),
-     Output('drops', 'children'),
-     Output('returned', 'children'),
-     Output('wet_moisture', 'children'),
-     Output('wet_moisture_table', 'figure'),
-     Output('wet_moisture_data', 'children'),
-     Output('mode-pie', 'figure'),
-     Output('mode_data', 'children'),
-     Output('mass-pie', 'figure'),
-     Output('mass_data', 'children'),
-     Output('moisture-bar', 'figure'),
-     Output('moisture_data', 'children'),
-     Output('shift-line', 'figure'),
-     Output('shift_data', 'children'),
-     Output('dry-moisture-bar', 'figure'),
-     Output('dry_moisture_data', 'children'),
-     Output('settings-scatter', 'figure'),
-     Output('settings_data', 'children'),
-     Output('alarms_timeline_title', 'children'),
-     Output('alarms_timeline', 'figure'),
-     Output('alarms_data', 'children'),
-     Output('conclusion', 'children'),
-     Output('conclusion_text', 'children')],
-    [Input('language', 'value'),
-     Input('grain-filter', 'value')]
-)
-def update_report(lang, selected_grain):
-    filtered_df = df if selected_grain is None else df[df['GRAIN_TYPE'] == selected_grain]
-    filtered_moisture = moisture_by_grain if selected_grain is None else moisture_by_grain[moisture_by_grain['GRAIN_TYPE'] == selected_grain]
-    filtered_dry_mass = dry_mass_stats if selected_grain is None else dry_mass_stats[dry_mass_stats['GRAIN_TYPE'] == selected_grain]
-    filtered_mode_times = mode_times
-
-    corr = correlations.get(selected_grain, {}) if selected_grain else {}
-    if not selected_grain:
-        all_df = df.dropna(subset=['SET_BURNERS_TEMP', 'DROPS_SET_TIMER', 'ACTUAL_BURNERS_TEMP', 'perten_dry_Moisture', 'dry_mass'])
-        if len(all_df) >= 2 and all_df['SET_BURNERS_TEMP'].std() != 0 and all_df['DROPS_SET_TIMER'].std() != 0:
-            corr = {
-                'temp_moisture': all_df['SET_BURNERS_TEMP'].corr(all_df['perten_dry_Moisture']),
-                'timer_moisture': all_df['DROPS_SET_TIMER'].corr(all_df['perten_dry_Moisture']),
-                'actual_temp_moisture': all_df['ACTUAL_BURNERS_TEMP'].corr(all_df['perten_dry_Moisture']),
-                'timer_mass': all_df['DROPS_SET_TIMER'].corr(all_df['dry_mass']),
-                'temp_mass': all_df['SET_BURNERS_TEMP'].corr(all_df['dry_mass'])
-            }
-
-    t = texts[lang]
-    intro = t['intro'].format(df['DateTime'].min().strftime('%d-%m-%Y'), df['DateTime'].max().strftime('%d-%m-%Y'))
-    total_mass = t['total_mass'].format(filtered_df['dry_mass'].sum())
-    drops = t['drops'].format(len(filtered_df['DROPS_SCORE'].dropna().unique()))
-    returned = t['returned'].format(filtered_df[filtered_df['Moisture_Diff'].notna() & (filtered_df['Moisture_Diff'] <= 1)]['dry_mass'].sum())
-    wet_moisture = t['wet_moisture']
-    wet_moisture_fig = px.bar(avg_incoming_wet, x='GRAIN_TYPE', y=['mean', 'min'], 
-                              title='Incoming Moisture (%)' if lang == 'en' else 'Sissetulev niiskus (%)',
-                              barmode='group', text_auto='.1f')
-    wet_moisture_fig.update_layout(font={'size': 14}, dragmode='pan', xaxis={'fixedrange': True}, yaxis={'fixedrange': True})
-    wet_moisture_data = create_download_link(avg_incoming_wet, 'wet_moisture.csv', t['download'].format('Incoming Moisture'))
+# Клиентские колбэки: смена языка не обращается к серверу.
+# Тексты без значений: элемент -> ключ в texts
+text_outputs = {'title': 'title', 'intro': 'intro', 'grain_filter_label': 'grain_filter', 'operator_notes': 'operator_notes',
+                'notes_intro': 'notes_intro', 'summary': 'summary', 'wet_moisture': 'wet_moisture',
+                'alarms_timeline_title': 'alarms_timeline', 'conclusion': 'conclusion', 'conclusion_text': 'conclusion_text'}
+# Подписи ссылок на скачивание
+download_labels = {'wet_moisture_data': 'Incoming Moisture', 'mode_data': 'Operating Modes', 'mass_data': 'Dried Mass',
+                   'moisture_data': 'Dried Mass by Moisture Status', 'shift_data': 'Dried Mass by Shift',
+                   'temp_trend_data': 'Burner Temperature', 'dry_moisture_data': 'Dry Moisture by Grain Type',
+                   'settings_data': 'Set Temperature vs Dry Moisture', 'alarms_data': 'Dryer Alarms'}
+# Заголовки графиков: график -> ключ в texts ({} в заголовке заменяется на layout.meta фигуры)
+figure_titles = {'wet_moisture_table': 'wet_moisture_fig', 'mode-pie': 'mode_pie', 'mass-pie': 'mass_pie',
+                 'moisture-bar': 'moisture_bar', 'shift-line': 'shift_line', 'temp-trend': 'temp_trend',
+                 'dry-moisture-bar': 'dry_moisture_bar', 'settings-scatter': 'settings_scatter', 'alarms_timeline': 'alarms_timeline'}
+
+texts_js = """
+function(lang, texts) {
+    const t = texts[lang];
+    return KEYS.map(key => t[key]).concat(LABELS.map(label => t.download.replace('{}', label)));
+}
+""".replace('KEYS', json.dumps(list(text_outputs.values()))).replace('LABELS', json.dumps(list(download_labels.values())))
 
-    mode_fig = px.pie(filtered_mode_times, names='mode', values='Time_Diff', title=t['mode_pie'], hole=0.4,
-                      color_discrete_sequence=px.colors.qualitative.Pastel)
-    mode_fig.update_layout(font={'size': 14}, dragmode='pan')
-    mode_data = create_download_link(filtered_mode_times, 'mode_times.csv', t['download'].format('Operating Modes'))
+# Сводка: значения уже отформатированы на сервере и подставляются вместо {...}
+summary_js = """
+function(lang, summary, texts) {
+    if (!summary) {
+        throw window.dash_clientside.PreventUpdate;
+    }
+    const t = texts[lang];
+    const fill = (template, value) => template.replace(/\\{[^}]*\\}/, value);
+    const notes = summary.correlations.map(([key, value]) => value === null
+        ? t.notes[key].split(':')[0] + ': Not enough data or no variation for ' + summary.grain + '.'
+        : fill(t.notes[key], value));
+    const items = notes.concat(t.notes.general).map(note => ({namespace: 'dash_html_components', type: 'Li', props: {children: note}}));
+    return [items, fill(t.total_mass, summary.total_mass), fill(t.drops, summary.drops), fill(t.returned, summary.returned)];
+}
+"""
 
-    mass_fig = px.pie(filtered_dry_mass, names='GRAIN_TYPE', values='Total_Dry_Mass', title=t['mass_pie'], hole=0.4,
+figure_js = """
+function(figure, lang, texts) {
+    if (!figure) {
+        throw window.dash_clientside.PreventUpdate;
+    }
+    const title = texts[lang][TEXT_KEY].replace('{}', figure.layout.meta);
+    return {...figure, layout: {...figure.layout, title: {...figure.layout.title, text: title}}};
+}
+"""
+
+app.clientside_callback(texts_js, [Output(element, 'children') for element in list(text_outputs) + list(download_labels)],
+                        Input('language', 'value'), State('texts', 'data'))
+app.clientside_callback(summary_js, [Output('notes_list', 'children'), Output('total_mass', 'children'),
+                                     Output('drops', 'children'), Output('returned', 'children')],
+                        Input('language', 'value'), Input('summary-values', 'data'), State('texts', 'data'))
+for graph, text_key in figure_titles.items():
+    app.clientside_callback(figure_js.replace('TEXT_KEY', json.dumps(text_key)), Output(graph, 'figure'),
+                            Input(f'{graph}-figure', 'data'), Input('language', 'value'), State('texts', 'data'))
+
+# Серверные части отчета зависят только от вида зерна (None - все виды)
+def build_summary(selected_grain):
+    filtered_df = df if selected_grain is None else df[df['GRAIN_TYPE'] == selected_grain]
+    corr = correlations.get(selected_grain, {}) if selected_grain else {}
+    returned = filtered_df[filtered_df['Moisture_Diff'].notna() & (filtered_df['Moisture_Diff'] <= 1)]['dry_mass'].sum()
+    return ({'grain': selected_grain,
+             'total_mass': f"{filtered_df['dry_mass'].sum():.0f}",
+             'drops': str(len(filtered_df['DROPS_SCORE'].dropna().unique())),
+             'returned': f"{returned:.0f}",
+             'correlations': [[key, None if pd.isna(value) else f"{value:.2f}"] for key, value in corr.items()]},)
+
+def build_mass(selected_grain):
+    filtered_dry_mass = dry_mass_stats if selected_grain is None else dry_mass_stats[dry_mass_stats['GRAIN_TYPE'] == selected_grain]
+    mass_fig = px.pie(filtered_dry_mass, names='GRAIN_TYPE', values='Total_Dry_Mass', hole=0.4,
                       color_discrete_sequence=px.colors.qualitative.Plotly)
     mass_fig.update_traces(textinfo='percent+label+value', texttemplate='%{label}: %{value:.0f} kg (%{percent})')
-    mass_fig.update_layout(font={'size': 14}, dragmode='pan')
-    mass_data = create_download_link(filtered_dry_mass, 'dry_mass_stats.csv', t['download'].format('Dried Mass'))
+    mass_fig.update_layout(margin_t=None, font={'size': 14}, dragmode='pan')
+    return mass_fig, csv_href(filtered_dry_mass)
 
-    moisture_fig = px.bar(filtered_moisture, x='GRAIN_TYPE', y='dry_mass', color='Moisture_Status', 
-                          title=t['moisture_bar'], barmode='group', text_auto='.0f',
+def build_moisture(selected_grain):
+    filtered_moisture = moisture_by_grain if selected_grain is None else moisture_by_grain[moisture_by_grain['GRAIN_TYPE'] == selected_grain]
+    moisture_fig = px.bar(filtered_moisture, x='GRAIN_TYPE', y='dry_mass', color='Moisture_Status',
+                          barmode='group', text_auto='.0f',
                           color_discrete_map={'overdry': '#e74c3c', 'normal': '#2ecc71', 'wet': '#3498db'})
-    moisture_fig.update_layout(font={'size': 14}, dragmode='pan', xaxis={'fixedrange': True}, yaxis={'fixedrange': True})
-    moisture_data = create_download_link(filtered_moisture, 'moisture_by_grain.csv', t['download'].format('Dried Mass by Moisture Status'))
+    moisture_fig.update_layout(margin_t=None, font={'size': 14}, dragmode='pan', xaxis={'fixedrange': True}, yaxis={'fixedrange': True})
+    return moisture_fig, csv_href(filtered_moisture)
 
+def build_shift(selected_grain):
+    filtered_df = df if selected_grain is None else df[df['GRAIN_TYPE'] == selected_grain]
     shift_filtered = shift_productivity[shift_productivity['Shift_Start'].isin(filtered_df['Shift_Start'])]
     shift_fig = px.bar(shift_filtered, x='Shift_Start', y='dry_mass', color='Shift_Type',
-                       title=t['shift_line'],
                        labels={'dry_mass': 'Mass (kg)', 'Shift_Start': 'Shift Start Time'},
                        text_auto='.0f',
                        color_discrete_map={'Day': '#3498db', 'Night': '#2ecc71'})
-    shift_fig.update_layout(font={'size': 14}, dragmode='pan', xaxis={'tickangle': -45, 'fixedrange': True}, yaxis={'fixedrange': True})
-    shift_data = create_download_link(shift_filtered, 'shift_mass.csv', t['download'].format('Dried Mass by Shift'))
+    shift_fig.update_layout(margin_t=None, font={'size': 14}, dragmode='pan', xaxis={'tickangle': -45, 'fixedrange': True}, yaxis={'fixedrange': True})
+    return shift_fig, csv_href(shift_filtered)
 
-    dry_moisture_fig = px.bar(filtered_dry_mass, x='GRAIN_TYPE', y=['Mean_Dry_Moisture', 'Min_Dry_Moisture'], 
-                              title=t['dry_moisture_bar'], barmode='group', text_auto='.1f')
-    dry_moisture_fig.update_layout(font={'size': 14}, dragmode='pan', xaxis={'fixedrange': True}, yaxis={'fixedrange': True})
-    dry_moisture_data = create_download_link(filtered_dry_mass, 'dry_moisture_stats.csv', t['download'].format('Dry Moisture by Grain Type'))
+# Тренд температуры горелок: уровень пирамиды выбирается по длине показываемого периода
+# и передается в заголовок через layout.meta
+def build_trend(selected_grain):
+    filtered_df = df if selected_grain is None else df[df['GRAIN_TYPE'] == selected_grain]
+    start, end = filtered_df['DateTime'].min(), filtered_df['DateTime'].max()
+    trend_level = choose_level(start, end)
+    trend = rollups[trend_level]
+    trend = trend[(trend['DateTime'] >= start) & (trend['DateTime'] <= end)]
+    trend_fig = go.Figure([
+        go.Scatter(x=trend['DateTime'], y=trend['ACTUAL_BURNERS_TEMP_min'], mode='lines', line={'width': 0},
+                   showlegend=False, hoverinfo='skip'),
+        go.Scatter(x=trend['DateTime'], y=trend['ACTUAL_BURNERS_TEMP_max'], mode='lines', line={'width': 0},
+                   fill='tonexty', fillcolor='rgba(231, 76, 60, 0.2)', name='min-max'),
+        go.Scatter(x=trend['DateTime'], y=trend['ACTUAL_BURNERS_TEMP_mean'], mode='lines',
+                   line={'color': '#e74c3c'}, name='mean')
+    ])
+    trend_fig.update_layout(meta=trend_level, font={'size': 14}, dragmode='pan', yaxis={'fixedrange': True})
+    trend_href = csv_href(trend[['DateTime', 'ACTUAL_BURNERS_TEMP_min', 'ACTUAL_BURNERS_TEMP_max', 'ACTUAL_BURNERS_TEMP_mean', 'ACTUAL_BURNERS_TEMP_count']])
+    return trend_fig, trend_href, f'burner_temp_{trend_level}.csv'
+
+def build_dry_moisture(selected_grain):
+    filtered_dry_mass = dry_mass_stats if selected_grain is None else dry_mass_stats[dry_mass_stats['GRAIN_TYPE'] == selected_grain]
+    dry_moisture_fig = px.bar(filtered_dry_mass, x='GRAIN_TYPE', y=['Mean_Dry_Moisture', 'Min_Dry_Moisture'],
+                              barmode='group', text_auto='.1f')
+    dry_moisture_fig.update_layout(margin_t=None, font={'size': 14}, dragmode='pan', xaxis={'fixedrange': True}, yaxis={'fixedrange': True})
+    return dry_moisture_fig, csv_href(filtered_dry_mass)
 
+def build_settings(selected_grain):
+    filtered_df = df if selected_grain is None else df[df['GRAIN_TYPE'] == selected_grain]
     scatter_fig = px.scatter(filtered_df, x='SET_BURNERS_TEMP', y='perten_dry_Moisture', size='DROPS_SET_TIMER',
-                             title=t['settings_scatter'], color='GRAIN_TYPE',
+                             color='GRAIN_TYPE',
                              labels={'SET_BURNERS_TEMP': 'Temperature (°C)', 'perten_dry_Moisture': 'Moisture (%)'},
                              color_discrete_sequence=px.colors.qualitative.Plotly)
-    scatter_fig.update_layout(font={'size': 14}, dragmode='pan', xaxis={'range': [40, None], 'fixedrange': True}, yaxis={'fixedrange': True})
-    settings_data = create_download_link(filtered_df[['DateTime', 'SET_BURNERS_TEMP', 'perten_dry_Moisture', 'DROPS_SET_TIMER', 'GRAIN_TYPE']], 
-                                        'settings_data.csv', t['download'].format('Set Temperature vs Dry Moisture'))
+    scatter_fig.update_layout(margin_t=None, font={'size': 14}, dragmode='pan', xaxis={'range': [40, None], 'fixedrange': True}, yaxis={'fixedrange': True})
+    return scatter_fig, csv_href(filtered_df[['DateTime', 'SET_BURNERS_TEMP', 'perten_dry_Moisture', 'DROPS_SET_TIMER', 'GRAIN_TYPE']])
 
-    filtered_alarms = alarms_segments if selected_grain is None else alarms_segments[alarms_segments['Start'].isin(filtered_df['DateTime'])]
+def build_alarms(selected_grain):
+    # Алармы, пересекающиеся с периодами сушки выбранного зерна
+    filtered_alarms = alarms_segments if selected_grain is None else overlap_periods(alarms_index, *grain_periods[selected_grain])
     if filtered_alarms.empty:
         alarms_timeline_fig = go.Figure()
-        alarms_timeline_fig.update_layout(title=t['alarms_timeline'], xaxis_title="Time", yaxis_title="Alarm Type", yaxis={'tickmode': 'array', 'tickvals': []})
+        alarms_timeline_fig.update_layout(xaxis_title="Time", yaxis_title="Alarm Type", yaxis={'tickmode': 'array', 'tickvals': []})
     else:
         alarms_timeline_fig = go.Figure()
-        alarm_types = filtered_alarms['Alarm_Type'].unique()
+        # Один след на вид аларма: отрезки разделены пропусками
+        alarm_lines = segment_lines(filtered_alarms)
+        alarm_types = list(alarm_lines)
         colors = px.colors.qualitative.Plotly[:len(alarm_types)]
-        for i, alarm_type in enumerate(alarm_types):
-            alarm_data = filtered_alarms[alarms_segments['Alarm_Type'] == alarm_type]
-            for _, row in alarm_data.iterrows():
-                alarms_timeline_fig.add_trace(go.Scatter(
-                    x=[row['Start'], row['End']],
-                    y=[i, i],
-                    mode='lines',
-                    line=dict(width=10, color=colors[i]),
-                    name=alarm_type,
-                    showlegend=True if row.name == alarm_data.index[0] else False
-                ))
+        for i, (alarm_type, (x, y)) in enumerate(alarm_lines.items()):
+            alarms_timeline_fig.add_trace(go.Scatter(
+                x=x,
+                y=y,
+                mode='lines',
+                line=dict(width=10, color=colors[i]),
+                name=alarm_type
+            ))
         alarms_timeline_fig.update_layout(
-            title=t['alarms_timeline'], xaxis_title="Time", yaxis_title="Alarm Type",
+            xaxis_title="Time", yaxis_title="Alarm Type",
             yaxis={'tickmode': 'array', 'tickvals': list(range(len(alarm_types))), 'ticktext': alarm_types, 'fixedrange': True},
             font={'size': 14}, dragmode='pan', showlegend=True, height=400
         )
-    alarms_data = create_download_link(filtered_alarms, 'alarms_segments.csv', t['download'].format('Dryer Alarms'))
-
-    notes_list = []
-    if selected_grain and corr:
-        for key, value in corr.items():
-            if pd.isna(value):
-                notes_list.append(html.Li(f"{t['notes'][key].split(':')[0]}: Not enough data or no variation for {selected_grain}."))
-            else:
-                notes_list.append(html.Li(t['notes'][key].format(value)))
-    notes_list.extend([html.Li(t['notes']['general'][i].format(total_work_time) if i == 2 else t['notes']['general'][i]) for i in range(len(t['notes']['general']))])
-
-    return (t['title'], intro, t['grain_filter'], t['operator_notes'], t['notes_intro'], notes_list,
-            t['summary'], total_mass, drops, returned, wet_moisture, wet_moisture_fig, wet_moisture_data,
-            mode_fig, mode_data, mass_fig, mass_data, moisture_fig, moisture_data, shift_fig, shift_data,
-            dry_moisture_fig, dry_moisture_data, scatter_fig, settings_data, t['alarms_timeline'], alarms_timeline_fig, alarms_data,
-            t['conclusion'], t['conclusion_text'])
+    return alarms_timeline_fig, csv_href(filtered_alarms)
+
+# Серверные колбэки: у каждой части свои выходы, при смене зерна
+# пересчитываются только части, зависящие от фильтра
+report_parts = [
+    (build_summary, [Output('summary-values', 'data')]),
+    (build_mass, [Output('mass-pie-figure', 'data'), Output('mass_data', 'href')]),
+    (build_moisture, [Output('moisture-bar-figure', 'data'), Output('moisture_data', 'href')]),
+    (build_shift, [Output('shift-line-figure', 'data'), Output('shift_data', 'href')]),
+    (build_trend, [Output('temp-trend-figure', 'data'), Output('temp_trend_data', 'href'), Output('temp_trend_data', 'download')]),
+    (build_dry_moisture, [Output('dry-moisture-bar-figure', 'data'), Output('dry_moisture_data', 'href')]),
+    (build_settings, [Output('settings-scatter-figure', 'data'), Output('settings_data', 'href')]),
+    (build_alarms, [Output('alarms_timeline-figure', 'data'), Output('alarms_data', 'href')])
+]
+
+# Кэш отчета: версия - состояние файлов final_data, app.py и локальных модулей,
+# которые он импортирует. Все части для всех видов зерна считаются при старте,
+# процессы gunicorn делят их через диск
+report_cache = results_cache(data_version([moistures_file, settings_file, alarms_segments_file, mode_intervals_file,
+                                           rollup_dir] + script_sources(Path(__file__))))
+
+def part_callback(build, outputs):
+    @app.callback(outputs, Input('grain-filter', 'value'))
+    def update_part(selected_grain):
+        return cached_call(report_cache, build, selected_grain)
+
+for build, outputs in report_parts:
+    part_callback(build, outputs)
+
+warm_cache(report_cache, [(build, grain) for build, _ in report_parts for grain in [None] + grain_options])
 
 if __name__ == '__main__':
-    app.run_server(debug=True)  # Изменено на run_server для Heroku
\ No newline at end of file
+    app.run_server(debug=True)  # Изменено на run_server для Heroku
@@ -0,0 +1,118 @@
+import json
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Оценка смещения часов Perten относительно сушилки. Сушилка сама записывает
+# показания Perten (DRY_*/WET_*), поэтому одни и те же измерения есть в обеих
+# таблицах со сдвигом во времени. Пары показаний с совпадающими влажностью и
+# температурой дают разности времени; гистограмма разностей по сетке лагов -
+# взаимная корреляция двух рядов, ее пик - смещение часов
+max_lag = timedelta(hours=12)
+lag_step = timedelta(minutes=1)
+# Пары дальше match_window от пика считаются случайными совпадениями
+match_window = timedelta(minutes=5)
+moisture_tolerance = 0.005
+temperature_tolerance = 0.2
+
+# Дрейф часов: медиана смещения по окнам, между окнами - линейная интерполяция
+drift_window = timedelta(days=3)
+min_window_pairs = 3
+
+# Смещения меньше порога не применяются: данные уже выровнены
+# (у минутных таблиц сушилки метки округлены вниз до минуты)
+min_offset = timedelta(minutes=5)
+
+# Оценка, которую сохраняет date_back.py
+offset_file = Path('output') / 'perten_clock_offset.json'
+
+# Показания Perten, записанные сушилкой: сухая и влажная пробы одним рядом
+def dryer_readings(df):
+    parts = []
+    for kind in ['DRY', 'WET']:
+        columns = ['DateTime', f'{kind}_MOISTURE', f'{kind}_TEMP']
+        if all(col in df.columns for col in columns):
+            part = df[columns].set_axis(['DateTime', 'Moisture', 'Temperature'], axis=1)
+            parts.append(part)
+    readings = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['DateTime', 'Moisture', 'Temperature'])
+    readings = readings.dropna()
+    return readings[readings['Moisture'] != 0].reset_index(drop=True)
+
+# Показания из выгрузки Perten
+def perten_readings(df):
+    readings = df[['DateTime', '%mois', 'Temp']].set_axis(['DateTime', 'Moisture', 'Temperature'], axis=1)
+    return readings.dropna().reset_index(drop=True)
+
+# Пары проба Perten - показание сушилки с совпадающими значениями.
+# Для каждой пробы диапазон показаний по влажности находится двоичным поиском,
+# пары разворачиваются без циклов. Lag - время Perten минус время сушилки, в секундах
+def reading_pairs(samples, readings):
+    readings = readings.sort_values('Moisture', kind='stable')
+    values = readings['Moisture'].to_numpy(dtype=float)
+    moisture = samples['Moisture'].to_numpy(dtype=float)
+    lo = np.searchsorted(values, moisture - moisture_tolerance, side='left')
+    hi = np.searchsorted(values, moisture + moisture_tolerance, side='right')
+    counts = hi - lo
+    sample_idx = np.repeat(np.arange(len(samples)), counts)
+    reading_idx = np.repeat(lo, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    sample_times = samples['DateTime'].to_numpy()[sample_idx]
+    lags = (sample_times - readings['DateTime'].to_numpy()[reading_idx]) / np.timedelta64(1, 's')
+    temperature_diff = np.abs(samples['Temperature'].to_numpy(dtype=float)[sample_idx]
+                              - readings['Temperature'].to_numpy(dtype=float)[reading_idx])
+    keep = (temperature_diff <= temperature_tolerance) & (np.abs(lags) <= max_lag.total_seconds())
+    return pd.DataFrame({'Sample_Time': sample_times[keep], 'Lag': lags[keep]})
+
+# Оценка смещения: пик взаимной корреляции по сетке лагов, уточненный медианой
+# пар рядом с пиком, и узлы дрейфа по окнам. None - совпадающих показаний нет
+def estimate_offset(samples, readings):
+    pairs = reading_pairs(samples, readings)
+    if pairs.empty:
+        return None
+    step = lag_step.total_seconds()
+    edges = np.arange(-max_lag.total_seconds(), max_lag.total_seconds() + step, step)
+    counts, _ = np.histogram(pairs['Lag'], bins=edges)
+    peak = edges[counts.argmax()] + step / 2
+    near = pairs[(pairs['Lag'] - peak).abs() <= match_window.total_seconds()]
+
+    windows = near.groupby(near['Sample_Time'].dt.floor(drift_window))
+    knots = windows.agg(Time=('Sample_Time', 'mean'), Lag=('Lag', 'median'), Pairs=('Lag', 'size'))
+    knots = knots[knots['Pairs'] >= min_window_pairs]
+    return {'offset': float(near['Lag'].median()),
+            'pairs': int(len(near)),
+            'knots': [[time.isoformat(), float(lag)] for time, lag in zip(knots['Time'], knots['Lag'])]}
+
+# Смещение в секундах для каждой метки: по узлам дрейфа (за крайними узлами -
+# их значения) или одно общее
+def offsets_at(times, estimate):
+    times = pd.Series(times)
+    if len(estimate['knots']) < 2:
+        return pd.Series(estimate['offset'], index=times.index)
+    knot_times = pd.to_datetime([time for time, _ in estimate['knots']]).to_numpy().astype(np.int64)
+    knot_lags = [lag for _, lag in estimate['knots']]
+    return pd.Series(np.interp(times.to_numpy().astype(np.int64), knot_times, knot_lags), index=times.index)
+
+# Перевод меток Perten на часы сушилки (с точностью до секунды)
+def apply_offset(times, estimate):
+    times = pd.Series(times)
+    return (times - pd.to_timedelta(offsets_at(times, estimate), unit='s')).dt.round('s')
+
+# Выравнивание таблицы Perten перед объединением: смещение оценивается по показаниям,
+# записанным сушилкой, и применяется, если часы заметно расходятся. Сдвинутая
+# таблица заново сортируется по времени. Возвращает таблицу, примененную оценку
+# (None, если сдвига не было) и число строк, сменивших место при сортировке
+def align_perten(perten_df, dryer_df):
+    estimate = estimate_offset(perten_readings(perten_df), dryer_readings(dryer_df))
+    if estimate is None or abs(estimate['offset']) < min_offset.total_seconds():
+        return perten_df, None, 0
+    aligned = perten_df.copy()
+    aligned['DateTime'] = apply_offset(aligned['DateTime'], estimate)
+    order = np.argsort(aligned['DateTime'].to_numpy(), kind='stable')
+    resorted = int((order != np.arange(len(order))).sum())
+    return aligned.iloc[order].reset_index(drop=True), estimate, resorted
+
+def save_estimate(estimate, path=offset_file):
+    with open(path, 'w') as f:
+        json.dump(estimate, f, indent=2)
@@ -0,0 +1,137 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from matching import match_nearest
+from storage import locate_table, read_table
+
+# Инкрементальное объединение проб Perten с минутами сушилки. Состояние хранит
+# число обработанных строк сушилки, время последней из них и подставленные пробы
+# (ключ пробы -> позиция строки и вид 'dry'/'wet'). Новая проба занимает свободную
+# строку, а интерполяция и массы пересчитываются только в промежутке между
+# соседними настоящими пробами
+def state_file(output_file):
+    output_file = Path(output_file)
+    return output_file.with_name(f'{output_file.stem}_state.json')
+
+def empty_state():
+    return {'rows': 0, 'last_row_time': None, 'samples': {}}
+
+def load_state(path):
+    path = Path(path)
+    if not path.exists():
+        return empty_state()
+    with open(path, 'r') as f:
+        state = json.load(f)
+    state['last_row_time'] = pd.Timestamp(state['last_row_time']) if state['last_row_time'] else None
+    return state
+
+def save_state(state, path):
+    last_row_time = state['last_row_time']
+    with open(path, 'w') as f:
+        json.dump({'rows': int(state['rows']),
+                   'last_row_time': last_row_time.isoformat() if last_row_time is not None else None,
+                   'samples': state['samples']}, f, indent=1)
+
+# Время пробы по часам самого Perten: date_back сохраняет его в отдельной колонке
+# до сдвига. Сдвиг пересчитывается при каждом обновлении данных (узлы дрейфа),
+# поэтому ключ по сдвинутому времени менялся бы у уже подставленных проб
+raw_time_column = 'Perten_DateTime'
+
+# Ключ пробы: время по часам Perten (без колонки raw_time_column - DateTime)
+# и значения, одинаковые пробы различаются номером
+def sample_keys(perten_df, columns=('Grain', '%mois', 'TW', 'Temp')):
+    if raw_time_column in perten_df.columns:
+        keys = perten_df[raw_time_column].astype(str)
+    else:
+        keys = perten_df['DateTime'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    for col in columns:
+        keys = keys + '|' + perten_df[col].astype(str)
+    return keys + '#' + keys.groupby(keys).cumcount().astype(str)
+
+# Продолжение с сохраненного состояния: строки сушилки только дописывались,
+# пробы из состояния есть в выгрузке Perten, таблица результата совпадает по длине.
+# Возвращает состояние и прежнюю таблицу (с DateTime строк сушилки) или пустое
+# состояние и None, если все нужно строить заново
+def resume(output_file, row_times, keys):
+    path = state_file(output_file)
+    table = locate_table(output_file)
+    if not path.exists() or not table.exists():
+        return empty_state(), None
+    state = load_state(path)
+    rows = state['rows']
+    if rows > len(row_times) or (rows and row_times.iloc[rows - 1] != state['last_row_time']):
+        return empty_state(), None
+    if not set(state['samples']).issubset(set(keys)):
+        return empty_state(), None
+    previous = read_table(table)
+    if len(previous) != rows:
+        return empty_state(), None
+    previous['DateTime'] = row_times.iloc[:rows].to_numpy()
+    return state, previous
+
+# Сопоставление новых проб только со свободными строками: строки, занятые
+# прежними пробами, исключаются, а при заданном допуске поиск идет лишь в окне
+# времени новых проб. Возвращает позицию строки для каждой пробы (-1 - нет)
+def match_free_rows(sample_times, row_times, taken, tolerance=None):
+    samples = np.asarray(sample_times, dtype='datetime64[ns]')
+    times = np.asarray(row_times, dtype='datetime64[ns]')
+    if not len(samples):
+        return np.zeros(0, dtype=np.int64)
+    lo, hi = 0, len(times)
+    if tolerance is not None:
+        lo = np.searchsorted(times, samples.min() - pd.Timedelta(tolerance).to_timedelta64(), side='left')
+        hi = np.searchsorted(times, samples.max() + pd.Timedelta(tolerance).to_timedelta64(), side='right')
+    positions = np.arange(lo, hi)
+    positions = positions[~np.isin(positions, np.asarray(taken, dtype=np.int64))]
+    found = match_nearest(samples, times[positions], tolerance)
+    return np.where(found >= 0, positions[np.maximum(found, 0)], -1)
+
+# Промежутки пересчета: для каждой измененной строки - от предыдущего до следующего
+# узла (без узла - до края таблицы). Пересекающиеся промежутки сливаются
+def gap_ranges(knots, touched, count):
+    knots = np.unique(np.asarray(knots, dtype=np.int64))
+    touched = np.unique(np.asarray(touched, dtype=np.int64))
+    if not len(touched) or not count:
+        return []
+    before = np.searchsorted(knots, touched, side='left') - 1
+    after = np.searchsorted(knots, touched, side='right')
+    starts = np.where(before >= 0, knots[np.maximum(before, 0)], 0)
+    ends = np.where(after < len(knots), knots[np.minimum(after, len(knots) - 1)], count - 1)
+    ranges = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], end)
+        else:
+            ranges.append([start, end])
+    return ranges
+
+# Позиции всех строк промежутков
+def range_rows(ranges):
+    if not ranges:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate([np.arange(start, end + 1) for start, end in ranges])
+
+# Непрерывные отрезки [start, end] из набора позиций строк
+def row_runs(rows):
+    rows = np.unique(np.asarray(rows, dtype=np.int64))
+    if not len(rows):
+        return []
+    breaks = np.flatnonzero(np.diff(rows) != 1)
+    return [[int(start), int(end)] for start, end in zip(rows[np.r_[0, breaks + 1]], rows[np.r_[breaks, len(rows) - 1]])]
+
+# Линейная интерполяция колонки по узлам только внутри промежутков: на отрезке
+# между соседними узлами результат тот же, что при интерполяции всей колонки
+def interpolate_gaps(column, knot_rows, knot_values, ranges, decimals=3):
+    column = pd.to_numeric(column, errors='coerce').astype(float)
+    knot_rows = np.asarray(knot_rows, dtype=np.int64)
+    knot_values = np.asarray(knot_values, dtype=float)
+    for start, end in ranges:
+        part = np.full(end - start + 1, np.nan)
+        inside = (knot_rows >= start) & (knot_rows <= end)
+        part[knot_rows[inside] - start] = knot_values[inside]
+        filled = pd.Series(part).interpolate(method='linear', limit_direction='both').round(decimals)
+        column.iloc[start:end + 1] = filled.to_numpy()
+    return column
@@ -1,5 +1,6 @@
 import pandas as pd
-import re
+
+from durations import decode_duration_columns
 
 # Путь к вашему файлу (замените на актуальный путь)
 input_file_path = 'dryer_data.csv'
@@ -36,25 +37,8 @@ df['timestamp'] = df.index
 cols = ['timestamp'] + [col for col in df.columns if col != 'timestamp']
 df = df[cols]
 
-# Преобразуйте формат времени PT40S в секунды
-def convert_time_to_seconds(x):
-    if isinstance(x, str) and x.startswith('PT'):
-        match = re.search(r'(\d+)M', x)
-        minutes = 0
-        if match:
-            minutes = int(match.group(1))
-        
-        match = re.search(r'(\d+)S', x)
-        seconds = 0
-        if match:
-            seconds = int(match.group(1))
-        
-        return minutes * 60 + seconds
-    return x
-
-for col in df.columns:
-    if col != 'timestamp':
-        df[col] = df[col].apply(convert_time_to_seconds)
+# Преобразуйте формат времени PT40S в секунды (только столбцы-длительности)
+df = decode_duration_columns(df)
 
 # Разделите данные по разным файлам
 # temps.csv
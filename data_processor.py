@@ -1,35 +1,53 @@
+import argparse
+from pathlib import Path
 
-import pandas as pd
-
-# Путь к вашему файлу (замените на актуальный путь)
-file_path = 'moisture_Perten_2024.txt'
-
-# Список для хранения данных
-data = []
-
-# Откройте файл и прочитайте его строка за строкой
-with open(file_path, 'r') as file:
-    for line in file:
-        # Разделите строку по пробелам или табуляции, игнорируя пустые значения
-        values = [x for x in line.strip().split() if x]
-        
-        # Пропустите столбец ID (N/A)
-        if len(values) > 4:
-            date = values[0]
-            time = values[1]
-            grain = values[2]
-            mois = values[4]
-            tw = values[5]
-            temp = values[6]
-            
-            # Добавьте данные в список
-            data.append([date, time, grain, mois, tw, temp])
-
-# Создайте DataFrame из данных
-df = pd.DataFrame(data, columns=['Date', 'Time', 'Grain', '%mois', 'TW', 'Temp'])
-
-# Сохраните результат в новый CSV-файл
-output_file_path = 'perten_data.csv'
-df.to_csv(output_file_path, index=False)
-
-print(f"Данные успешно сохранены в файл: {output_file_path}")
+from perten_parser import can_resume, empty_state, load_state, save_state, stream_export
+from storage import locate_table, write_table
+
+# Пути к файлам
+input_dir = Path('input')
+output_dir = Path('output')
+file_path = input_dir / 'moisture_Perten_2024.txt'
+# Полная таблица выгрузки (все колонки прибора) и краткая - для остальных скриптов
+export_file = output_dir / 'perten_export.csv'
+output_file_path = output_dir / 'perten_data.csv'
+state_file = output_dir / 'perten_export_state.json'
+
+short_columns = ['Date', 'Time', 'Grain', '%mois', 'TW', 'Temp']
+
+parser = argparse.ArgumentParser(description='Разбор текстовой выгрузки Perten AM5200A')
+parser.add_argument('--full', action='store_true',
+                    help=f'разобрать файл заново, не продолжая с сохраненного смещения из {state_file}')
+args = parser.parse_args()
+
+# Создаем выходную директорию
+output_dir.mkdir(parents=True, exist_ok=True)
+
+# Продолжаем с сохраненного смещения, если файл только дописывался
+# и обе таблицы на месте, иначе разбираем весь файл
+state = load_state(state_file)
+resume = (not args.full and can_resume(file_path, state)
+          and locate_table(export_file).exists() and output_file_path.exists())
+if resume:
+    print(f"Продолжение разбора {file_path} с байта {state['offset']}")
+else:
+    state = empty_state()
+
+# Разбираем файл блоками, каждый блок сразу дописывается в таблицы,
+# после записи сохраняется смещение
+append = resume
+new_rows = 0
+for df, malformed, offset in stream_export(file_path, state):
+    if not df.empty:
+        write_table(df, export_file, append=append)
+        write_table(df[short_columns], output_file_path, 'csv', append=append)
+        append = True
+    new_rows += len(df)
+    state['offset'] = offset
+    state['rows'] += len(df)
+    state['malformed'] = {reason: state['malformed'][reason] + count for reason, count in malformed.items()}
+    save_state(state, state_file)
+
+skipped = ', '.join(f'{reason}: {count}' for reason, count in state['malformed'].items() if count)
+print(f"Новых проб: {new_rows}, всего: {state['rows']}, некорректных строк: {skipped or 'нет'}")
+print(f"Данные успешно сохранены в файл: {output_file_path} (все колонки - {locate_table(export_file)})")
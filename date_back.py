@@ -1,36 +1,43 @@
-import pandas as pd
 from pathlib import Path
-from datetime import timedelta
+
+from clock_offset import apply_offset, dryer_readings, estimate_offset, offset_file, perten_readings, save_estimate
+from combine_state import raw_time_column
+from storage import read_table, write_table
+from timestamps import format_datetime
 
 # Пути к файлам
 input_dir = Path('input')
 output_dir = Path('output')
 perten_file = input_dir / 'perten_data_v1.csv'
+# Посекундная таблица сушилки: в ней есть показания Perten, записанные самой сушилкой
+moistures_file = input_dir / 'moistures_temps.csv'
 output_file = output_dir / 'perten_data_shifted.csv'
 
 # Создаем выходную директорию 
 output_dir.mkdir(parents=True, exist_ok=True)
 
-# Загружаем данные
-perten_df = pd.read_csv(perten_file)
-
-# Преобразование времени в datetime
-def parse_time(row):
-    return pd.to_datetime(row['Date'] + ' ' + row['Time'], format='%d-%m-%Y %H:%M:%S', errors='coerce')
-
-perten_df['DateTime'] = perten_df.apply(parse_time, axis=1)
-
-# Сдвиг времени на 10667 секунд назад
-time_shift = timedelta(seconds=10667)
-perten_df['DateTime'] = perten_df['DateTime'] - time_shift
+# Загружаем данные (DateTime строится при чтении)
+perten_df = read_table(perten_file)
+
+# Оцениваем смещение часов Perten по совпадающим показаниям сушилки
+# (раньше - подобранная вручную константа 10667 секунд) и сдвигаем метки
+moistures_df = read_table(moistures_file, columns=['DRY_MOISTURE', 'DRY_TEMP', 'WET_MOISTURE', 'WET_TEMP'])
+estimate = estimate_offset(perten_readings(perten_df), dryer_readings(moistures_df))
+if estimate is None:
+    raise ValueError(f"В {moistures_file} нет показаний, совпадающих с {perten_file}: смещение не оценить")
+print(f"Смещение часов Perten: {estimate['offset']:.0f} с по {estimate['pairs']} парам, узлов дрейфа: {len(estimate['knots'])}")
+# Время по часам Perten остается в отдельной колонке: по нему объединение
+# узнает уже подставленные пробы, когда сдвиг пересчитан по новым данным
+perten_df[raw_time_column] = perten_df['DateTime'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+perten_df['DateTime'] = apply_offset(perten_df['DateTime'], estimate)
+save_estimate(estimate)
 
 # Разделяем DateTime обратно на Date и Time
-perten_df['Date'] = perten_df['DateTime'].dt.strftime('%d-%m-%Y')
-perten_df['Time'] = perten_df['DateTime'].dt.strftime('%H:%M:%S')
+perten_df['Date'], perten_df['Time'] = format_datetime(perten_df['DateTime'])
 
 # Удаляем временной столбец
 perten_df = perten_df.drop(columns=['DateTime'])
 
 # Сохраняем результат
-perten_df.to_csv(output_file, index=False)
-print(f"Сдвинутые данные сохранены в {output_file}")
\ No newline at end of file
+output_path = write_table(perten_df, output_file)
+print(f"Сдвинутые данные сохранены в {output_path}")
\ No newline at end of file
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+# Объем бункера сбросов по сушилкам: масса сброса = натура * объем.
+# Для нескольких сушилок в одной таблице сушилка задается колонкой dryer_column
+bin_volumes = {'default': 497.2}
+default_dryer = 'default'
+dryer_column = 'DRYER'
+
+# Пороги сухого и пересушенного зерна по влажности: для рапса до 9.5 %, для остальных до 14.5 %
+dry_limits = {'raps': 9.5}
+default_dry_limit = 14.5
+
+# Объем бункера для каждой строки: по колонке сушилки или одной сушилки на всю таблицу
+def row_bin_volume(df, dryer=default_dryer):
+    if dryer_column in df.columns:
+        return df[dryer_column].map(bin_volumes).astype(float)
+    return pd.Series(bin_volumes[dryer], index=df.index, dtype=float)
+
+# Масса сухого зерна по сбросам: в строке, где счетчик DROPS_SCORE изменился
+# (и не ноль), а сухая проба в допуске, масса равна натуре, умноженной на объем бункера.
+# Первая строка каждой сушилки не считается сбросом, пропуск счетчика - изменение
+def drop_dry_mass(df, dryer=default_dryer):
+    drops = df['DROPS_SCORE'].astype(float)
+    if dryer_column in df.columns:
+        groups = df[dryer_column]
+        previous = drops.groupby(groups).shift()
+        first = ~groups.duplicated()
+    else:
+        previous = drops.shift()
+        first = pd.Series(np.arange(len(df)) == 0, index=df.index)
+    changed = (drops != previous) & (drops != 0) & ~first
+
+    grains = df['perten_dry_Grain'].fillna('').astype(str).str.lower()
+    limits = grains.map(dry_limits).fillna(default_dry_limit)
+    moisture = df['perten_dry_Moisture']
+    is_dry = (moisture > 0) & (moisture <= limits)
+
+    nature = df['perten_dry_Nature']
+    mass = (nature * row_bin_volume(df, dryer)).round(3)
+    return mass.where(changed & is_dry & (nature != 0), 0.0)
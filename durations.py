@@ -0,0 +1,39 @@
+import logging
+import re
+from functools import lru_cache
+
+# Переменные сушилки, значения которых приходят в формате ISO-8601 (PT1M19S)
+duration_variables = ['DROPS_SET_TIMER']
+
+duration_pattern = re.compile(r'^PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+(?:\.\d+)?)S)?$')
+
+# Преобразование одного значения ISO-времени в секунды.
+# Различных значений таймера всего несколько десятков, поэтому результат кэшируется
+@lru_cache(maxsize=None)
+def iso_to_seconds(value):
+    if not isinstance(value, str):
+        return value
+
+    # Убираем все кавычки и пробелы
+    text = value.strip().strip('"')
+    match = duration_pattern.match(text)
+    if not match or text == 'PT':
+        logging.warning(f"Некорректный формат ISO-времени: '{value}'")
+        return None
+
+    hours, minutes, seconds = match.groups()
+    total = int(hours or 0) * 3600 + int(minutes or 0) * 60 + float(seconds or 0)
+    return int(total)
+
+# Преобразование целого столбца: уникальные значения разбираются один раз
+# и результат раскладывается обратно по строкам
+def decode_durations(series):
+    decoded = {value: iso_to_seconds(value) for value in series.dropna().unique()}
+    return series.map(decoded)
+
+# Преобразование всех столбцов-длительностей таблицы
+def decode_duration_columns(df, columns=None):
+    for col in columns or duration_variables:
+        if col in df.columns:
+            df[col] = decode_durations(df[col])
+    return df
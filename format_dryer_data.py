@@ -1,40 +1,34 @@
 import pandas as pd
-import isodate  # Для парсинга строки в формате ISO 8601
 
-# Загрузка данных из CSV-файла
-df = pd.read_csv('dryer_data.csv')
+from durations import decode_durations
+from timestamps import format_datetime, parse_timestamps
 
-# Преобразование столбца 'timestamp' в формат datetime
-# Указываем format='mixed', чтобы Pandas сам определил формат
-df['timestamp'] = pd.to_datetime(df['timestamp'], format='mixed')
+# Размер порции: файл читается частями, чтобы не держать всю выгрузку в памяти
+chunksize = 200000
 
-# Разделение на столбцы 'Date' и 'Time'
-df['Date'] = df['timestamp'].dt.strftime('%d-%m-%Y')  # Формат dd-mm-yyyy
-df['Time'] = df['timestamp'].dt.strftime('%H:%M:%S')  # Формат HH:MM:SS
+# Обработка одной порции данных
+def format_chunk(df):
+    # Преобразование столбца 'timestamp' в формат datetime
+    # Указываем format='mixed', чтобы Pandas сам определил формат
+    df['timestamp'] = parse_timestamps(df['timestamp'], fmt='mixed', errors='raise')
 
-# Удаление исходного столбца 'timestamp'
-df = df.drop(columns=['timestamp'])
+    # Разделение на столбцы 'Date' (dd-mm-yyyy) и 'Time' (HH:MM:SS)
+    df['Date'], df['Time'] = format_datetime(df['timestamp'])
 
-# Удаление столбца 'measured'
-df = df.drop(columns=['measured'])
+    # Удаление исходного столбца 'timestamp'
+    df = df.drop(columns=['timestamp'])
 
-# Функция для преобразования времени в секунды
-def convert_to_seconds(iso_duration):
-    try:
-        # Удаляем лишние кавычки и парсим строку
-        duration = isodate.parse_duration(iso_duration.strip('"'))
-        # Возвращаем общее количество секунд
-        return int(duration.total_seconds())
-    except (ValueError, AttributeError):
-        # Если формат некорректен, возвращаем None
-        return None
+    # Удаление столбца 'measured'
+    df = df.drop(columns=['measured'])
 
-# Применяем функцию к столбцу DROPS_SET_TIMER
-df['DROPS_SET_TIMER'] = df['DROPS_SET_TIMER'].apply(convert_to_seconds)
+    # Преобразуем столбец DROPS_SET_TIMER в секунды
+    df['DROPS_SET_TIMER'] = decode_durations(df['DROPS_SET_TIMER'])
 
-# Переупорядочиваем столбцы, чтобы 'Date' и 'Time' были в начале
-column_order = ['Date', 'Time'] + [col for col in df.columns if col not in ['Date', 'Time']]
-df = df[column_order]
+    # Переупорядочиваем столбцы, чтобы 'Date' и 'Time' были в начале
+    column_order = ['Date', 'Time'] + [col for col in df.columns if col not in ['Date', 'Time']]
+    df = df[column_order]
+    return df
 
-# Сохранение изменений обратно в CSV-файл
-df.to_csv('dryer_data_updated.csv', index=False)
\ No newline at end of file
+# Обрабатываем файл порциями и дописываем результат
+for i, chunk in enumerate(pd.read_csv('dryer_data.csv', chunksize=chunksize)):
+    format_chunk(chunk).to_csv('dryer_data_updated.csv', index=False, mode='w' if i == 0 else 'a', header=(i == 0))
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+# Сопоставление проб Perten со строками сушилки: каждая проба по очереди
+# занимает ближайшую по времени свободную строку (при равенстве - более раннюю).
+# Свободные строки слева и справа от позиции пробы ищутся через два массива
+# ссылок "следующая свободная" со сжатием путей, поэтому весь проход почти
+# линейный. tolerance - максимальная разница во времени, пробы дальше нее
+# остаются без строки. Возвращает позицию строки для каждой пробы (-1 - нет)
+def match_nearest(sample_times, row_times, tolerance=None):
+    samples = np.asarray(sample_times, dtype='datetime64[ns]').astype(np.int64)
+    rows = np.asarray(row_times, dtype='datetime64[ns]').astype(np.int64)
+    if len(rows) > 1 and (np.diff(rows) < 0).any():
+        raise ValueError("Строки для сопоставления должны быть отсортированы по времени")
+    limit = None if tolerance is None else pd.Timedelta(tolerance).value
+
+    count = len(rows)
+    # right[i] - первая свободная строка не раньше i (count - нет такой),
+    # left[i] - последняя свободная строка раньше i, со сдвигом на 1 (0 - нет такой)
+    right = list(range(count + 1))
+    left = list(range(count + 1))
+
+    def find(links, i):
+        while links[i] != i:
+            links[i] = links[links[i]]
+            i = links[i]
+        return i
+
+    row_values = rows.tolist()
+    matches = np.full(len(samples), -1, dtype=np.int64)
+    positions = np.searchsorted(rows, samples, side='left').tolist()
+    for k, (time, position) in enumerate(zip(samples.tolist(), positions)):
+        after = find(right, position)
+        before = find(left, position) - 1
+        if before > 0 and row_values[before - 1] == row_values[before]:
+            # Среди строк с одинаковым временем берем самую раннюю свободную
+            before = find(right, int(np.searchsorted(rows, rows[before], side='left')))
+        if before < 0 and after == count:
+            break  # свободных строк не осталось
+        if after == count or (before >= 0 and time - row_values[before] <= row_values[after] - time):
+            chosen = before
+        else:
+            chosen = after
+        if limit is not None and abs(row_values[chosen] - time) > limit:
+            continue
+        matches[k] = chosen
+        right[chosen] = chosen + 1
+        left[chosen + 1] = chosen
+    return matches
+
+# Статус пробы по виду зерна и влажности: для рапса сухое 7-9.5 %,
+# для остальных культур 12-14.5 %, выше - влажное, ниже - пересушенное
+def grain_status(grains, moistures):
+    raps = (pd.Series(grains).astype(str).str.lower() == 'raps').to_numpy()
+    moistures = pd.to_numeric(pd.Series(moistures), errors='coerce').to_numpy(dtype=float)
+    high = np.where(raps, 9.5, 14.5)
+    low = np.where(raps, 7, 12)
+    return np.select([moistures > high, moistures >= low], ['wet', 'dry'], 'overdry')
@@ -0,0 +1,16 @@
+import numpy as np
+
+from schema import mode_variables
+from segments import value_intervals
+
+# Активный режим строки: первый истинный флаг в порядке приоритета mode_variables,
+# пустая строка - ни один флаг не активен. Выбор идет одной операцией по матрице флагов
+def resolve_mode(df, columns=mode_variables):
+    flags = df[columns].eq(True).fillna(False).to_numpy(dtype=bool)
+    first = flags.argmax(axis=1)
+    return np.where(flags.any(axis=1), np.asarray(columns, dtype=object)[first], '')
+
+# Таблица отрезков режимов: mode, Start, End, Duration (в минутах).
+# Время без активного режима в таблицу не попадает
+def mode_intervals(df):
+    return value_intervals(df.assign(mode=df['mode'].where(df['mode'] != '')), 'mode')
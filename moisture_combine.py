@@ -1,53 +1,41 @@
-import pandas as pd
+from datetime import timedelta
 from pathlib import Path
 
+from matching import match_nearest
+from storage import read_table, write_table
+
 # Пути к файлам
 input_dir = Path('output')  # Где лежат ваши текущие файлы
-perten_file = Path('perten_data.csv')
+perten_file = input_dir / 'perten_data.csv'  # пишет data_processor.py
 output_file = input_dir / 'moistures_temps_combined.csv'
 
-# Загрузка данных
-moistures_df = pd.read_csv(input_dir / 'moistures_temps.csv')
-perten_df = pd.read_csv(perten_file)
-
-# Преобразование даты и времени в datetime
-def parse_datetime(df):
-    return pd.to_datetime(df['Date'] + ' ' + df['Time'], format='%d-%m-%Y %H:%M:%S')
-
-moistures_df['datetime'] = parse_datetime(moistures_df)
-perten_df['datetime'] = pd.to_datetime(perten_df['Date'] + ' ' + perten_df['Time'], 
-                                      format='%d-%m-%Y %H:%M:%S')
-
-# Сортировка по времени (обязательно для merge_asof)
-moistures_df = moistures_df.sort_values('datetime').reset_index(drop=True)
-perten_df = perten_df.sort_values('datetime').reset_index(drop=True)
-
-# Создаем столбец для отслеживания использования записей из perten_data.csv
-perten_df['used'] = False
-
-# Объединение данных
-for i, row in moistures_df.iterrows():
-    if perten_df.empty:
-        break  # Если все записи из perten_data.csv использованы, завершаем цикл
-    
-    # Находим ближайшую неподставленную запись
-    nearest_idx = ((perten_df['datetime'] - row['datetime']).abs()).idxmin()
-    nearest_row = perten_df.loc[nearest_idx]
-    
-    # Проверяем, что запись ещё не использована
-    if not nearest_row['used']:
-        # Подставляем данные
-        moistures_df.at[i, 'perten_Grain'] = nearest_row['Grain']
-        moistures_df.at[i, 'perten_moisture'] = nearest_row['%mois']
-        moistures_df.at[i, 'perten_TW'] = nearest_row['TW']
-        moistures_df.at[i, 'perten_Temp'] = nearest_row['Temp']
-        
-        # Отмечаем запись как использованную
-        perten_df.at[nearest_idx, 'used'] = True
+# Максимальная разница во времени между записью Perten и строкой сушилки
+match_tolerance = timedelta(hours=1)
+
+# Загрузка данных (DateTime строится при чтении), некорректные метки - ошибка
+moistures_df = read_table(input_dir / 'moistures_temps.csv')
+perten_df = read_table(perten_file)
+for name, df in [('moistures_temps', moistures_df), ('perten_data', perten_df)]:
+    if df['DateTime'].isna().any():
+        raise ValueError(f"В {name} некорректных временных меток: {df['DateTime'].isna().sum()}")
+
+# Сортировка по времени (обязательно для сопоставления)
+moistures_df = moistures_df.sort_values('DateTime').reset_index(drop=True)
+perten_df = perten_df.sort_values('DateTime').reset_index(drop=True)
+
+# Объединение данных: каждая запись perten_data.csv занимает ближайшую по времени
+# свободную строку, записи дальше match_tolerance не подставляются
+matches = match_nearest(perten_df['DateTime'], moistures_df['DateTime'], match_tolerance)
+matched = perten_df[matches >= 0]
+rows = matches[matches >= 0]
+for target, source in {'perten_Grain': 'Grain', 'perten_moisture': '%mois',
+                       'perten_TW': 'TW', 'perten_Temp': 'Temp'}.items():
+    moistures_df[target] = None
+    moistures_df.loc[rows, target] = matched[source].to_numpy()
 
 # Удаляем временные колонки
-moistures_df = moistures_df.drop(columns=['datetime'])
+moistures_df = moistures_df.drop(columns=['DateTime'])
 
 # Сохранение результата
-moistures_df.to_csv(output_file, index=False)
-print(f"Объединенные данные сохранены в {output_file}")
\ No newline at end of file
+output_path = write_table(moistures_df, output_file)
+print(f"Объединенные данные сохранены в {output_path}")
\ No newline at end of file
@@ -1,6 +1,7 @@
 import pandas as pd
 from pathlib import Path
-from datetime import datetime, timedelta
+
+from timestamps import format_datetime, parse_timestamps
 
 # Путь к файлу
 input_file = Path('./input/moisture_data.csv')
@@ -12,26 +13,12 @@ df = pd.read_csv(input_file)
 # Удаляем ненужные колонки
 df = df.drop(columns=['result_id', 'created_at', 'status', 'processed_at', 'processed_by'], errors='ignore')
 
-# Обработка временной метки (timestamp)
-def process_timestamp(ts_str):
-    try:
-        # Удаляем миллисекунды
-        ts_str = ts_str.split('.')[0]
-        # Парсим как UTC и добавляем 2 часа (местное время)
-        ts_utc = datetime.strptime(ts_str, '%Y-%m-%d %H:%M:%S')
-        ts_local = ts_utc + timedelta(hours=2)  # Ваш часовой пояс +2
-        return {
-            'Date': ts_local.strftime('%d-%m-%Y'),
-            'Time': ts_local.strftime('%H:%M:%S')
-        }
-    except:
-        return {'Date': '', 'Time': ''}
-
-# Применяем обработку к столбцу timestamp
-df['DateTime'] = df['timestamp'].apply(lambda x: process_timestamp(x))
-df['Date'] = df['DateTime'].apply(lambda x: x['Date'])
-df['Time'] = df['DateTime'].apply(lambda x: x['Time'])
-df = df.drop(columns=['timestamp', 'DateTime'])
+# Обработка временной метки (timestamp): удаляем миллисекунды, разбираем как UTC
+# и переводим в местное время влагомера (фиксированный UTC+2; в обозначении
+# Etc/GMT знак инвертирован)
+timestamps = parse_timestamps(df['timestamp'].astype(str).str.split('.', n=1).str[0], tz='Etc/GMT-2')
+df['Date'], df['Time'] = format_datetime(timestamps)
+df = df.drop(columns=['timestamp'])
 
 # Переименовываем колонки
 df = df.rename(columns={
@@ -42,7 +29,7 @@ df = df.rename(columns={
 })
 
 # Сортировка по времени
-df['DateTime'] = pd.to_datetime(df['Date'] + ' ' + df['Time'], format='%d-%m-%Y %H:%M:%S')
+df['DateTime'] = timestamps
 df = df.sort_values(by='DateTime')
 
 # Упорядочиваем колонки: Date и Time в начале
@@ -1,6 +1,11 @@
-import pandas as pd
+from datetime import timedelta
 from pathlib import Path
 
+from clock_offset import align_perten
+from matching import grain_status, match_nearest
+from modes import resolve_mode
+from storage import read_table, write_table
+
 # Пути к файлам
 input_dir = Path('input')
 output_dir = Path('output')
@@ -10,27 +15,29 @@ moistures_file = input_dir / 'moistures_temps_v1.csv'
 mode_file = input_dir / 'mode_optimized.csv'
 output_file = output_dir / 'moistures_temps_mass1.csv'
 
+# Максимальная разница во времени между пробой Perten и строкой сушилки
+match_tolerance = timedelta(hours=1)
+
 # Создаем выходную директорию
 output_dir.mkdir(parents=True, exist_ok=True)
 
-# Загружаем данные
-moistures_df = pd.read_csv(moistures_file)
-perten_df = pd.read_csv(perten_file)
-mode_df = pd.read_csv(mode_file)
-
-# Преобразование времени в datetime
-def parse_time(df):
-    return pd.to_datetime(df['Date'] + ' ' + df['Time'], format='%d-%m-%Y %H:%M:%S', errors='coerce')
-
-moistures_df['DateTime'] = parse_time(moistures_df)
-perten_df['DateTime'] = parse_time(perten_df)
-mode_df['DateTime'] = parse_time(mode_df)
+# Загружаем данные (DateTime строится при чтении)
+moistures_df = read_table(moistures_file)
+perten_df = read_table(perten_file)
+mode_df = read_table(mode_file)
 
 # Очищаем данные от некорректных временных меток
 moistures_df = moistures_df.dropna(subset=['DateTime']).sort_values('DateTime').reset_index(drop=True)
 perten_df = perten_df.dropna(subset=['DateTime']).sort_values('DateTime').reset_index(drop=True)
 mode_df = mode_df.dropna(subset=['DateTime']).sort_values('DateTime').reset_index(drop=True)
 
+# Сверяем часы Perten с показаниями, записанными сушилкой: если они расходятся,
+# метки Perten переводятся на часы сушилки с учетом дрейфа
+perten_df, estimate, resorted = align_perten(perten_df, moistures_df)
+if estimate is not None:
+    print(f"Часы Perten сдвинуты на {estimate['offset']:.0f} с (пар показаний: {estimate['pairs']}), "
+          f"строк переставлено: {resorted}")
+
 # Переименовываем колонки Perten
 perten_df = perten_df.rename(columns={
     'Grain': 'perten_Grain',
@@ -39,26 +46,6 @@ perten_df = perten_df.rename(columns={
     'Temp': 'perten_Temperature'
 })
 
-# Функция для определения статуса зерна
-def classify_grain(row):
-    grain = row['perten_Grain'].lower() if isinstance(row['perten_Grain'], str) else ''
-    moisture = row['perten_Moisture']
-
-    if grain == 'raps':
-        if moisture > 9.5:
-            return 'wet'
-        elif 7 <= moisture <= 9.5:
-            return 'dry'
-        else:
-            return 'overdry'
-    else:
-        if moisture > 14.5:
-            return 'wet'
-        elif 12 <= moisture <= 14.5:
-            return 'dry'
-        else:
-            return 'overdry'
-
 # Создаем копию moistures_df для обработки
 combined_df = moistures_df.copy()
 
@@ -67,53 +54,31 @@ for col in ['perten_dry_grain', 'perten_dry_moisture', 'perten_dry_nature', 'per
             'perten_wet_grain', 'perten_wet_moisture', 'perten_wet_nature', 'perten_wet_temp', 'mode']:
     combined_df[col] = ''
 
-# Подстановка данных Perten
-used_perten = set()
-
-for p_idx, p_row in perten_df.iterrows():
-    if p_idx in used_perten:
-        continue
-    
-    available = combined_df[combined_df['perten_dry_moisture'] == '']
-    if available.empty:
-        break
-
-    time_diff = (available['DateTime'] - p_row['DateTime']).abs()
-    closest_idx = time_diff.idxmin()
-
-    status = classify_grain(p_row)
-    
-    if status in ['dry', 'overdry']:
-        combined_df.at[closest_idx, 'perten_dry_grain'] = p_row['perten_Grain']
-        combined_df.at[closest_idx, 'perten_dry_moisture'] = p_row['perten_Moisture']
-        combined_df.at[closest_idx, 'perten_dry_nature'] = p_row['perten_Nature']
-        combined_df.at[closest_idx, 'perten_dry_temp'] = p_row['perten_Temperature']
-    else:  
-        combined_df.at[closest_idx, 'perten_wet_grain'] = p_row['perten_Grain']
-        combined_df.at[closest_idx, 'perten_wet_moisture'] = p_row['perten_Moisture']
-        combined_df.at[closest_idx, 'perten_wet_nature'] = p_row['perten_Nature']
-        combined_df.at[closest_idx, 'perten_wet_temp'] = p_row['perten_Temperature']
-
-    used_perten.add(p_idx)
-
-# Подстановка данных из mode_optimized.csv
-for m_idx, m_row in mode_df.iterrows():
-    available = combined_df[combined_df['mode'] == '']
-    if available.empty:
-        break
-
-    time_diff = (available['DateTime'] - m_row['DateTime']).abs()
-    closest_idx = time_diff.idxmin()
-
-    # Выбираем первый True
-    mode_columns = ['FILLING', 'DRYING', 'RECYCLING', 'EMPTY', 'SHUTDOWN', 'STOP', 'COOLING', 'MANUAL']
-    active_mode = next((col for col in mode_columns if m_row.get(col, False)), '')
-
-    combined_df.at[closest_idx, 'mode'] = active_mode
+# Подстановка данных Perten: каждая проба занимает ближайшую свободную строку,
+# пробы дальше match_tolerance от любой свободной строки не подставляются
+matches = match_nearest(perten_df['DateTime'], combined_df['DateTime'], match_tolerance)
+matched = perten_df[matches >= 0]
+rows = matches[matches >= 0]
+is_dry = grain_status(matched['perten_Grain'], matched['perten_Moisture']) != 'wet'
+for prefix, mask in [('perten_dry', is_dry), ('perten_wet', ~is_dry)]:
+    for col, source in {'grain': 'perten_Grain', 'moisture': 'perten_Moisture',
+                        'nature': 'perten_Nature', 'temp': 'perten_Temperature'}.items():
+        combined_df.loc[rows[mask], f'{prefix}_{col}'] = matched[source].to_numpy()[mask]
+
+# Подстановка данных из mode_optimized.csv: режим минуты - первый True по приоритету
+# (пустой флаг считается активным, как в прежнем построчном цикле),
+# каждая минута с активным режимом занимает ближайшую строку без режима
+mode_columns = ['FILLING', 'DRYING', 'RECYCLING', 'EMPTY', 'SHUTDOWN', 'STOP', 'COOLING', 'MANUAL']
+mode_columns = [col for col in mode_columns if col in mode_df.columns]
+mode_flags = mode_df[mode_columns].eq(True) | mode_df[mode_columns].isna()
+mode_df['mode'] = resolve_mode(mode_flags, mode_columns)
+active_modes = mode_df[mode_df['mode'] != '']
+mode_matches = match_nearest(active_modes['DateTime'], combined_df['DateTime'])
+combined_df.loc[mode_matches[mode_matches >= 0], 'mode'] = active_modes['mode'].to_numpy()[mode_matches >= 0]
 
 # Удаляем временной столбец
 combined_df = combined_df.drop(columns=['DateTime'])
 
 # Сохраняем результат
-combined_df.to_csv(output_file, index=False)
-print(f"Данные сохранены в {output_file}")
\ No newline at end of file
+output_path = write_table(combined_df, output_file)
+print(f"Данные сохранены в {output_path}")
\ No newline at end of file
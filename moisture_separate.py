@@ -1,6 +1,7 @@
-import pandas as pd
 from pathlib import Path
 
+from storage import read_table, write_table
+
 # Пути к файлам
 input_dir = Path('input')
 output_dir = Path('output')
@@ -11,7 +12,7 @@ output_file = output_dir / 'perten_data_classified.csv'
 output_dir.mkdir(parents=True, exist_ok=True)
 
 # Загружаем данные
-perten_df = pd.read_csv(perten_file)
+perten_df = read_table(perten_file)
 
 # Функция для определения статуса зерна
 def classify_grain(row):
@@ -41,5 +42,5 @@ columns_order = ['Date', 'Time', 'Grain', '%mois', 'TW', 'Temp', 'Grain_Status']
 perten_df = perten_df[columns_order]
 
 # Сохраняем результат
-perten_df.to_csv(output_file, index=False)
-print(f"Данные с классификацией сохранены в {output_file}")
\ No newline at end of file
+output_path = write_table(perten_df, output_file)
+print(f"Данные с классификацией сохранены в {output_path}")
\ No newline at end of file
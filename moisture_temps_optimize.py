@@ -1,6 +1,8 @@
-import pandas as pd
 from pathlib import Path
 
+from resampling import minute_table
+from storage import read_table, write_table
+
 # Пути к файлам
 input_dir = Path('input')
 output_dir = Path('output')
@@ -10,48 +12,12 @@ output_file = output_dir / 'moistures_temps_optimized.csv'
 # Создаем выходную директорию
 output_dir.mkdir(parents=True, exist_ok=True)
 
-# Загружаем данные
-moistures_df = pd.read_csv(moistures_file)
-
-# Преобразование времени в datetime
-def parse_time(row):
-    return pd.to_datetime(row['Date'] + ' ' + row['Time'], format='%d-%m-%Y %H:%M:%S', errors='coerce')
-
-moistures_df['DateTime'] = moistures_df.apply(parse_time, axis=1)
-
-# Очищаем данные от некорректных временных меток
-moistures_df = moistures_df.dropna(subset=['DateTime']).sort_values('DateTime').reset_index(drop=True)
-
-# Группируем данные по дате и минуте
-moistures_df['MinuteKey'] = moistures_df['DateTime'].dt.strftime('%d-%m-%Y %H:%M')  # Ключ для группировки (до минуты)
-grouped = moistures_df.groupby('MinuteKey', group_keys=False)  # group_keys=False устраняет предупреждение
-
-# Функция для объединения данных в группе
-def combine_group(group):
-    combined_row = {}
-    for col in group.columns:
-        if col in ['DateTime', 'MinuteKey']:
-            continue  # Пропускаем служебные колонки
-        # Берем первое непустое значение в группе
-        non_empty_values = group[col].dropna()
-        if not non_empty_values.empty:
-            combined_row[col] = non_empty_values.iloc[0]
-        else:
-            combined_row[col] = ''  # Если все значения пустые, оставляем пустым
-    # Добавляем MinuteKey для последующего использования
-    combined_row['MinuteKey'] = group['MinuteKey'].iloc[0]
-    return pd.Series(combined_row)
-
-# Применяем функцию к каждой группе
-optimized_df = grouped.apply(combine_group).reset_index(drop=True)
-
-# Восстанавливаем Date и Time из MinuteKey
-optimized_df['Date'] = optimized_df['MinuteKey'].str[:10]
-optimized_df['Time'] = optimized_df['MinuteKey'].str[11:] + ':00'  # Добавляем секунды ":00"
+# Загружаем данные (DateTime строится при чтении)
+moistures_df = read_table(moistures_file)
 
-# Удаляем временные колонки
-optimized_df = optimized_df.drop(columns=['MinuteKey'])
+# Сворачиваем данные по минутам: для всех колонок берем первое непустое значение
+optimized_df = minute_table('moistures_temps.csv', moistures_df)
 
 # Сохраняем результат
-optimized_df.to_csv(output_file, index=False)
-print(f"Оптимизированные данные сохранены в {output_file}")
\ No newline at end of file
+output_path = write_table(optimized_df, output_file)
+print(f"Оптимизированные данные сохранены в {output_path}")
@@ -1,7 +1,17 @@
 import pandas as pd
 from datetime import datetime
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
 import logging
+import time
+
+from durations import decode_duration_columns, duration_variables, iso_to_seconds
+from resampling import minute_filename, minute_tables
+from schema import apply_schema
+from storage import coerce_types, storage_format, storage_formats, table_path, write_table
+from timestamps import clock_format, date_format, format_datetime, parse_timestamps, source_format
 
 # Настройка логирования
 logging.basicConfig(
@@ -16,22 +26,35 @@ logging.basicConfig(
 input_file_path = 'dryer_data.csv'
 output_dir = 'output'
 
-# Создаем выходную директорию
-Path(output_dir).mkdir(parents=True, exist_ok=True)
-logging.info("Создана выходная директория")
+# Границы обрабатываемого периода по умолчанию (переопределяются через --start/--end)
+cutoff_time = datetime(2024, 8, 7, 22, 54, 11)
+end_time = datetime(2024, 8, 30, 14, 22, 53)
+
+# Файл с отметками последних записанных данных для инкрементального режима
+watermarks_file = 'watermarks.json'
 
-# Прочитайте файл с текущим разделителем (запятая)
-try:
-    df = pd.read_csv(input_file_path)
-    logging.info(f"Файл {input_file_path} успешно загружен")
-except Exception as e:
-    logging.error(f"Ошибка при чтении файла: {e}")
-    raise
+# Все столбцы выгрузки читаются как строки, чтобы тип var_data
+# не зависел от того, какие переменные попали в порцию
+read_dtypes = {'timestamp': str, 'var_name': str, 'var_data': str}
 
-# Удалите столбец measured, если он существует
-if 'measured' in df.columns:
-    df = df.drop('measured', axis=1)
-    logging.info("Столбец 'measured' удален")
+# Колонки выходных файлов
+output_files = {
+    'temps.csv': ['Date', 'Time', 'DROPS_SCORE', 'SET_BURNERS_TEMP',
+                  'ACTUAL_BURNERS_TEMP', 'TOP_TEMP', 'MID_TEMP', 'BOTTOM_TEMP'],
+    'moistures.csv': ['Date', 'Time', 'GRAIN_TYPE', 'DROPS_SCORE', 'DRY_MOISTURE',
+                      'DRY_TEMP', 'DRY_NATURE', 'WET_MOISTURE', 'WET_TEMP', 'WET_NATURE'],
+    'moistures_temps.csv': ['Date', 'Time', 'GRAIN_TYPE', 'DROPS_SCORE', 'ACTUAL_BURNERS_TEMP',
+                            'TOP_TEMP', 'MID_TEMP', 'BOTTOM_TEMP', 'DRY_MOISTURE', 'DRY_TEMP',
+                            'DRY_NATURE', 'WET_MOISTURE', 'WET_TEMP', 'WET_NATURE'],
+    'settings.csv': ['Date', 'Time', 'DROPS_SCORE', 'DROPS_SET_TIMER', 'SET_BURNERS_TEMP',
+                     'COOLING_TIME', 'BOTTOM_TEMP_LIMIT', 'UPPER_FAN_SET_HZ',
+                     'LOWER_FAN_SET_HZ', 'MID_TEMP_LIMIT'],
+    'mode.csv': ['Date', 'Time', 'DROPS_SCORE', 'FILLING', 'DRYING', 'RECYCLING',
+                 'EMPTY', 'SHUTDOWN', 'STOP', 'COOLING', 'MANUAL'],
+    'alarms.csv': ['Date', 'Time', 'DROPS_SCORE', 'MIDDLE_LEVEL_ALARM',
+                   'HIGH_LEVEL_ALARM', 'BURNER_HIGH_ALARM', 'HOPPER_FULL_ALARM',
+                   'LOW_AIR_PRESSURE_ALARM', 'GENERAL_ALARM', 'AIR_OVERHEATED'],
+}
 
 # Обработка временной метки
 def process_timestamp(ts):
@@ -39,167 +62,437 @@ def process_timestamp(ts):
         # Удаляем микросекунды
         if '.' in ts:
             ts = ts.split('.')[0]
-        dt = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S')
+        dt = datetime.strptime(ts, source_format)
         return {
-            'Date': dt.strftime('%d-%m-%Y'),
-            'Time': dt.strftime('%H:%M:%S'),
+            'Date': dt.strftime(date_format),
+            'Time': dt.strftime(clock_format),
             'DateTime': dt  # Для сортировки
         }
     except Exception as e:
         logging.error(f"Ошибка при обработке временной метки '{ts}': {e}")
         return None
 
-# Функция для преобразования ISO-времени в секунды
-def convert_iso_to_seconds(value):
-    if isinstance(value, str):
+# Построчное объединение данных (исходный способ)
+def pivot_rows(df, start, end):
+    data_dict = {}
+    for _, row in df.iterrows():
+        raw_ts = row['timestamp']
+
+        # Проверяем, что временная метка корректна
         try:
-            # Убираем все кавычки и пробелы
-            value = value.strip().strip('"')
-            
-            # Проверяем, что формат начинается с "PT"
-            if not value.startswith('PT'):
-                logging.warning(f"Некорректный формат ISO-времени: '{value}' (не начинается с 'PT')")
-                return None
-            
-            # Убираем префикс "PT"
-            value = value[2:]
-            
-            # Разделяем минуты и секунды
-            minutes = 0
-            seconds = 0
-            if 'M' in value:
-                parts = value.split('M')
-                minutes = int(parts[0])  # Минуты
-                if 'S' in parts[1]:
-                    seconds = int(parts[1].replace('S', ''))  # Секунды
-            elif 'S' in value:
-                seconds = int(value.replace('S', ''))  # Только секунды
-            
-            # Возвращаем общее количество секунд
-            return minutes * 60 + seconds
+            processed_ts = process_timestamp(raw_ts)
+            if not processed_ts:
+                logging.warning(f"Пропущена некорректная временная метка: {raw_ts}")
+                continue
+
+            # Преобразуем в datetime для сравнения
+            timestamp_dt = processed_ts['DateTime']
+
+            # Пропускаем записи до указанного времени
+            if start is not None and timestamp_dt < start:
+                logging.debug(f"Пропущена запись до {start}: {raw_ts}")
+                continue
+
+            # Пропускаем записи после указанного времени
+            if end is not None and timestamp_dt > end:
+                logging.debug(f"Пропущена запись после {end}: {raw_ts}")
+                continue
         except Exception as e:
-            logging.warning(f"Некорректный формат ISO-времени '{value}': {e}")
-            return None
-    return value
-
-# Объединение данных
-data_dict = {}
-for _, row in df.iterrows():
-    raw_ts = row['timestamp']
-    
-    # Проверяем, что временная метка корректна
-    try:
-        processed_ts = process_timestamp(raw_ts)
-        if not processed_ts:
-            logging.warning(f"Пропущена некорректная временная метка: {raw_ts}")
-            continue
-        
-        # Преобразуем в datetime для сравнения
-        timestamp_dt = processed_ts['DateTime']
-        
-        # Пропускаем записи до указанного времени
-        cutoff_time = datetime(2024, 8, 7, 22, 54, 11)
-        if timestamp_dt < cutoff_time:
-            logging.debug(f"Пропущена запись до {cutoff_time}: {raw_ts}")
-            continue
-        
-        # Пропускаем записи после указанного времени
-        if timestamp_dt > datetime(2024, 8, 30, 14, 22, 53):
-            logging.debug(f"Пропущена запись после 2024-08-30 14:22:53: {raw_ts}")
+            logging.error(f"Ошибка при обработке временной метки '{raw_ts}': {e}")
             continue
+
+        key = f"{processed_ts['Date']} {processed_ts['Time']}"
+
+        var_name = row['var_name']
+        var_data = row['var_data']
+
+        if key not in data_dict:
+            data_dict[key] = {'Date': processed_ts['Date'],
+                             'Time': processed_ts['Time'],
+                             'DateTime': processed_ts['DateTime']}  # Для сортировки
+
+        # Специальная обработка длительностей (DROPS_SET_TIMER)
+        if var_name in duration_variables:
+            var_data = iso_to_seconds(var_data)
+
+        data_dict[key][var_name] = var_data
+
+    logging.info("Данные успешно объединены в словарь")
+    if not data_dict:
+        return pd.DataFrame(columns=['Date', 'Time', 'DateTime'])
+
+    # Создаем DataFrame
+    try:
+        df = pd.DataFrame.from_dict(data_dict, orient='index')
+        logging.info("DataFrame успешно создан из словаря")
     except Exception as e:
-        logging.error(f"Ошибка при обработке временной метки '{raw_ts}': {e}")
-        continue
-    
-    key = f"{processed_ts['Date']} {processed_ts['Time']}"
-    
-    var_name = row['var_name']
-    var_data = row['var_data']
-    
-    if key not in data_dict:
-        data_dict[key] = {'Date': processed_ts['Date'], 
-                         'Time': processed_ts['Time'],
-                         'DateTime': processed_ts['DateTime']}  # Для сортировки
-    
-    # Специальная обработка DROPS_SET_TIMER
-    if var_name == 'DROPS_SET_TIMER':
-        var_data = convert_iso_to_seconds(var_data)
-    
-    data_dict[key][var_name] = var_data
-
-logging.info("Данные успешно объединены в словарь")
-
-# Создаем DataFrame
-try:
-    df = pd.DataFrame.from_dict(data_dict, orient='index')
-    logging.info("DataFrame успешно создан из словаря")
-except Exception as e:
-    logging.error(f"Ошибка при создании DataFrame: {e}")
-    raise
-
-# Сортируем данные по DateTime
-try:
-    df = df.sort_values(by='DateTime').drop(columns=['DateTime'])
-    logging.info("Данные успешно отсортированы по времени")
-except Exception as e:
-    logging.error(f"Ошибка при сортировке данных: {e}")
-    raise
+        logging.error(f"Ошибка при создании DataFrame: {e}")
+        raise
 
-# Преобразуем DROPS_SCORE в числовой формат
-try:
-    df['DROPS_SCORE'] = pd.to_numeric(df['DROPS_SCORE'], errors='coerce').astype('Int64')
-    logging.info("Столбец DROPS_SCORE успешно преобразован в числовой формат")
-except Exception as e:
-    logging.error(f"Ошибка при преобразовании DROPS_SCORE: {e}")
-    raise
+    # Сортируем данные по DateTime
+    try:
+        df = df.sort_values(by='DateTime')
+        logging.info("Данные успешно отсортированы по времени")
+    except Exception as e:
+        logging.error(f"Ошибка при сортировке данных: {e}")
+        raise
+
+    return df
+
+# Разбор временных меток и отбор событий внутри периода: метки разбираются
+# один раз для всего столбца, период отбирается булевой маской.
+# after - отметка уже обработанных данных, берутся только более новые события
+def parse_events(df, start, end, after=None):
+    # Удаляем микросекунды и разбираем весь столбец за один вызов
+    raw_ts = df['timestamp'].astype(str).str.split('.', n=1).str[0]
+    timestamps = parse_timestamps(raw_ts)
+
+    invalid_count = int(timestamps.isna().sum())
+    if invalid_count:
+        logging.warning(f"Пропущено некорректных временных меток: {invalid_count}")
+
+    # Оставляем только записи внутри периода
+    mask = timestamps.notna()
+    if start is not None:
+        mask &= timestamps >= start
+    if end is not None:
+        mask &= timestamps <= end
+    if after is not None:
+        mask &= timestamps > after
+    events = pd.DataFrame({
+        'DateTime': timestamps[mask],
+        'var_name': df.loc[mask, 'var_name'],
+        'var_data': df.loc[mask, 'var_data']
+    })
+    logging.debug(f"Пропущено записей вне периода: {int((~mask).sum()) - invalid_count}")
+    return events.dropna(subset=['var_name'])
+
+# Разворачивание событий в таблицу: var_name становятся колонками одним pivot
+def pivot_events(events):
+    # Внутри одной секунды побеждает последнее значение переменной, как в построчном обходе
+    events = events.drop_duplicates(subset=['DateTime', 'var_name'], keep='last')
+
+    # Индекс после pivot сразу отсортирован по времени
+    wide = events.pivot(index='DateTime', columns='var_name', values='var_data')
+    wide.columns.name = None
+
+    # Специальная обработка длительностей (DROPS_SET_TIMER)
+    wide = decode_duration_columns(wide)
+
+    # Восстанавливаем Date и Time из индекса
+    dates, times = format_datetime(wide.index)
+    wide.insert(0, 'Date', dates.values)
+    wide.insert(1, 'Time', times.values)
+    # DateTime остается отдельной колонкой для отметок и не попадает в файлы
+    return wide.reset_index()
+
+# Колоночное объединение всей выгрузки
+def pivot_columns(df, start, end, after=None):
+    wide = pivot_events(parse_events(df, start, end, after))
+    logging.info("Данные успешно развернуты по переменным")
+    return wide
+
+# Разбиение событий на независимые части по дням (или по N часов).
+# Одна секунда целиком попадает в одну часть, поэтому части разворачиваются отдельно
+def split_partitions(events, hours):
+    keys = events['DateTime'].dt.floor(f'{hours}h')
+    return [part for _, part in events.groupby(keys, sort=True)]
+
+# Параллельное разворачивание частей в пуле процессов.
+# Части отсортированы по времени, поэтому результаты просто склеиваются по порядку
+def parallel_pivot(events, jobs, hours):
+    partitions = split_partitions(events, hours)
+    logging.info(f"Выгрузка разбита на {len(partitions)} частей по {hours} ч, процессов: {jobs}")
+    if not partitions:
+        return pivot_events(events)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return pd.concat(pool.map(pivot_events, partitions), ignore_index=True)
+
+# Оценка размера порции по ограничению памяти
+def estimate_chunksize(path, max_memory_mb):
+    sample = pd.read_csv(path, nrows=10000, dtype=read_dtypes)
+    if sample.empty:
+        return 10000
+    bytes_per_row = sample.memory_usage(deep=True).sum() / len(sample)
+    # Порция, её события и развернутая таблица живут в памяти одновременно
+    return max(1000, int(max_memory_mb * 1024 * 1024 / (bytes_per_row * 4)))
+
+# Потоковое объединение: выгрузка читается порциями, каждая порция
+# разворачивается отдельно. События последней секунды порции переносятся
+# в следующую, чтобы строка одной секунды не разбилась на две
+def stream_pivot(path, chunksize, start, end, after=None):
+    carry = None
+    last_written = None
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype=read_dtypes):
+        events = parse_events(chunk, start, end, after)
+        if carry is not None:
+            events = pd.concat([carry, events])
+        if events.empty:
+            yield None, len(chunk)
+            continue
+
+        if last_written is not None and events['DateTime'].min() <= last_written:
+            logging.warning(f"Выгрузка не отсортирована: записи до {last_written} встретились повторно")
+
+        last_ts = events['DateTime'].max()
+        tail = events['DateTime'] == last_ts
+        carry = events[tail]
+        ready = events[~tail]
+        if not ready.empty:
+            last_written = ready['DateTime'].max()
+            yield pivot_events(ready), len(chunk)
+        else:
+            yield None, len(chunk)
+
+    if carry is not None and not carry.empty:
+        yield pivot_events(carry), 0
+
+# Колонки файла темы: только существующие, Date и Time в начале
+def topic_columns(df, columns):
+    existing_cols = [col for col in columns if col in df.columns]
+    return ['Date', 'Time'] + [col for col in existing_cols if col not in ['Date', 'Time']]
 
 # Сохраняем в файлы с требуемыми колонками
-def save_dataframe(columns, filename):
+def save_dataframe(df, columns, filename, append=False, fmt='csv'):
     try:
-        # Берем только существующие колонки
-        existing_cols = [col for col in columns if col in df.columns]
-        # Добавляем Date и Time в начало
-        final_cols = ['Date', 'Time'] + [col for col in existing_cols if col not in ['Date', 'Time']]
-        # Создаем DataFrame
-        output_df = df[final_cols].copy()  # Используем .copy() для избежания SettingWithCopyWarning
-        
-        # Заполняем пропуски в зависимости от типа данных
+        final_cols = topic_columns(df, columns)
+
+        # Колоночные форматы хранят типизированные значения и метку времени вместо Date/Time
+        if fmt != 'csv':
+            output_path = write_table(df[final_cols + ['DateTime']], Path(output_dir) / filename, fmt, append=append)
+            logging.info(f"Файл {filename} успешно сохранен в {output_path}")
+            return
+
+        # Создаем DataFrame и приводим известные переменные к типам схемы
+        output_df = apply_schema(df[final_cols].copy())  # Используем .copy() для избежания SettingWithCopyWarning
+
+        # Заполняем пропуски в зависимости от типа данных.
+        # Типизированные по схеме колонки пишутся с пустыми пропусками
         for col in output_df.columns:
-            if output_df[col].dtype == 'Int64':  # Для целочисленных столбцов
-                output_df.loc[:, col] = output_df[col].fillna(pd.NA)  # Используем .loc
-            elif output_df[col].dtype == 'float64':  # Для числовых столбцов
+            if output_df[col].dtype == 'float64':  # Для числовых столбцов
                 output_df.loc[:, col] = output_df[col].fillna(0).astype(float)  # Заменяем NaN на 0
-            else:  # Для остальных столбцов
+            elif output_df[col].dtype == object:  # Для строковых столбцов
                 output_df.loc[:, col] = output_df[col].fillna('').astype(str)  # Заменяем NaN на пустую строку
-        
+
         # Сохраняем файл
         output_path = Path(output_dir) / filename
-        output_df.to_csv(output_path, index=False)
-        logging.info(f"Файл {filename} успешно сохранен в {output_path}")
+        if append:
+            output_df.to_csv(output_path, index=False, mode='a', header=False)
+            logging.debug(f"В файл {filename} дописано {len(output_df)} строк")
+        else:
+            output_df.to_csv(output_path, index=False)
+            logging.info(f"Файл {filename} успешно сохранен в {output_path}")
     except Exception as e:
         logging.error(f"Ошибка при сохранении файла {filename}: {e}")
         raise
 
-# Сохраняем все файлы
-save_dataframe(['Date', 'Time', 'DROPS_SCORE', 'SET_BURNERS_TEMP', 
-                'ACTUAL_BURNERS_TEMP', 'TOP_TEMP', 'MID_TEMP', 'BOTTOM_TEMP'], 'temps.csv')
+# Совмещенный этап: развернутая таблица один раз приводится к типам (как при
+# чтении файлов тем), один раз сворачивается по минутам и режется на минутные
+# таблицы тем, которые сразу пишутся в выходную директорию
+def save_minute_tables(df, fmt):
+    topics = {filename: topic_columns(df, columns) for filename, columns in output_files.items()}
+    used = []
+    for columns in topics.values():
+        used += [col for col in columns if col not in used]
+    typed = coerce_types(apply_schema(df[used + ['DateTime']].copy()))
+    for filename, table in minute_tables(typed, topics).items():
+        output_path = write_table(table, Path(output_dir) / minute_filename(filename), fmt)
+        logging.info(f"Минутная таблица {minute_filename(filename)} ({len(table)} строк) сохранена в {output_path}")
+
+# Приведение порции к единому набору и типам колонок, чтобы дописываемые
+# порции совпадали с заголовком файла
+def align_columns(df):
+    all_columns = []
+    for columns in output_files.values():
+        all_columns += [col for col in columns if col not in all_columns]
+    for col in all_columns:
+        if col not in df.columns:
+            df[col] = None
+    for col in duration_variables:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(float)
+    return df
+
+# Преобразуем DROPS_SCORE в числовой формат
+def convert_drops_score(df):
+    try:
+        df['DROPS_SCORE'] = pd.to_numeric(df['DROPS_SCORE'], errors='coerce').astype('Int64')
+        logging.debug("Столбец DROPS_SCORE успешно преобразован в числовой формат")
+    except Exception as e:
+        logging.error(f"Ошибка при преобразовании DROPS_SCORE: {e}")
+        raise
+    return df
+
+# Загрузка отметок: для каждого выходного файла время последней записанной строки
+def load_watermarks():
+    path = Path(output_dir) / watermarks_file
+    if not path.exists():
+        return {}
+    with open(path, 'r') as f:
+        marks = json.load(f)
+    return {filename: pd.Timestamp(value) for filename, value in marks.items()}
+
+def save_watermarks(watermarks):
+    path = Path(output_dir) / watermarks_file
+    with open(path, 'w') as f:
+        json.dump({filename: value.isoformat() for filename, value in watermarks.items()}, f, indent=2)
+    logging.info(f"Отметки сохранены в {path}")
+
+# Отметка, с которой нужно разбирать выгрузку: самая ранняя среди файлов.
+# Если у какого-то файла отметки нет, он строится заново со всего периода
+def incremental_start(watermarks, fmt):
+    marks = []
+    for filename in output_files:
+        if filename not in watermarks or not table_path(Path(output_dir) / filename, fmt).exists():
+            return None
+        marks.append(watermarks[filename])
+    return min(marks)
+
+# Запись развернутых порций во все файлы. В инкрементальном режиме в файл
+# дописываются только строки новее его отметки
+def write_outputs(frames, incremental, watermarks, fmt):
+    appending = {filename: incremental and filename in watermarks
+                 and table_path(Path(output_dir) / filename, fmt).exists()
+                 for filename in output_files}
+    events_count = 0
+    rows_count = 0
+    started = time.perf_counter()
+    for wide, chunk_events in frames:
+        events_count += chunk_events
+        if wide is None or wide.empty:
+            continue
+        wide = convert_drops_score(align_columns(wide))
+        rows_count += len(wide)
+        for filename, columns in output_files.items():
+            rows = wide
+            if appending[filename]:
+                rows = wide[wide['DateTime'] > watermarks[filename]]
+                if rows.empty:
+                    continue
+            save_dataframe(rows, columns, filename, append=appending[filename], fmt=fmt)
+            appending[filename] = True
+            watermarks[filename] = rows['DateTime'].max()
+    elapsed = time.perf_counter() - started
+    return events_count, rows_count, elapsed
+
+# Скорость разбора для сравнения режимов
+def report_speed(mode, events_count, rows_count, elapsed):
+    logging.info(f"Режим {mode}: {events_count} событий за {elapsed:.2f} с "
+                 f"({events_count / max(elapsed, 1e-9):.0f} строк/с), получено {rows_count} строк")
+
+# Разбор границы периода из командной строки
+def parse_bound(value, default):
+    if value is None:
+        return default
+    if value.lower() == 'none':
+        return None
+    return pd.Timestamp(value).to_pydatetime()
+
+def main():
+    parser = argparse.ArgumentParser(description='Разбор выгрузки сушилки dryer_data.csv')
+    parser.add_argument('--mode', choices=['pivot', 'rows'], default='pivot',
+                        help='pivot - колоночное объединение, rows - построчный обход (исходный способ)')
+    parser.add_argument('--stream', action='store_true',
+                        help='читать выгрузку порциями и дописывать результат в файлы')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='размер порции в строках (по умолчанию оценивается по --max-memory-mb)')
+    parser.add_argument('--max-memory-mb', type=int, default=256,
+                        help='ограничение памяти на порцию в потоковом режиме, МБ')
+    parser.add_argument('--start', default=None,
+                        help=f'начало периода, например "2024-08-07 22:54:11" (по умолчанию {cutoff_time}, none - без границы)')
+    parser.add_argument('--end', default=None,
+                        help=f'конец периода (по умолчанию {end_time}, none - без границы)')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='число процессов для разворачивания выгрузки по частям')
+    parser.add_argument('--partition-hours', type=int, default=24,
+                        help='размер части для --jobs в часах (по умолчанию сутки)')
+    parser.add_argument('--format', choices=storage_formats, default=storage_format,
+                        help='формат выходных файлов: csv или колоночные parquet/feather')
+    parser.add_argument('--incremental', action='store_true',
+                        help=f'разбирать только события новее отметок из {watermarks_file} и дописывать их в файлы')
+    parser.add_argument('--minutes', action='store_true',
+                        help='сразу строить минутные таблицы тем (*_optimized) вместо посекундных файлов')
+    args = parser.parse_args()
+    if args.jobs > 1 and (args.stream or args.mode == 'rows'):
+        parser.error('--jobs работает только с колоночным разбором без --stream')
+    if args.minutes and (args.stream or args.incremental or args.mode == 'rows'):
+        parser.error('--minutes работает только с колоночным разбором без --stream и --incremental')
+    if args.incremental and args.mode == 'rows':
+        parser.error('--incremental работает только с колоночным разбором')
+
+    start = parse_bound(args.start, cutoff_time)
+    end = parse_bound(args.end, end_time)
+    logging.info(f"Период обработки: {start} - {end}")
+
+    # Создаем выходную директорию
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    logging.info("Создана выходная директория")
+
+    watermarks = load_watermarks() if args.incremental else {}
+    after = incremental_start(watermarks, args.format) if args.incremental else None
+    if after is not None:
+        logging.info(f"Инкрементальный режим: разбираются события после {after}")
+        if end is not None and after >= end:
+            logging.info("Новых данных в периоде нет")
+            return
+
+    if args.stream:
+        chunksize = args.chunksize or estimate_chunksize(input_file_path, args.max_memory_mb)
+        logging.info(f"Потоковый режим: порции по {chunksize} строк (ограничение {args.max_memory_mb} МБ)")
+        frames = stream_pivot(input_file_path, chunksize, start, end, after)
+        mode = 'stream'
+        events_count = 0
+    else:
+        # Прочитайте файл с текущим разделителем (запятая)
+        try:
+            df = pd.read_csv(input_file_path, dtype=read_dtypes)
+            logging.info(f"Файл {input_file_path} успешно загружен")
+        except Exception as e:
+            logging.error(f"Ошибка при чтении файла: {e}")
+            raise
 
-save_dataframe(['Date', 'Time', 'GRAIN_TYPE', 'DROPS_SCORE', 'DRY_MOISTURE', 
-                'DRY_TEMP', 'DRY_NATURE', 'WET_MOISTURE', 'WET_TEMP', 'WET_NATURE'], 'moistures.csv')
+        # Удалите столбец measured, если он существует
+        if 'measured' in df.columns:
+            df = df.drop('measured', axis=1)
+            logging.info("Столбец 'measured' удален")
 
-save_dataframe(['Date', 'Time', 'GRAIN_TYPE', 'DROPS_SCORE', 'ACTUAL_BURNERS_TEMP', 
-                'TOP_TEMP', 'MID_TEMP', 'BOTTOM_TEMP', 'DRY_MOISTURE', 'DRY_TEMP', 
-                'DRY_NATURE', 'WET_MOISTURE', 'WET_TEMP', 'WET_NATURE'], 'moistures_temps.csv')
+        events_count = len(df)
+        started = time.perf_counter()
+        if args.jobs > 1:
+            df = parallel_pivot(parse_events(df, start, end, after), args.jobs, args.partition_hours)
+            report_speed(f'pivot, jobs={args.jobs}', events_count, len(df), time.perf_counter() - started)
+        elif args.mode == 'pivot':
+            df = pivot_columns(df, start, end, after)
+            report_speed(args.mode, events_count, len(df), time.perf_counter() - started)
+        else:
+            df = pivot_rows(df, start, end)
+            report_speed(args.mode, events_count, len(df), time.perf_counter() - started)
+            if df.empty:
+                logging.info("Данных в периоде нет, файлы и отметки не изменены")
+                return
 
-save_dataframe(['Date', 'Time', 'DROPS_SCORE', 'DROPS_SET_TIMER', 'SET_BURNERS_TEMP', 
-                'COOLING_TIME', 'BOTTOM_TEMP_LIMIT', 'UPPER_FAN_SET_HZ', 
-                'LOWER_FAN_SET_HZ', 'MID_TEMP_LIMIT'], 'settings.csv')
+            # Построчный режим сохраняет файлы в исходном виде
+            df = convert_drops_score(df)
+            for filename, columns in output_files.items():
+                save_dataframe(df, columns, filename, fmt=args.format)
+            save_watermarks({filename: df['DateTime'].max() for filename in output_files})
+            logging.info("Все файлы успешно обработаны и сохранены")
+            return
 
-save_dataframe(['Date', 'Time', 'DROPS_SCORE', 'FILLING', 'DRYING', 'RECYCLING', 
-                'EMPTY', 'SHUTDOWN', 'STOP', 'COOLING', 'MANUAL'], 'mode.csv')
+        if args.minutes:
+            started = time.perf_counter()
+            save_minute_tables(convert_drops_score(align_columns(df)), args.format)
+            logging.info(f"Минутные таблицы построены за {time.perf_counter() - started:.2f} с")
+            return
+        frames = [(df, 0)]
+        mode = None
 
-save_dataframe(['Date', 'Time', 'DROPS_SCORE', 'MIDDLE_LEVEL_ALARM', 
-                'HIGH_LEVEL_ALARM', 'BURNER_HIGH_ALARM', 'HOPPER_FULL_ALARM', 
-                'LOW_AIR_PRESSURE_ALARM', 'GENERAL_ALARM', 'AIR_OVERHEATED'], 'alarms.csv')
+    chunk_events, rows_count, elapsed = write_outputs(frames, args.incremental, watermarks, args.format)
+    if mode is not None:
+        report_speed(mode, events_count + chunk_events, rows_count, elapsed)
+    if watermarks:
+        save_watermarks(watermarks)
+    logging.info("Все файлы успешно обработаны и сохранены")
 
-logging.info("Все файлы успешно обработаны и сохранены")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
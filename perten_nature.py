@@ -1,12 +1,14 @@
-import pandas as pd
 from pathlib import Path
 
+from storage import read_table, write_table
+from timestamps import format_datetime
+
 # Путь к файлу
 input_file = Path('./input/perten_data.csv')
 output_file = Path('./output/processed_perten_data.csv')
 
-# Загрузка данных
-df = pd.read_csv(input_file)
+# Загрузка данных (DateTime строится при чтении)
+df = read_table(input_file)
 
 # Переименование колонок с добавлением префикса perten_
 rename_columns = {
@@ -21,15 +23,12 @@ df = df.rename(columns=rename_columns)
 df['perten_Nature'] = (df['perten_Nature'] / 100).round(4)
 
 # Приведение даты и времени к формату без миллисекунд
-df['DateTime'] = pd.to_datetime(df['Date'] + ' ' + df['Time'], format='%d-%m-%Y %H:%M:%S', errors='coerce')
 df = df.dropna(subset=['DateTime'])  # Удаляем некорректные временные метки
-df['Date'] = df['DateTime'].dt.strftime('%d-%m-%Y')
-df['Time'] = df['DateTime'].dt.strftime('%H:%M:%S')
-df = df.drop(columns=['DateTime'])
+df['Date'], df['Time'] = format_datetime(df['DateTime'])
 
 # Сортировка по времени
-df = df.sort_values(by=['Date', 'Time'])
+df = df.sort_values('DateTime').drop(columns=['DateTime'])
 
 # Сохранение результата
-df.to_csv(output_file, index=False)
-print(f"Данные обработаны и сохранены в {output_file}")
\ No newline at end of file
+output_path = write_table(df, output_file)
+print(f"Данные обработаны и сохранены в {output_path}")
\ No newline at end of file
@@ -0,0 +1,115 @@
+import json
+from pathlib import Path
+
+import pandas as pd
+
+from timestamps import format_datetime, parse_datetime
+
+# Разбор текстовой выгрузки влагомера Perten AM5200A: строки с табуляциями,
+# колонки по заголовку, после Unit s/n - необязательное сообщение прибора
+# ("Moisture Out of range."). Дата и время иногда слиты в одно поле через пробел
+export_columns = ['Date', 'Time', 'Grain', 'ID', '%mois', 'TW', 'Temp', 'RCR', 'RCI', 'DC', 'DCDC', 'ambt',
+                  'sampt', 'cellwt', 'mago', 'mage', 'mags', 'phso', 'phse', 'phss', 'netw', 'totw', 'emptywt',
+                  'Unit s/n', 'Message']
+float_columns = ['%mois', 'TW', 'Temp', 'RCR', 'RCI', 'DC', 'DCDC', 'ambt']
+int_columns = ['sampt', 'cellwt', 'mago', 'mage', 'mags', 'phso', 'phse', 'phss', 'netw', 'totw', 'emptywt']
+# Без этих значений проба непригодна
+required_columns = ['%mois', 'TW', 'Temp']
+
+# Размер читаемого блока: разбираются только целые строки блока,
+# хвост без перевода строки ждет следующего блока или следующего запуска
+block_size = 8 * 1024 * 1024
+
+# Разбор целых строк выгрузки одной векторной операцией. Строки заголовка
+# и пустые строки пропускаются, некорректные (время не разбирается, нет
+# обязательных значений или число не читается) отбрасываются и считаются по причинам.
+# Возвращает типизированную таблицу и счетчики некорректных строк
+def parse_lines(lines):
+    lines = pd.Series(lines, dtype=object).str.rstrip('\r')
+    lines = lines[(lines.str.strip() != '') & ~lines.str.startswith('Date\t')]
+    malformed = {'time': 0, 'missing': 0, 'number': 0}
+    if lines.empty:
+        return pd.DataFrame(columns=export_columns + ['DateTime']), malformed
+
+    # Слитые дата и время разделяются табуляцией
+    lines = lines.str.replace(r'^(\d{1,2}-\d{1,2}-\d{4}) +(\d{1,2}:\d{2}:\d{2})', r'\1\t\2', regex=True)
+    # Недостающие в блоке колонки (короткие строки, нет сообщения прибора)
+    # добавляются пустыми, поэтому все колонки приводятся к object
+    fields = lines.str.split('\t', expand=True).reindex(columns=range(len(export_columns))).astype(object)
+    fields.columns = export_columns
+    fields = fields.apply(lambda col: col.str.strip()).replace('', None).reset_index(drop=True)
+
+    df = fields.copy()
+    df['DateTime'] = parse_datetime(df.fillna({'Date': '', 'Time': ''}))
+    bad_time = df['DateTime'].isna()
+    bad_number = pd.Series(False, index=df.index)
+    for col in float_columns + int_columns:
+        values = pd.to_numeric(fields[col], errors='coerce')
+        bad_number |= values.isna() & fields[col].notna()
+        if col in int_columns:
+            bad_number |= (values % 1).fillna(0) != 0  # счетчики прибора целые
+        df[col] = values
+    missing = df[required_columns].isna().any(axis=1) & ~bad_number
+
+    malformed = {'time': int(bad_time.sum()),
+                 'missing': int((missing & ~bad_time).sum()),
+                 'number': int((bad_number & ~bad_time).sum())}
+    df = df[~(bad_time | missing | bad_number)].reset_index(drop=True)
+
+    # Метки в формате конвейера, 'N/A' - пустой ID
+    df['Date'], df['Time'] = format_datetime(df['DateTime'])
+    df['ID'] = df['ID'].replace('N/A', None)
+    for col in int_columns:
+        df[col] = df[col].astype('Int64')
+    return df, malformed
+
+# Состояние разбора: байтовое смещение после последней разобранной строки,
+# заголовок файла (по нему видно, что файл заменен) и накопленные счетчики
+def empty_state():
+    return {'offset': 0, 'header': None, 'rows': 0, 'malformed': {'time': 0, 'missing': 0, 'number': 0}}
+
+def load_state(path):
+    path = Path(path)
+    if not path.exists():
+        return empty_state()
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_state(state, path):
+    with open(path, 'w') as f:
+        json.dump(state, f, indent=2)
+
+# Продолжение возможно, если файл не стал короче и заголовок не изменился
+def can_resume(path, state):
+    if not state['offset'] or state['header'] is None:
+        return False
+    path = Path(path)
+    if path.stat().st_size < state['offset']:
+        return False
+    with open(path, 'rb') as f:
+        return f.readline().decode('utf-8', errors='replace').rstrip() == state['header']
+
+# Потоковый разбор выгрузки с байтового смещения: блоки читаются целиком,
+# разбираются только завершенные строки. Отдает (таблица блока, счетчики, смещение
+# после блока); в начале файла заголовок запоминается в state
+def stream_export(path, state, block=block_size):
+    with open(path, 'rb') as f:
+        if not state['offset']:
+            header = f.readline()
+            state['header'] = header.decode('utf-8', errors='replace').rstrip()
+            state['offset'] = len(header)
+        f.seek(state['offset'])
+        offset = state['offset']
+        tail = b''
+        while True:
+            data = f.read(block)
+            if not data:
+                break
+            data = tail + data
+            end = data.rfind(b'\n') + 1
+            tail = data[end:]
+            if not end:
+                continue
+            offset += end
+            df, malformed = parse_lines(data[:end].decode('utf-8', errors='replace').split('\n'))
+            yield df, malformed, offset
@@ -1,6 +1,10 @@
-import pandas as pd
+from datetime import timedelta
 from pathlib import Path
 
+from clock_offset import align_perten
+from matching import grain_status, match_nearest
+from storage import read_table, write_table
+
 # Пути к файлам
 input_dir = Path('input')
 output_dir = Path('output')
@@ -8,24 +12,27 @@ perten_file = input_dir / 'perten_data_v3.csv'
 moistures_file = input_dir / 'moistures_temps_v1.csv'
 output_file = output_dir / 'moistures_temps_mass.csv'
 
+# Максимальная разница во времени между пробой Perten и строкой сушилки
+match_tolerance = timedelta(hours=1)
+
 # Создаем выходную директорию
 output_dir.mkdir(parents=True, exist_ok=True)
 
-# Загружаем данные
-moistures_df = pd.read_csv(moistures_file)
-perten_df = pd.read_csv(perten_file)
-
-# Преобразование времени в datetime
-def parse_time(df):
-    return pd.to_datetime(df['Date'] + ' ' + df['Time'], format='%d-%m-%Y %H:%M:%S', errors='coerce')
-
-moistures_df['DateTime'] = parse_time(moistures_df)
-perten_df['DateTime'] = parse_time(perten_df)
+# Загружаем данные (DateTime строится при чтении)
+moistures_df = read_table(moistures_file)
+perten_df = read_table(perten_file)
 
 # Очищаем данные от некорректных временных меток
 moistures_df = moistures_df.dropna(subset=['DateTime']).sort_values('DateTime').reset_index(drop=True)
 perten_df = perten_df.dropna(subset=['DateTime']).sort_values('DateTime').reset_index(drop=True)
 
+# Сверяем часы Perten с показаниями, записанными сушилкой: если они расходятся,
+# метки Perten переводятся на часы сушилки с учетом дрейфа
+perten_df, estimate, resorted = align_perten(perten_df, moistures_df)
+if estimate is not None:
+    print(f"Часы Perten сдвинуты на {estimate['offset']:.0f} с (пар показаний: {estimate['pairs']}), "
+          f"строк переставлено: {resorted}")
+
 # Подготавливаем колонки Perten
 perten_df = perten_df.rename(columns={
     'Grain': 'perten_Grain',
@@ -34,26 +41,6 @@ perten_df = perten_df.rename(columns={
     'Temp': 'perten_Temperature'
 })
 
-# Функция для определения статуса зерна
-def classify_grain(row):
-    grain = row['perten_Grain'].lower() if isinstance(row['perten_Grain'], str) else ''
-    moisture = row['perten_Moisture']
-    
-    if grain == 'raps':
-        if moisture > 9.5:
-            return 'wet'
-        elif 7 <= moisture <= 9.5:
-            return 'dry'
-        else:
-            return 'overdry'  # Влажность <7% → пересушено
-    else:
-        if moisture > 14.5:
-            return 'wet'
-        elif 12 <= moisture <= 14.5:
-            return 'dry'
-        else:
-            return 'overdry'  # Влажность <12% → пересушено
-
 # Создаем копию moistures_df для обработки
 combined_df = moistures_df.copy()
 
@@ -64,41 +51,20 @@ combined_df['perten_Nature'] = ''
 combined_df['perten_Temperature'] = ''
 combined_df['Grain_Status'] = ''
 
-# Отслеживаем использованные индексы
-used_moistures = set()
-used_perten = set()
+# Подстановка данных: каждая проба занимает ближайшую по времени свободную строку,
+# пробы дальше match_tolerance от любой свободной строки не подставляются
+matches = match_nearest(perten_df['DateTime'], combined_df['DateTime'], match_tolerance)
+matched = perten_df[matches >= 0]
+rows = matches[matches >= 0]
+for col in ['perten_Grain', 'perten_Moisture', 'perten_Nature', 'perten_Temperature']:
+    combined_df.loc[rows, col] = matched[col].to_numpy()
 
-# Подстановка данных
-for p_idx, p_row in perten_df.iterrows():
-    if p_idx in used_perten:
-        continue  # Пропускаем уже использованные записи Perten
-    
-    # Фильтруем только незаполненные строки
-    available = combined_df[combined_df['perten_Grain'] == '']
-    
-    if available.empty:
-        break  # Нет доступных строк
-    
-    # Находим ближайшую по времени
-    time_diff = (available['DateTime'] - p_row['DateTime']).abs()
-    closest_idx = time_diff.idxmin()
-    
-    # Обновляем данные
-    combined_df.at[closest_idx, 'perten_Grain'] = p_row['perten_Grain']
-    combined_df.at[closest_idx, 'perten_Moisture'] = p_row['perten_Moisture']
-    combined_df.at[closest_idx, 'perten_Nature'] = p_row['perten_Nature']
-    combined_df.at[closest_idx, 'perten_Temperature'] = p_row['perten_Temperature']
-    
-    # Определяем статус зерна
-    combined_df.at[closest_idx, 'Grain_Status'] = classify_grain(p_row)
-    
-    # Помечаем как использованные
-    used_moistures.add(closest_idx)
-    used_perten.add(p_idx)
+# Определяем статус зерна
+combined_df.loc[rows, 'Grain_Status'] = grain_status(matched['perten_Grain'], matched['perten_Moisture'])
 
 # Удаляем временной столбец
 combined_df = combined_df.drop(columns=['DateTime'])
 
 # Сохраняем результат
-combined_df.to_csv(output_file, index=False)
-print(f"Данные сохранены в {output_file}")
\ No newline at end of file
+output_path = write_table(combined_df, output_file)
+print(f"Данные сохранены в {output_path}")
\ No newline at end of file
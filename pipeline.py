@@ -0,0 +1,322 @@
+import argparse
+import ast
+import hashlib
+import json
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from storage import locate_table, storage_format, table_path
+
+# Конвейер обработки: каждый скрипт - этап с объявленными входами и выходами,
+# этапы-копии переносят файлы между output/, input/ и final_data/.
+# Этап пропускается, если хэш его входов, кода (скрипт и локальные модули,
+# которые он импортирует) и параметров совпадает с сохраненным, а выходы
+# не менялись. Поэтому после нового файла Perten пересчитываются только
+# зависящие от него этапы, а этап, выходы которого не изменились, дальше
+# пересчет не передает. Независимые этапы выполняются одновременно (--jobs),
+# вывод каждого этапа пишется в свой лог
+state_file = Path('output') / 'pipeline_state.json'
+log_dir = Path('output') / 'logs'
+
+def stage(name, script, inputs, outputs, args=()):
+    return {'name': name, 'script': script, 'args': list(args), 'inputs': list(inputs), 'outputs': list(outputs)}
+
+# Этап-копия: files - пары (источник, назначение), один источник можно копировать в несколько мест
+def copy_stage(name, files):
+    files = [tuple(pair) for pair in files]
+    return {'name': name, 'copy': files, 'args': [],
+            'inputs': list(dict.fromkeys(source for source, _ in files)), 'outputs': [target for _, target in files]}
+
+stages = [
+    stage('parse', 'parser_data_dryer.py', ['dryer_data.csv'],
+          ['output/temps.csv', 'output/moistures.csv', 'output/moistures_temps.csv',
+           'output/settings.csv', 'output/mode.csv', 'output/alarms.csv']),
+    copy_stage('stage_raw', [('output/moistures_temps.csv', 'input/moistures_temps.csv'),
+                             ('output/settings.csv', 'input/settings.csv'),
+                             ('output/mode.csv', 'input/mode.csv'),
+                             ('output/alarms.csv', 'input/alarms.csv')]),
+    stage('parse_perten', 'data_processor.py', ['input/moisture_Perten_2024.txt'],
+          ['output/perten_data.csv', 'output/perten_export.csv']),
+    copy_stage('stage_perten_raw', [('output/perten_data.csv', 'input/perten_data.csv')]),
+    stage('optimize_mode', 'mode_optimizer.py', ['input/mode.csv'], ['output/mode_optimized.csv']),
+    stage('optimize_settings', 'settings_optimizer.py', ['input/settings.csv'], ['output/settings_optimized.csv']),
+    stage('optimize_alarms', 'alarms_optimizator.py', ['input/alarms.csv'], ['output/alarms_optimized.csv']),
+    stage('optimize_moistures', 'moisture_temps_optimize.py', ['input/moistures_temps.csv'],
+          ['output/moistures_temps_optimized.csv']),
+    copy_stage('stage_minutes', [('output/mode_optimized.csv', 'input/mode_optimized.csv'),
+                                 ('output/moistures_temps_optimized.csv', 'input/moistures_temps_v1.csv')]),
+    stage('date_back', 'date_back.py', ['input/perten_data_v1.csv', 'input/moistures_temps.csv'],
+          ['output/perten_data_shifted.csv', 'output/perten_clock_offset.json']),
+    copy_stage('stage_perten', [('output/perten_data_shifted.csv', 'input/perten_data_v3.csv'),
+                                ('output/perten_data_shifted.csv', 'input/perten_data_shifted.csv')]),
+    stage('perten_classify', 'moisture_separate.py', ['input/perten_data_shifted.csv'],
+          ['output/perten_data_classified.csv']),
+    stage('perten_nature', 'perten_nature.py', ['input/perten_data.csv'], ['output/processed_perten_data.csv']),
+    stage('combine', 'all_data_combine.py',
+          ['input/moistures_temps_v1.csv', 'input/perten_data_v3.csv', 'input/mode_optimized.csv'],
+          ['output/moistures_temps_mass.csv', 'output/mode_intervals.csv'], args=['--incremental']),
+    copy_stage('publish', [('output/moistures_temps_mass.csv', 'final_data/moistures_temps_mass.csv'),
+                           ('output/mode_intervals.csv', 'final_data/mode_intervals.csv'),
+                           ('output/mode_optimized.csv', 'final_data/mode_optimized.csv'),
+                           ('output/settings_optimized.csv', 'final_data/settings_optimized.csv'),
+                           ('output/alarms_optimized.csv', 'final_data/alarms_optimized.csv')]),
+    stage('alarms_segments', 'alarms_segments.py', ['final_data/alarms_optimized.csv'],
+          ['final_data/alarms_segments.csv']),
+    stage('rollups', 'rollups.py', ['final_data/moistures_temps_mass.csv', 'final_data/settings_optimized.csv'],
+          ['final_data/rollups']),
+]
+
+# Граф этапов: для каждого этапа - этапы, выходы которых он читает.
+# Возвращает этапы в порядке зависимостей (при равенстве - в порядке объявления)
+def stage_order(stages):
+    producers = {}
+    for item in stages:
+        for output in item['outputs']:
+            if output in producers:
+                raise ValueError(f"Выход {output} объявлен в этапах {producers[output]} и {item['name']}")
+            producers[output] = item['name']
+    by_name = {item['name']: item for item in stages}
+    depends = {item['name']: {producers[path] for path in item['inputs'] if path in producers} for item in stages}
+
+    order = []
+    done = set()
+    while len(order) < len(stages):
+        ready = [item for item in stages if item['name'] not in done and depends[item['name']] <= done]
+        if not ready:
+            raise ValueError(f"Цикл в графе этапов: {sorted(set(by_name) - done)}")
+        order.append(ready[0])
+        done.add(ready[0]['name'])
+    return order, depends
+
+# Этапы, нужные для целей: сами цели и все этапы выше по графу
+def with_upstream(targets, depends):
+    needed = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in depends:
+            raise ValueError(f"Неизвестный этап: {name}")
+        if name not in needed:
+            needed.add(name)
+            pending.extend(depends[name])
+    return needed
+
+# Файл таблицы с учетом формата хранения (CSV, parquet-каталог, feather)
+def resolve(path):
+    path = Path(path)
+    return locate_table(path) if path.suffix == '.csv' else path
+
+# Хэш содержимого файла или каталога. Хэши кэшируются по размеру и времени
+# изменения, поэтому неизменные большие файлы не перечитываются
+def file_hash(path, cache):
+    path = resolve(path)
+    if not path.exists():
+        return None
+    files = sorted(p for p in path.rglob('*') if p.is_file()) if path.is_dir() else [path]
+    digest = hashlib.sha256()
+    for file in files:
+        stat = file.stat()
+        key = str(file)
+        cached = cache.get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            content = cached[2]
+        else:
+            content_digest = hashlib.sha256()
+            with open(file, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    content_digest.update(block)
+            content = content_digest.hexdigest()
+            cache[key] = [stat.st_size, stat.st_mtime_ns, content]
+        digest.update(file.relative_to(path).as_posix().encode() if path.is_dir() else b'')
+        digest.update(content.encode())
+    return digest.hexdigest()
+
+# Исходники этапа: скрипт и локальные модули, которые он импортирует (рекурсивно)
+def script_sources(script):
+    sources = []
+    pending = [Path(script)]
+    while pending:
+        path = pending.pop()
+        if path in sources or not path.exists():
+            continue
+        sources.append(path)
+        for node in ast.walk(ast.parse(path.read_text(encoding='utf-8'))):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            pending.extend(Path(f"{name.split('.')[0]}.py") for name in names)
+    return sorted(sources)
+
+# Ключ этапа: хэши входов и исходников, параметры и формат хранения
+def stage_key(item, cache):
+    parts = {'args': item['args'], 'format': storage_format,
+             'inputs': {path: file_hash(path, cache) for path in item['inputs']}}
+    if 'script' in item:
+        parts['sources'] = {str(path): file_hash(path, cache) for path in script_sources(item['script'])}
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+def load_state(path=state_file):
+    path = Path(path)
+    if not path.exists():
+        return {'stages': {}, 'files': {}}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_state(state, path=state_file):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(state, f, indent=1)
+
+# Этап актуален: ключ совпадает с сохраненным, выходы на месте и не менялись
+def up_to_date(item, key, state):
+    record = state['stages'].get(item['name'])
+    if record is None or record['key'] != key:
+        return False
+    return all(file_hash(path, state['files']) == record['outputs'].get(path) for path in item['outputs'])
+
+# Копирование таблицы в назначение с тем же форматом хранения
+def copy_file(source, target):
+    source = resolve(source)
+    target = Path(target)
+    if target.suffix == '.csv' and source.suffix != '.csv':
+        target = table_path(target, source.suffix.lstrip('.'))
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if target.is_dir():
+        shutil.rmtree(target)
+    if source.is_dir():
+        shutil.copytree(source, target)
+    else:
+        shutil.copy2(source, target)
+
+# Выполнение этапа с выводом в лог, возвращает длительность в секундах.
+# Скрипт идет отдельным процессом, поэтому этапы не мешают друг другу
+def run_stage(item, log_path):
+    started = time.perf_counter()
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path, 'w', encoding='utf-8') as log:
+        if 'copy' in item:
+            for source, target in item['copy']:
+                copy_file(source, target)
+                print(f"{source} -> {target}", file=log)
+        else:
+            subprocess.run([sys.executable, item['script']] + item['args'], stdout=log, stderr=subprocess.STDOUT,
+                           check=True)
+    return time.perf_counter() - started
+
+# Пробный запуск: какие этапы будут пересчитаны. Выходы пересчитываемых этапов
+# считаются доступными, а их зависимые этапы - устаревшими
+def plan_pipeline(order, depends, needed, forced, state):
+    planned = set()
+    stale = set()
+    for item in order:
+        name = item['name']
+        if name not in needed:
+            continue
+        missing = [p for p in item['inputs'] if p not in planned and not resolve(p).exists()]
+        if missing:
+            print(f"[{name}] нет входов {', '.join(missing)}, этап пропущен")
+        elif name in forced or depends[name] & stale or not up_to_date(item, stage_key(item, state['files']), state):
+            stale.add(name)
+            planned.update(item['outputs'])
+            print(f"[{name}] будет пересчитан")
+        else:
+            print(f"[{name}] актуален")
+    return sorted(stale)
+
+# Запуск конвейера: targets - нужные этапы (по умолчанию все), force - пересчитать
+# их без проверки хэшей, dry_run - только показать, что будет пересчитано,
+# jobs - сколько этапов выполнять одновременно. Этап запускается, как только
+# завершены все этапы, от которых он зависит; хэши и состояние обновляются
+# в основном потоке. После ошибки новые этапы не запускаются
+def run_pipeline(targets=None, force=False, dry_run=False, jobs=1, stages=stages, path=state_file):
+    order, depends = stage_order(stages)
+    needed = with_upstream(targets, depends) if targets else {item['name'] for item in order}
+    forced = set(targets or depends) if force else set()
+    state = load_state(path)
+    if dry_run:
+        return plan_pipeline(order, depends, needed, forced, state)
+
+    pending = [item for item in order if item['name'] in needed]
+    finished = set()
+    running = {}
+    failed = []
+    ran = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        while pending or running:
+            for item in list(pending):
+                name = item['name']
+                if failed or len(running) >= max(jobs, 1):
+                    break
+                if not depends[name] & needed <= finished:
+                    continue
+                pending.remove(item)
+                # Этап без входов (например, нет новой выгрузки) пропускается,
+                # следующие этапы работают с уже имеющимися файлами
+                missing = [p for p in item['inputs'] if not resolve(p).exists()]
+                if missing:
+                    print(f"[{name}] нет входов {', '.join(missing)}, этап пропущен")
+                    finished.add(name)
+                    continue
+                key = stage_key(item, state['files'])
+                if name not in forced and up_to_date(item, key, state):
+                    print(f"[{name}] актуален, пропускаем")
+                    finished.add(name)
+                    continue
+                log_path = log_dir / f'{name}.log'
+                print(f"[{name}] запуск, лог: {log_path}")
+                running[pool.submit(run_stage, item, log_path)] = (item, key, log_path)
+            if not running:
+                if failed:
+                    break
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                item, key, log_path = running.pop(future)
+                name = item['name']
+                try:
+                    seconds = future.result()
+                except (subprocess.CalledProcessError, OSError) as error:
+                    print(f"[{name}] ошибка: {error}, подробности в {log_path}")
+                    failed.append(name)
+                    continue
+                state['stages'][name] = {'key': key, 'seconds': round(seconds, 3),
+                                         'outputs': {p: file_hash(p, state['files']) for p in item['outputs']}}
+                save_state(state, path)
+                print(f"[{name}] готово за {seconds:.1f} с")
+                finished.add(name)
+                ran.append(name)
+
+    print(f"Время конвейера: {time.perf_counter() - started:.1f} с")
+    if failed:
+        raise RuntimeError(f"Этапы завершились с ошибкой: {', '.join(failed)}")
+    return ran
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Запуск конвейера обработки с пересчетом только изменившихся этапов')
+    parser.add_argument('targets', nargs='*', help='этапы, которые нужно получить (по умолчанию все)')
+    parser.add_argument('--force', action='store_true', help='пересчитать указанные этапы без проверки хэшей')
+    parser.add_argument('--dry-run', action='store_true', help='только показать, какие этапы будут пересчитаны')
+    parser.add_argument('--list', action='store_true', help='показать этапы, их входы и выходы')
+    parser.add_argument('--jobs', type=int, default=1, help='сколько независимых этапов выполнять одновременно')
+    args = parser.parse_args()
+
+    if args.list:
+        order, depends = stage_order(stages)
+        for item in order:
+            after = f" (после {', '.join(sorted(depends[item['name']]))})" if depends[item['name']] else ''
+            print(f"{item['name']}{after}")
+            print(f"  входы:  {', '.join(item['inputs'])}")
+            print(f"  выходы: {', '.join(item['outputs'])}")
+    else:
+        ran = run_pipeline(args.targets, args.force, args.dry_run, args.jobs)
+        if not args.dry_run:
+            print(f"Пересчитано этапов: {len(ran)}" + (f" ({', '.join(ran)})" if ran else ''))
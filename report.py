@@ -3,27 +3,44 @@ import plotly.express as px
 import plotly.graph_objects as go
 from dash import Dash, dcc, html, Input, Output
 from pathlib import Path
-from datetime import timedelta, datetime
 import base64
 import io
 
+from modes import mode_intervals
+from storage import locate_table, read_table
+from rollups import choose_level, level_seconds, load_rollup, local_shift_start, local_shift_type
+from segments import interval_hours, interval_index, overlap_periods, segment_lines, value_periods
+from timestamps import to_local
+
 # Пути к файлам
 input_dir = Path('final_data')
 moistures_file = input_dir / 'moistures_temps_mass.csv'
 settings_file = input_dir / 'settings_optimized.csv'
 alarms_segments_file = input_dir / 'alarms_segments.csv'
-
-# Читаем данные
-df = pd.read_csv(moistures_file)
-settings_df = pd.read_csv(settings_file)
-alarms_segments = pd.read_csv(alarms_segments_file)
-
-# Преобразуем DateTime и смещаем на +3 часа
-df['DateTime'] = pd.to_datetime(df['Date'] + ' ' + df['Time'], format='%d-%m-%Y %H:%M:%S') + timedelta(hours=3)
-settings_df['DateTime'] = pd.to_datetime(settings_df['Date'] + ' ' + settings_df['Time'], format='%d-%m-%Y %H:%M:%S') + timedelta(hours=3)
+mode_intervals_file = input_dir / 'mode_intervals.csv'
+
+# Читаем только нужные колонки (DateTime строится при чтении)
+df = read_table(moistures_file, columns=['GRAIN_TYPE', 'DROPS_SCORE', 'ACTUAL_BURNERS_TEMP', 'perten_dry_Moisture',
+                                         'perten_wet_Moisture', 'dry_mass', 'mode'])
+settings_df = read_table(settings_file, columns=['DROPS_SET_TIMER', 'SET_BURNERS_TEMP'])
+alarms_segments = read_table(alarms_segments_file)
+
+# Пирамида агрегатов для графиков по времени: уровни читаются из final_data/rollups
+# (если пирамида не построена, считаются в памяти) и переводятся в местное время
+rollups = {level: load_rollup('moistures_temps_mass', level, source=df) for level in level_seconds}
+for table in rollups.values():
+    table['DateTime'] = to_local(table['DateTime'])
+
+# Переводим DateTime из UTC в местное время сушилки
+df['DateTime'] = to_local(df['DateTime'])
+settings_df['DateTime'] = to_local(settings_df['DateTime'])
 alarms_segments['Start'] = pd.to_datetime(alarms_segments['Start'])
 alarms_segments['End'] = pd.to_datetime(alarms_segments['End'])
 
+# Интервальный индекс алармов и периоды сушки каждого вида зерна для фильтра
+alarms_index = interval_index(alarms_segments)
+grain_periods = {grain: value_periods(df, 'GRAIN_TYPE', grain) for grain in df['GRAIN_TYPE'].dropna().unique()}
+
 # Объединяем данные
 df = df.merge(settings_df[['DateTime', 'DROPS_SET_TIMER', 'SET_BURNERS_TEMP']], on='DateTime', how='left')
 
@@ -43,38 +60,32 @@ df['Moisture_Status'] = df.apply(classify_moisture, axis=1)
 # Поступающая влажность и возврат
 df['Moisture_Diff'] = df['perten_wet_Moisture'] - df['perten_dry_Moisture']
 df['Incoming_Wet'] = df['Moisture_Diff'].apply(lambda x: x if x > 1 else None)
-avg_incoming_wet = df[df['Incoming_Wet'].notna()].groupby('GRAIN_TYPE')['perten_wet_Moisture'].agg(['mean', 'min']).reset_index()
+avg_incoming_wet = df[df['Incoming_Wet'].notna()].groupby('GRAIN_TYPE', observed=True)['perten_wet_Moisture'].agg(['mean', 'min']).reset_index()
 returned_mass = df[df['Moisture_Diff'].notna() & (df['Moisture_Diff'] <= 1)]['dry_mass'].sum()
 
 # Определение смены (день: 8:00-20:00, ночь: 20:00-8:00)
-def get_shift(datetime_obj):
-    hour = datetime_obj.hour
-    date = datetime_obj.date()
-    if 8 <= hour < 20:
-        shift_start = datetime(date.year, date.month, date.day, 8, 0)
-        return shift_start, 'Day'
-    else:
-        if hour < 8:
-            shift_start = datetime(date.year, date.month, date.day, 0, 0) - timedelta(hours=4)  # 20:00 предыдущего дня
-        else:
-            shift_start = datetime(date.year, date.month, date.day, 20, 0)
-        return shift_start, 'Night'
-
-# Добавляем информацию о сменах и считаем массу по сменам
-df['Shift_Start'], df['Shift_Type'] = zip(*df['DateTime'].apply(get_shift))
-shift_productivity = df.groupby(['Shift_Start', 'Shift_Type'])['dry_mass'].sum().reset_index()
-shift_productivity['Shift_Start'] = pd.to_datetime(shift_productivity['Shift_Start'])
-
-# Время работы режимов
-df['Time_Diff'] = df['DateTime'].shift(-1) - df['DateTime']
-df['Time_Diff'] = df['Time_Diff'].fillna(timedelta(seconds=0)).dt.total_seconds() / 3600  # В часы
-mode_times = df.groupby('mode')['Time_Diff'].sum().reset_index()
+df['Shift_Start'] = local_shift_start(df['DateTime'])
+df['Shift_Type'] = local_shift_type(df['Shift_Start'])
+
+# Масса по сменам - уровень смен из пирамиды
+shift_productivity = rollups['shift'][['DateTime', 'Shift_Type', 'dry_mass_sum']].rename(
+    columns={'DateTime': 'Shift_Start', 'dry_mass_sum': 'dry_mass'})
+
+# Время работы режимов: часы суммируются по отрезкам режимов из final_data
+# (если таблица не построена, отрезки строятся по строкам данных)
+if locate_table(mode_intervals_file).exists():
+    mode_intervals_df = read_table(mode_intervals_file)
+    for col in ['Start', 'End']:
+        mode_intervals_df[col] = to_local(pd.to_datetime(mode_intervals_df[col]))
+else:
+    mode_intervals_df = mode_intervals(df)
+mode_times = interval_hours(mode_intervals_df, 'mode').rename('Time_Diff').reset_index()
 total_work_time = mode_times[mode_times['mode'] != 'STOP']['Time_Diff'].sum()
 
 # Сушёное зерно: масса и влажность
-dry_mass_stats = df.groupby('GRAIN_TYPE').agg({'dry_mass': 'sum', 'perten_dry_Moisture': ['min', 'mean']}).reset_index()
+dry_mass_stats = df.groupby('GRAIN_TYPE', observed=True).agg({'dry_mass': 'sum', 'perten_dry_Moisture': ['min', 'mean']}).reset_index()
 dry_mass_stats.columns = ['GRAIN_TYPE', 'Total_Dry_Mass', 'Min_Dry_Moisture', 'Mean_Dry_Moisture']
-moisture_by_grain = df.groupby(['GRAIN_TYPE', 'Moisture_Status'])['dry_mass'].sum().reset_index()
+moisture_by_grain = df.groupby(['GRAIN_TYPE', 'Moisture_Status'], observed=True)['dry_mass'].sum().reset_index()
 
 # Корреляции
 grain_types = df['GRAIN_TYPE'].dropna().unique()
@@ -96,7 +107,7 @@ for grain in grain_types:
 texts = {
     'en': {
         'title': "Grainstate: Grain Drying Analytics",
-        'intro': "This report provides detailed analytics for grain drying performance over the period {} - {} (Local Time, UTC+3), collected using Perten AM5200A and Grainstate systems. Select a grain type below to filter data and receive operator recommendations based on statistical analysis of moisture, mass, and alarm trends.",
+        'intro': "This report provides detailed analytics for grain drying performance over the period {} - {} (Local Time, Europe/Tallinn), collected using Perten AM5200A and Grainstate systems. Select a grain type below to filter data and receive operator recommendations based on statistical analysis of moisture, mass, and alarm trends.",
         'summary': "Key Results",
         'total_mass': "Total dried mass: {:.0f} kg",
         'drops': "Number of drops: {}",
@@ -107,6 +118,7 @@ texts = {
         'mass_pie': "Dried Mass by Grain Type (%)",
         'moisture_bar': "Dried Mass by Moisture Status (kg)",
         'shift_line': "Dried Mass by Shift (kg, Day: 8:00-20:00, Night: 20:00-8:00)",
+        'temp_trend': "Burner Temperature Over Time (°C, interval: {})",
         'dry_moisture_bar': "Dry Moisture by Grain Type (%)",
         'settings_scatter': "Set Temperature vs Dry Moisture",
         'alarms_timeline': "Dryer Alarms Timeline (Segments)",
@@ -131,7 +143,7 @@ texts = {
     },
     'et': {
         'title': "Grainstate: Teravilja kuivatamise analüütika",
-        'intro': "See aruanne annab üksikasjaliku ülevaate teravilja kuivatamise tulemustest perioodil {} - {} (Kohalik aeg, UTC+3), kogutud Perten AM5200A ja Grainstate süsteemide abil. Vali allpool teravilja tüüp, et filtreerida andmeid ja saada operaatori soovitusi, mis põhinevad niiskuse, massi ja häirete statistilisel analüüsil.",
+        'intro': "See aruanne annab üksikasjaliku ülevaate teravilja kuivatamise tulemustest perioodil {} - {} (Kohalik aeg, Europe/Tallinn), kogutud Perten AM5200A ja Grainstate süsteemide abil. Vali allpool teravilja tüüp, et filtreerida andmeid ja saada operaatori soovitusi, mis põhinevad niiskuse, massi ja häirete statistilisel analüüsil.",
         'summary': "Peamised tulemused",
         'total_mass': "Kuivatatud teravilja mass: {:.0f} kg",
         'drops': "Tühjendamiste arv: {}",
@@ -142,6 +154,7 @@ texts = {
         'mass_pie': "Kuivatatud mass teravilja tüübi järgi (%)",
         'moisture_bar': "Kuivatatud mass niiskuse staatuse järgi (kg)",
         'shift_line': "Kuivatatud mass vahetuste järgi (kg, Päev: 8:00-20:00, Öö: 20:00-8:00)",
+        'temp_trend': "Põleti temperatuur ajas (°C, intervall: {})",
         'dry_moisture_bar': "Kuiva niiskus teravilja tüübi järgi (%)",
         'settings_scatter': "Määratud temperatuur vs Kuiv niiskus",
         'alarms_timeline': "Kuivati häirete ajajoon (segmendid)",
@@ -231,6 +244,8 @@ app.layout = html.Div([
     html.Div(id='moisture_data'),
     dcc.Graph(id='shift-line', style=styles['graph']),
     html.Div(id='shift_data'),
+    dcc.Graph(id='temp-trend', style=styles['graph']),
+    html.Div(id='temp_trend_data'),
     dcc.Graph(id='dry-moisture-bar', style=styles['graph']),
     html.Div(id='dry_moisture_data'),
     dcc.Graph(id='settings-scatter', style=styles['graph']),
@@ -266,6 +281,8 @@ app.layout = html.Div([
      Output('moisture_data', 'children'),
      Output('shift-line', 'figure'),
      Output('shift_data', 'children'),
+     Output('temp-trend', 'figure'),
+     Output('temp_trend_data', 'children'),
      Output('dry-moisture-bar', 'figure'),
      Output('dry_moisture_data', 'children'),
      Output('settings-scatter', 'figure'),
@@ -336,6 +353,23 @@ def update_report(lang, selected_grain):
     shift_fig.update_layout(font={'size': 14}, dragmode='pan', xaxis={'tickangle': -45, 'fixedrange': True}, yaxis={'fixedrange': True})
     shift_data = create_download_link(shift_filtered, 'shift_mass.csv', t['download'].format('Dried Mass by Shift'))
 
+    # Тренд температуры горелок: уровень пирамиды выбирается по длине показываемого периода
+    start, end = filtered_df['DateTime'].min(), filtered_df['DateTime'].max()
+    trend_level = choose_level(start, end)
+    trend = rollups[trend_level]
+    trend = trend[(trend['DateTime'] >= start) & (trend['DateTime'] <= end)]
+    trend_fig = go.Figure([
+        go.Scatter(x=trend['DateTime'], y=trend['ACTUAL_BURNERS_TEMP_min'], mode='lines', line={'width': 0},
+                   showlegend=False, hoverinfo='skip'),
+        go.Scatter(x=trend['DateTime'], y=trend['ACTUAL_BURNERS_TEMP_max'], mode='lines', line={'width': 0},
+                   fill='tonexty', fillcolor='rgba(231, 76, 60, 0.2)', name='min-max'),
+        go.Scatter(x=trend['DateTime'], y=trend['ACTUAL_BURNERS_TEMP_mean'], mode='lines',
+                   line={'color': '#e74c3c'}, name='mean')
+    ])
+    trend_fig.update_layout(title=t['temp_trend'].format(trend_level), font={'size': 14}, dragmode='pan', yaxis={'fixedrange': True})
+    trend_data = create_download_link(trend[['DateTime', 'ACTUAL_BURNERS_TEMP_min', 'ACTUAL_BURNERS_TEMP_max', 'ACTUAL_BURNERS_TEMP_mean', 'ACTUAL_BURNERS_TEMP_count']],
+                                      f'burner_temp_{trend_level}.csv', t['download'].format('Burner Temperature'))
+
     dry_moisture_fig = px.bar(filtered_dry_mass, x='GRAIN_TYPE', y=['Mean_Dry_Moisture', 'Min_Dry_Moisture'], 
                               title=t['dry_moisture_bar'], barmode='group', text_auto='.1f')
     dry_moisture_fig.update_layout(font={'size': 14}, dragmode='pan', xaxis={'fixedrange': True}, yaxis={'fixedrange': True})
@@ -349,25 +383,25 @@ def update_report(lang, selected_grain):
     settings_data = create_download_link(filtered_df[['DateTime', 'SET_BURNERS_TEMP', 'perten_dry_Moisture', 'DROPS_SET_TIMER', 'GRAIN_TYPE']], 
                                         'settings_data.csv', t['download'].format('Set Temperature vs Dry Moisture'))
 
-    filtered_alarms = alarms_segments if selected_grain is None else alarms_segments[alarms_segments['Start'].isin(filtered_df['DateTime'])]
+    # Алармы, пересекающиеся с периодами сушки выбранного зерна
+    filtered_alarms = alarms_segments if selected_grain is None else overlap_periods(alarms_index, *grain_periods[selected_grain])
     if filtered_alarms.empty:
         alarms_timeline_fig = go.Figure()
         alarms_timeline_fig.update_layout(title=t['alarms_timeline'], xaxis_title="Time", yaxis_title="Alarm Type", yaxis={'tickmode': 'array', 'tickvals': []})
     else:
         alarms_timeline_fig = go.Figure()
-        alarm_types = filtered_alarms['Alarm_Type'].unique()
+        # Один след на вид аларма: отрезки разделены пропусками
+        alarm_lines = segment_lines(filtered_alarms)
+        alarm_types = list(alarm_lines)
         colors = px.colors.qualitative.Plotly[:len(alarm_types)]
-        for i, alarm_type in enumerate(alarm_types):
-            alarm_data = filtered_alarms[filtered_alarms['Alarm_Type'] == alarm_type]
-            for _, row in alarm_data.iterrows():
-                alarms_timeline_fig.add_trace(go.Scatter(
-                    x=[row['Start'], row['End']],
-                    y=[i, i],
-                    mode='lines',
-                    line=dict(width=10, color=colors[i]),
-                    name=alarm_type,
-                    showlegend=True if row.name == alarm_data.index[0] else False
-                ))
+        for i, (alarm_type, (x, y)) in enumerate(alarm_lines.items()):
+            alarms_timeline_fig.add_trace(go.Scatter(
+                x=x,
+                y=y,
+                mode='lines',
+                line=dict(width=10, color=colors[i]),
+                name=alarm_type
+            ))
         alarms_timeline_fig.update_layout(
             title=t['alarms_timeline'], xaxis_title="Time", yaxis_title="Alarm Type",
             yaxis={'tickmode': 'array', 'tickvals': list(range(len(alarm_types))), 'ticktext': alarm_types, 'fixedrange': True},
@@ -387,7 +421,7 @@ def update_report(lang, selected_grain):
 
     return (t['title'], intro, t['grain_filter'], t['operator_notes'], t['notes_intro'], notes_list,
             t['summary'], total_mass, drops, returned, wet_moisture, wet_moisture_fig, wet_moisture_data,
-            mode_fig, mode_data, mass_fig, mass_data, moisture_fig, moisture_data, shift_fig, shift_data,
+            mode_fig, mode_data, mass_fig, mass_data, moisture_fig, moisture_data, shift_fig, shift_data, trend_fig, trend_data,
             dry_moisture_fig, dry_moisture_data, scatter_fig, settings_data, t['alarms_timeline'], alarms_timeline_fig, alarms_data,
             t['conclusion'], t['conclusion_text'])
 
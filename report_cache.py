@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import shutil
+from pathlib import Path
+
+import plotly.io as pio
+from plotly.basedatatypes import BaseFigure
+
+from storage import locate_table
+
+try:
+    import fcntl
+except ImportError:  # Windows: прогрев без блокировки
+    fcntl = None
+
+# Кэш результатов колбэков отчета. Ключ - имя функции и ее аргументы, результаты
+# лежат в каталоге версии данных, поэтому после обновления final_data
+# (или кода отчета) старые результаты не используются. Кэш на диске общий
+# для всех процессов gunicorn, поверх него - словарь в памяти процесса.
+# GRAINSTATE_REPORT_CACHE задает каталог кэша, off - отключает кэш. Версии
+# лежат в его подкаталоге versions и помечаются файлом-маркером: удаляются
+# только такие каталоги, сам заданный каталог и чужие файлы не трогаются
+cache_setting = os.environ.get('GRAINSTATE_REPORT_CACHE', str(Path('final_data') / 'report_cache'))
+versions_dirname = 'versions'
+version_marker = '.report_cache_version'
+
+# Версия данных: имена, размеры и времена изменения файлов (таблицы ищутся
+# в текущем формате хранения, каталоги - по всем файлам)
+def data_version(paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        path = locate_table(path) if Path(path).suffix == '.csv' else Path(path)
+        files = sorted(p for p in path.rglob('*') if p.is_file()) if path.is_dir() else [path]
+        for file in files:
+            stat = file.stat() if file.exists() else None
+            digest.update(f"{file}|{stat.st_size if stat else -1}|{stat.st_mtime_ns if stat else -1}\n".encode())
+    return digest.hexdigest()[:16]
+
+def results_cache(version, directory=cache_setting):
+    enabled = directory != 'off'
+    path = Path(directory) / versions_dirname / version if enabled else None
+    if enabled:
+        path.mkdir(parents=True, exist_ok=True)
+        (path / version_marker).touch()
+    return {'dir': path, 'memory': {}}
+
+# Каталоги прежних версий, созданные results_cache: имя - версия data_version, есть маркер
+def stale_versions(cache):
+    return [path for path in cache['dir'].parent.iterdir()
+            if path != cache['dir'] and path.is_dir() and re.fullmatch(r'[0-9a-f]{16}', path.name)
+            and (path / version_marker).exists()]
+
+# Удаление прежней версии, если ее не прогревает другой процесс (блокировка свободна).
+# Без fcntl каталоги не удаляются
+def remove_version(path):
+    if fcntl is None:
+        return
+    try:
+        with open(path / '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            shutil.rmtree(path, ignore_errors=True)
+    except OSError:
+        pass
+
+# Фигуры хранятся в виде JSON-словарей: Dash отдает их так же, как объекты
+# Figure, а читаются они без повторной проверки свойств
+def plain(value):
+    if isinstance(value, BaseFigure):
+        return json.loads(pio.to_json(value))
+    return value
+
+def entry_path(cache, args):
+    return cache['dir'] / (hashlib.sha1(repr(args).encode()).hexdigest() + '.pkl')
+
+def load_entry(path):
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+# Атомарная запись: другой процесс видит либо старый файл, либо целый новый
+def store_entry(path, result):
+    temp = path.with_suffix(f'.{os.getpid()}.tmp')
+    with open(temp, 'wb') as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp, path)
+
+# Результат fn(*args): из памяти процесса, с диска или вычисленный заново
+def cached_call(cache, fn, *args):
+    key = (fn.__name__,) + args
+    if key in cache['memory']:
+        return cache['memory'][key]
+    result = None
+    if cache['dir'] is not None:
+        path = entry_path(cache, key)
+        if path.exists():
+            result = load_entry(path)
+    if result is None:
+        result = tuple(plain(value) for value in fn(*args))
+        if cache['dir'] is not None:
+            try:
+                store_entry(path, result)
+            except OSError:
+                pass  # каталог версии удален: результат остается только в памяти
+    cache['memory'][key] = result
+    return result
+
+# Прогрев при старте: все вызовы (fn, *args) вычисляются или читаются с диска.
+# Процессы прогреваются по очереди под блокировкой, поэтому каждый вызов
+# считается один раз, а остальные процессы читают готовые файлы.
+# Каталоги прежних версий данных удаляются
+def warm_cache(cache, calls):
+    if cache['dir'] is None:
+        for fn, *args in calls:
+            cached_call(cache, fn, *args)
+        return
+    with open(cache['dir'] / '.lock', 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        for fn, *args in calls:
+            cached_call(cache, fn, *args)
+        for old in stale_versions(cache):
+            remove_version(old)
@@ -0,0 +1,74 @@
+import pandas as pd
+
+from schema import alarm_variables, mode_variables
+from timestamps import format_datetime
+
+# Правила свертки значений внутри интервала:
+# first - первое непустое, last - последнее непустое, any - было ли истинное, mean - среднее
+resample_rules = ['first', 'last', 'any', 'mean']
+
+# Минутные таблицы тем конвейера (файлы *_optimized): правила свертки по теме.
+# Для флагов режимов берется последнее значение в минуте, аварийный сигнал
+# активен, если был хотя бы раз за минуту, остальные колонки - первое непустое
+minute_rules = {
+    'mode.csv': {col: 'last' for col in mode_variables},
+    'alarms.csv': {col: 'any' for col in alarm_variables},
+}
+# Частоты вентиляторов округляются до 1 знака после запятой
+minute_rounding = {'settings.csv': ['UPPER_FAN_SET_HZ', 'LOWER_FAN_SET_HZ']}
+
+# Свертка таблицы по интервалам (по умолчанию по минутам) с правилом для каждой колонки.
+# rules - {колонка: правило}, остальные колонки сворачиваются правилом default.
+# Ключ - DateTime, округленный вниз до интервала; Date и Time строятся по нему заново
+def resample_minutes(df, rules=None, default='first', freq='min'):
+    rules = rules or {}
+    unknown = (set(rules.values()) | {default}) - set(resample_rules)
+    if unknown:
+        raise ValueError(f"Неизвестные правила свертки: {sorted(unknown)}")
+
+    data = df.dropna(subset=['DateTime'])
+    columns = [col for col in data.columns if col not in ['Date', 'Time', 'DateTime']]
+    key = data['DateTime'].dt.floor(freq)
+    grouped = data[columns].groupby(key, sort=True)
+
+    # Колонки с одинаковым правилом сворачиваются одной агрегацией
+    parts = []
+    for rule in resample_rules:
+        rule_columns = [col for col in columns if rules.get(col, default) == rule]
+        if rule_columns:
+            parts.append(getattr(grouped[rule_columns], rule)())
+    result = pd.concat(parts, axis=1)[columns] if parts else pd.DataFrame(index=grouped.size().index)
+
+    result = result.reset_index(names='DateTime')
+    dates, times = format_datetime(result['DateTime'])
+    result.insert(0, 'Date', dates)
+    result.insert(1, 'Time', times)
+    return result
+
+# Имя минутной таблицы темы: mode.csv -> mode_optimized.csv
+def minute_filename(topic):
+    return topic.replace('.csv', '_optimized.csv')
+
+def round_minutes(topic, result):
+    for col in minute_rounding.get(topic, []):
+        if col in result.columns:
+            result[col] = result[col].round(1)
+    return result
+
+# Минутная таблица темы с ее правилами свертки и округлением
+def minute_table(topic, df):
+    return round_minutes(topic, resample_minutes(df, minute_rules.get(topic), default='first'))
+
+# Минутные таблицы нескольких тем за одну свертку. topics - {тема: колонки}.
+# Правила тем не пересекаются по колонкам, поэтому общая таблица сворачивается
+# один раз и затем режется по темам
+def minute_tables(df, topics):
+    rules = {}
+    for topic in topics:
+        rules.update(minute_rules.get(topic, {}))
+    minutes = resample_minutes(df, rules, default='first')
+    tables = {}
+    for topic, columns in topics.items():
+        table = minutes[[col for col in columns if col in minutes.columns] + ['DateTime']].copy()
+        tables[topic] = round_minutes(topic, table)
+    return tables
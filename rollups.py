@@ -0,0 +1,113 @@
+from datetime import timedelta
+from pathlib import Path
+
+import pandas as pd
+
+from storage import locate_table, read_table, write_table
+from timestamps import format_datetime, from_local, to_local
+
+# Пирамида агрегатов: минуты, 5 минут, часы и смены.
+# Для каждой метрики хранятся min/max/mean/count и sum (сумма нужна для массы
+# и для пересчета среднего на более грубых уровнях)
+rollup_dir = Path('final_data') / 'rollups'
+time_levels = {'1min': 'min', '5min': '5min', '1h': 'h'}
+rollup_levels = list(time_levels) + ['shift']
+rollup_stats = ['min', 'max', 'mean', 'count', 'sum']
+
+# Длительность интервала уровня для выбора по длине периода
+level_seconds = {'1min': 60, '5min': 300, '1h': 3600, 'shift': 12 * 3600}
+
+# Сколько точек график может показать без заметной задержки
+max_points = 2000
+
+# Метрики таблиц конвейера, для которых строится пирамида
+rollup_metrics = {
+    'moistures_temps_mass': ['ACTUAL_BURNERS_TEMP', 'TOP_TEMP', 'MID_TEMP', 'BOTTOM_TEMP',
+                             'perten_dry_Moisture', 'perten_wet_Moisture', 'dry_mass'],
+    'settings_optimized': ['SET_BURNERS_TEMP', 'DROPS_SET_TIMER'],
+}
+
+# Начало смены по местному времени: день 8:00-20:00, ночь 20:00-8:00
+def local_shift_start(local):
+    return (local - timedelta(hours=8)).dt.floor('12h') + timedelta(hours=8)
+
+# Тип смены по местному часу ее начала
+def local_shift_type(local_start):
+    return local_start.dt.hour.map({8: 'Day', 20: 'Night'})
+
+# Начало смены для меток в поясе данных (результат тоже в поясе данных)
+def shift_start(date_time):
+    return from_local(local_shift_start(to_local(date_time)))
+
+# Свертка таблицы в один уровень пирамиды. df - таблица с DateTime в поясе данных
+def rollup(df, metrics, level):
+    data = df.dropna(subset=['DateTime'])
+    metrics = [col for col in metrics if col in data.columns]
+    if level in time_levels:
+        key = data['DateTime'].dt.floor(time_levels[level])
+    elif level == 'shift':
+        key = shift_start(data['DateTime'])
+    else:
+        raise ValueError(f"Неизвестный уровень пирамиды: {level}")
+
+    # min/max остаются в типе метрики, среднее и сумма считаются в float64,
+    # чтобы суммы float32-температур не теряли точность
+    grouped = data.groupby(key, sort=True)
+    exact = data[metrics].astype('float64').groupby(key, sort=True)
+    stats = {'min': grouped[metrics].min(), 'max': grouped[metrics].max(), 'mean': exact.mean(),
+             'count': grouped[metrics].count(), 'sum': exact.sum()}
+    table = pd.DataFrame({f'{metric}_{stat}': stats[stat][metric] for metric in metrics for stat in rollup_stats})
+    table = table.rename_axis('DateTime').reset_index()
+    if level == 'shift':
+        table.insert(1, 'Shift_Type', local_shift_type(to_local(table['DateTime'])))
+
+    dates, times = format_datetime(table['DateTime'])
+    table.insert(0, 'Date', dates)
+    table.insert(1, 'Time', times)
+    return table
+
+# Путь к уровню пирамиды таблицы
+def rollup_path(name, level):
+    return rollup_dir / f'{name}_{level}.csv'
+
+# Построение и запись всех уровней пирамиды таблицы
+def write_pyramid(name, df, metrics=None):
+    paths = []
+    for level in rollup_levels:
+        paths.append(write_table(rollup(df, metrics or rollup_metrics[name], level), rollup_path(name, level)))
+    return paths
+
+# Самый подробный уровень, который укладывается в max_points на периоде [start, end]
+def choose_level(start, end, points=max_points):
+    span = (end - start).total_seconds()
+    for level, seconds in level_seconds.items():
+        if span / seconds <= points:
+            return level
+    return 'shift'
+
+# Чтение уровня пирамиды. Если уровень не задан, он выбирается по длине периода.
+# Если пирамида не построена, уровень считается в памяти из source
+def load_rollup(name, level=None, start=None, end=None, source=None):
+    if level is None:
+        level = choose_level(start, end)
+    path = rollup_path(name, level)
+    if locate_table(path).exists():
+        table = read_table(path)
+    elif source is not None:
+        table = rollup(source, rollup_metrics[name], level)
+    else:
+        raise FileNotFoundError(f"Уровень {level} пирамиды {name} не найден: {path}")
+
+    if start is not None:
+        table = table[table['DateTime'] >= start]
+    if end is not None:
+        table = table[table['DateTime'] <= end]
+    return table.reset_index(drop=True)
+
+if __name__ == '__main__':
+    # Построение пирамид для итоговых таблиц из final_data
+    rollup_dir.mkdir(parents=True, exist_ok=True)
+    for name in rollup_metrics:
+        source = read_table(Path('final_data') / f'{name}.csv')
+        for path in write_pyramid(name, source):
+            print(f"Уровень пирамиды сохранен в {path}")
@@ -0,0 +1,47 @@
+import logging
+
+import pandas as pd
+
+# Схема типов известных переменных сушилки и производных колонок конвейера.
+# Флаги режимов и алармов - логические, тип зерна и режим - категории,
+# температуры - float32, счетчик сбросов - int32 (с пропусками)
+mode_variables = ['FILLING', 'DRYING', 'RECYCLING', 'EMPTY', 'SHUTDOWN', 'STOP', 'COOLING', 'MANUAL']
+alarm_variables = ['MIDDLE_LEVEL_ALARM', 'HIGH_LEVEL_ALARM', 'BURNER_HIGH_ALARM', 'HOPPER_FULL_ALARM',
+                   'LOW_AIR_PRESSURE_ALARM', 'GENERAL_ALARM', 'AIR_OVERHEATED']
+category_variables = ['GRAIN_TYPE', 'mode', 'tested', 'Alarm_Type']
+temperature_variables = ['SET_BURNERS_TEMP', 'ACTUAL_BURNERS_TEMP', 'TOP_TEMP', 'MID_TEMP', 'BOTTOM_TEMP',
+                         'DRY_TEMP', 'WET_TEMP', 'BOTTOM_TEMP_LIMIT', 'MID_TEMP_LIMIT',
+                         'perten_dry_Temperature', 'perten_wet_Temperature']
+
+schema = {}
+schema.update({col: 'boolean' for col in mode_variables + alarm_variables})
+schema.update({col: 'category' for col in category_variables})
+schema.update({col: 'float32' for col in temperature_variables})
+schema['DROPS_SCORE'] = 'Int32'
+
+# Значения флагов: строки из сырых данных и уже логические значения
+flag_values = {'true': True, 'false': False, 'True': True, 'False': False, True: True, False: False}
+
+# Приведение флага к логическому типу, нераспознанные значения - пропуски
+def to_flags(values):
+    if pd.api.types.is_bool_dtype(values):
+        return values.astype('boolean')
+    return values.map(flag_values).astype('boolean')
+
+# Приведение известных колонок к типам схемы. Колонки, которые не удается
+# привести (например, дробный DROPS_SCORE), остаются как есть
+def apply_schema(df):
+    for col, dtype in schema.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        values = df[col]
+        try:
+            if dtype == 'boolean':
+                df[col] = to_flags(values)
+            elif dtype == 'category':
+                df[col] = values.where(values != '').astype('category')
+            else:
+                df[col] = pd.to_numeric(values.replace('', None), errors='coerce').astype(dtype)
+        except (TypeError, ValueError) as e:
+            logging.warning(f"Колонка {col} не приведена к типу {dtype}: {e}")
+    return df
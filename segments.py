@@ -0,0 +1,182 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Отрезки непрерывной активности логических сигналов (алармы, флаги режимов).
+# df - таблица, отсортированная по времени, columns - логические колонки,
+# пропуски считаются неактивными. Отрезок начинается на первой строке с истинным
+# значением и заканчивается на последней строке перед ложным (или на конце таблицы).
+# Границы находятся разностью соседних строк сразу по всем колонкам:
+# +1 - начало отрезка, -1 - строка после его конца
+def signal_segments(df, columns, label='Alarm_Type', time_column='DateTime'):
+    active = df[columns].fillna(False).to_numpy(dtype=bool)
+    padding = np.zeros((1, len(columns)), dtype=np.int8)
+    edges = np.diff(np.vstack([padding, active.astype(np.int8), padding]), axis=0)
+
+    # Транспонирование дает порядок: по колонкам, внутри колонки - по времени
+    column_idx, starts = np.nonzero(edges.T == 1)
+    _, stops = np.nonzero(edges.T == -1)
+
+    times = df[time_column].to_numpy()
+    segments = pd.DataFrame({
+        label: np.asarray(columns, dtype=object)[column_idx],
+        'Start': times[starts],
+        'End': times[stops - 1],
+    })
+    segments['Duration'] = (segments['End'] - segments['Start']).dt.total_seconds() / 60  # в минутах
+    return segments
+
+# Онлайн-детектор отрезков: состояние хранит время последней обработанной строки
+# и начала открытых (еще продолжающихся на этой строке) отрезков по сигналам.
+# Состояние сохраняется в JSON, поэтому после перезапуска обработка продолжается
+# ровно с того места, где остановилась
+def empty_state():
+    return {'last_time': None, 'open': {}}
+
+def load_state(path):
+    path = Path(path)
+    if not path.exists():
+        return empty_state()
+    with open(path, 'r') as f:
+        state = json.load(f)
+    return {'last_time': pd.Timestamp(state['last_time']) if state['last_time'] else None,
+            'open': {col: pd.Timestamp(start) for col, start in state['open'].items()}}
+
+def save_state(state, path):
+    last_time = state['last_time']
+    with open(path, 'w') as f:
+        json.dump({'last_time': last_time.isoformat() if last_time is not None else None,
+                   'open': {col: start.isoformat() for col, start in state['open'].items()}}, f, indent=2)
+
+# Открытые отрезки состояния: конец - последняя обработанная строка
+def open_segments(state, label='Alarm_Type'):
+    segments = pd.DataFrame({label: list(state['open']),
+                             'Start': pd.to_datetime(list(state['open'].values())),
+                             'End': pd.to_datetime([state['last_time']] * len(state['open']))})
+    segments['Duration'] = (segments['End'] - segments['Start']).dt.total_seconds() / 60
+    return segments
+
+# Обработка новых строк (минутных или посекундных), более поздних, чем в состоянии.
+# Открытые отрезки переносятся строкой-продолжением на время последней обработанной
+# строки, поэтому результат по частям совпадает с signal_segments по всей таблице.
+# Возвращает закрытые отрезки, открытые отрезки и новое состояние
+def update_segments(state, df, columns, label='Alarm_Type', time_column='DateTime'):
+    last_time = state['last_time']
+    rows = df.dropna(subset=[time_column])
+    if last_time is not None:
+        rows = rows[rows[time_column] > last_time]
+    if rows.empty:
+        return signal_segments(rows, columns, label, time_column), open_segments(state, label), state
+
+    data = rows[[time_column] + columns]
+    if last_time is not None:
+        carry = pd.DataFrame({time_column: [last_time], **{col: [col in state['open']] for col in columns}})
+        data = pd.concat([carry, data], ignore_index=True)
+    segments = signal_segments(data, columns, label, time_column)
+
+    # Продолженные отрезки начинаются с сохраненного начала
+    if last_time is not None:
+        carried = segments['Start'] == last_time
+        starts = pd.to_datetime(segments[label].map(state['open']))
+        segments['Start'] = segments['Start'].mask(carried, starts)
+        segments['Duration'] = (segments['End'] - segments['Start']).dt.total_seconds() / 60
+
+    new_last = data[time_column].iloc[-1]
+    still_open = segments['End'] == new_last
+    closed = segments[~still_open].reset_index(drop=True)
+    opened = segments[still_open].reset_index(drop=True)
+    state = {'last_time': new_last, 'open': dict(zip(opened[label], opened['Start']))}
+    return closed, opened, state
+
+# Интервальный индекс отрезков: отрезки отсортированы по началу, для каждой
+# позиции хранится максимум концов среди отрезков до нее включительно.
+# Максимум концов не убывает, поэтому границы кандидатов для окна [t0, t1]
+# находятся двумя двоичными поисками, а точная проверка идет только внутри них
+def interval_index(segments):
+    data = segments.sort_values('Start', kind='stable')
+    return {'segments': data,
+            'start': data['Start'].to_numpy(),
+            'end': data['End'].to_numpy(),
+            'max_end': np.maximum.accumulate(data['End'].to_numpy()) if len(data) else data['End'].to_numpy()}
+
+# Границы кандидатов: до lo все концы раньше t0, с hi все начала позже t1
+def candidate_bounds(index, t0, t1):
+    lo = np.searchsorted(index['max_end'], np.asarray(t0, dtype='datetime64[ns]'), side='left')
+    hi = np.searchsorted(index['start'], np.asarray(t1, dtype='datetime64[ns]'), side='right')
+    return lo, hi
+
+# Отрезки, пересекающие окно [t0, t1], в исходном порядке таблицы
+def overlap_window(index, t0, t1):
+    lo, hi = candidate_bounds(index, t0, t1)
+    if lo >= hi:
+        return index['segments'].iloc[0:0]
+    window = index['end'][lo:hi] >= np.datetime64(t0, 'ns')
+    return index['segments'].iloc[lo:hi][window].sort_index()
+
+# Отрезки, пересекающие хотя бы один из периодов (starts, ends - отсортированные
+# непересекающиеся периоды, например время сушки одного вида зерна).
+# Кандидаты всех периодов собираются разностным массивом, затем для каждого
+# кандидата проверяется последний период, начавшийся не позже его конца
+def overlap_periods(index, starts, ends):
+    starts = np.asarray(starts, dtype='datetime64[ns]')
+    ends = np.asarray(ends, dtype='datetime64[ns]')
+    count = len(index['start'])
+    if not count or not len(starts):
+        return index['segments'].iloc[0:0]
+    lo, hi = candidate_bounds(index, starts, ends)
+    valid = lo < hi
+    marks = np.zeros(count + 1, dtype=np.int64)
+    np.add.at(marks, lo[valid], 1)
+    np.add.at(marks, hi[valid], -1)
+    candidates = np.flatnonzero(np.cumsum(marks[:-1]) > 0)
+
+    period = np.searchsorted(starts, index['end'][candidates], side='right') - 1
+    hit = (period >= 0) & (ends[np.maximum(period, 0)] >= index['start'][candidates])
+    return index['segments'].iloc[candidates[hit]].sort_index()
+
+# Периоды, когда колонка равна значению (например, сушка одного вида зерна):
+# отрезки подряд идущих строк с этим значением
+def value_periods(df, column, value, time_column='DateTime'):
+    flags = pd.DataFrame({time_column: df[time_column], column: (df[column] == value).fillna(False)})
+    periods = signal_segments(flags, [column], time_column=time_column)
+    return periods['Start'].to_numpy(), periods['End'].to_numpy()
+
+# Отрезки подряд идущих строк с одинаковым значением колонки (например, режима).
+# Отрезок длится до первой строки следующего отрезка, последний - до последней
+# строки таблицы, поэтому сумма длительностей по значению равна сумме интервалов
+# между соседними строками. Отрезки с пустым значением не возвращаются
+def value_intervals(df, column, time_column='DateTime'):
+    data = df.dropna(subset=[time_column])
+    codes, _ = pd.factorize(data[column], use_na_sentinel=True)
+    times = data[time_column].to_numpy()
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.zeros(0, dtype=np.int64)
+    ends = np.r_[starts[1:], len(codes) - 1] if len(codes) else starts
+    intervals = pd.DataFrame({column: data[column].iloc[starts].to_numpy(),
+                              'Start': times[starts], 'End': times[ends]})
+    intervals['Duration'] = (intervals['End'] - intervals['Start']).dt.total_seconds() / 60  # в минутах
+    return intervals[codes[starts] >= 0].reset_index(drop=True)
+
+# Суммарные часы по значениям отрезков в окне [start, end] (границы необязательны):
+# отрезки обрезаются по окну и суммируются без прохода по строкам
+def interval_hours(intervals, column, start=None, end=None):
+    starts = intervals['Start'] if start is None else intervals['Start'].clip(lower=start)
+    ends = intervals['End'] if end is None else intervals['End'].clip(upper=end)
+    hours = ((ends - starts).dt.total_seconds() / 3600).clip(lower=0)
+    return hours.groupby(intervals[column], observed=True).sum()
+
+# Линии отрезков для графика: для каждого значения колонки (в порядке первого
+# появления) - x и y, в которых отрезки [Start, End] разделены пропусками.
+# Отрезки значения рисуются одним следом на высоте его номера, поэтому число
+# следов не растет с числом отрезков
+def segment_lines(segments, label='Alarm_Type'):
+    lines = {}
+    for position, (value, group) in enumerate(segments.groupby(label, sort=False, observed=True)):
+        x = np.full(len(group) * 3, np.datetime64('NaT'), dtype='datetime64[ns]')
+        x[0::3] = group['Start'].to_numpy(dtype='datetime64[ns]')
+        x[1::3] = group['End'].to_numpy(dtype='datetime64[ns]')
+        y = np.full(len(group) * 3, float(position))
+        y[2::3] = np.nan
+        lines[value] = (pd.Series(x), y)
+    return lines
@@ -0,0 +1,158 @@
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from schema import apply_schema
+from timestamps import format_datetime, parse_datetime
+
+# Формат хранения таблиц конвейера: csv, parquet или feather.
+# Задается переменной окружения GRAINSTATE_STORAGE, по умолчанию CSV
+storage_format = os.environ.get('GRAINSTATE_STORAGE', 'csv')
+storage_formats = ['csv', 'parquet', 'feather']
+
+# Путь к таблице в заданном формате
+def table_path(path, fmt=None):
+    return Path(path).with_suffix('.' + (fmt or storage_format))
+
+# Поиск существующей таблицы: явно указанный колоночный файл берется как есть,
+# иначе сначала ищется текущий формат, затем остальные
+def locate_table(path):
+    path = Path(path)
+    if path.suffix in ('.parquet', '.feather') and path.exists():
+        return path
+    for fmt in [storage_format] + storage_formats:
+        candidate = table_path(path, fmt)
+        if candidate.exists():
+            return candidate
+    return path
+
+# Приведение строковых колонок к типам: 'true'/'false' - логические,
+# числа - float, остальное остается строками
+def coerce_types(df):
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        values = df[col].replace('', None).dropna()
+        lowered = values.astype(str).str.lower()
+        if lowered.isin(['true', 'false']).all():
+            df[col] = df[col].astype(str).str.lower().map({'true': True, 'false': False}).astype('boolean')
+        elif pd.to_numeric(values, errors='coerce').notna().all():
+            df[col] = pd.to_numeric(df[col].replace('', None), errors='coerce')
+    return df
+
+# Подготовка к колоночному хранению: Date и Time заменяются меткой int64 (секунды от эпохи)
+def to_columnar(df):
+    data = df.copy()
+    if 'DateTime' in data.columns:
+        date_time = data.pop('DateTime')
+    elif 'Date' in data.columns and 'Time' in data.columns:
+        date_time = parse_datetime(data)
+    else:
+        return coerce_types(data).reset_index(drop=True)
+
+    data = data.drop(columns=['Date', 'Time'], errors='ignore')
+    seconds = pd.Series(date_time.values.astype('datetime64[s]').astype('int64'), index=data.index)
+    data.insert(0, 'Timestamp', seconds.where(date_time.notna()).astype('Int64'))
+    return coerce_types(data).reset_index(drop=True)
+
+# Восстановление DateTime (и при необходимости Date/Time) из метки
+def from_columnar(df, columns=None):
+    if 'Timestamp' not in df.columns:
+        return df
+    date_time = pd.to_datetime(df.pop('Timestamp'), unit='s').astype('datetime64[ns]')
+    wanted = {'Date', 'Time'} if columns is None else {'Date', 'Time'} & set(columns)
+    if wanted:
+        dates, times = format_datetime(date_time)
+        if 'Date' in wanted:
+            df.insert(0, 'Date', dates)
+        if 'Time' in wanted:
+            df.insert(1 if 'Date' in wanted else 0, 'Time', times)
+    df['DateTime'] = date_time
+    return df
+
+# Имена колонок колоночной таблицы без чтения данных
+def columnar_names(path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    if path.suffix == '.parquet':
+        return pq.ParquetDataset(path).schema.names
+    with pa.memory_map(str(path)) as source:
+        return pa.ipc.open_file(source).schema.names
+
+# Запись таблицы с приведением колонок к схеме. Parquet хранится каталогом
+# частей: дописывание добавляет новую часть, приведенную к типам первой
+# (категории у каждой части свои). Feather дописывания не поддерживает
+# и перезаписывается целиком
+def write_table(df, path, fmt=None, append=False):
+    fmt = fmt or storage_format
+    path = table_path(path, fmt)
+    df = apply_schema(df.copy())
+    if fmt == 'csv':
+        # В CSV время хранится строками Date и Time, DateTime строится при чтении
+        if 'Date' in df.columns and 'Time' in df.columns:
+            df = df.drop(columns=['DateTime'], errors='ignore')
+        df.to_csv(path, index=False, mode='a' if append else 'w', header=not append)
+        return path
+
+    data = to_columnar(df)
+    if fmt == 'parquet':
+        if not append and path.exists():
+            shutil.rmtree(path) if path.is_dir() else path.unlink()
+        path.mkdir(parents=True, exist_ok=True)
+        parts = sorted(path.glob('part-*.parquet'))
+        if parts:
+            dtypes = pd.read_parquet(parts[0]).head(0).dtypes
+            for col in data.columns:
+                if col in dtypes and data[col].dtype != dtypes[col] and not isinstance(dtypes[col], pd.CategoricalDtype):
+                    try:
+                        data[col] = data[col].astype(dtypes[col])
+                    except (TypeError, ValueError):
+                        pass
+        data.to_parquet(path / f'part-{len(parts):05d}.parquet', index=False)
+    elif fmt == 'feather':
+        if append and path.exists():
+            data = apply_schema(pd.concat([pd.read_feather(path), data], ignore_index=True))
+        data.to_feather(path)
+    else:
+        raise ValueError(f"Неизвестный формат хранения: {fmt}")
+    return path
+
+# Чтение таблицы в любом формате с приведением к схеме. columns - нужные колонки,
+# остальные не загружаются. Если в таблице есть время, возвращается колонка DateTime
+def read_table(path, columns=None):
+    path = locate_table(path)
+    if path.suffix == '.csv':
+        usecols = None
+        if columns is not None:
+            wanted = set(columns) | {'Date', 'Time'}
+            usecols = lambda col: col in wanted
+        df = pd.read_csv(path, usecols=usecols)
+        if 'Date' in df.columns and 'Time' in df.columns:
+            df['DateTime'] = parse_datetime(df)
+        return apply_schema(df)
+
+    load = None
+    if columns is not None:
+        names = columnar_names(path)
+        load = [col for col in names if col in columns or col == 'Timestamp']
+    if path.suffix == '.parquet':
+        df = pd.read_parquet(path, columns=load)
+    else:
+        df = pd.read_feather(path, columns=load)
+    return apply_schema(from_columnar(df, columns))
+
+# Выгрузка колоночной таблицы в CSV с колонками Date и Time
+def export_csv(path, output_path=None):
+    df = read_table(path)
+    df = df.drop(columns=['DateTime'], errors='ignore')
+    output_path = Path(output_path) if output_path else table_path(path, 'csv')
+    df.to_csv(output_path, index=False)
+    return output_path
+
+if __name__ == '__main__':
+    # python storage.py final_data/moistures_temps_mass.parquet ... - выгрузка в CSV
+    for name in sys.argv[1:]:
+        print(f"Таблица {name} выгружена в {export_csv(name)}")
@@ -0,0 +1,46 @@
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from timestamps import parse_datetime
+
+repo_dir = Path(__file__).resolve().parent
+sources = ['perten_data_v1.csv', 'moistures_temps.csv', 'moistures_temps_v1.csv', 'mode_optimized.csv']
+
+# Входные таблицы до момента cutoff (данные дописываются по мере сушки)
+def write_inputs(work_dir, cutoff):
+    (work_dir / 'input').mkdir(exist_ok=True)
+    for name in sources:
+        df = pd.read_csv(repo_dir / 'input' / name)
+        df[parse_datetime(df) < pd.Timestamp(cutoff)].to_csv(work_dir / 'input' / name, index=False)
+
+def run(work_dir, script, *args):
+    env = {key: value for key, value in os.environ.items() if key != 'GRAINSTATE_STORAGE'}
+    result = subprocess.run([sys.executable, str(repo_dir / script), *args], cwd=work_dir, env=env,
+                            capture_output=True, text=True, check=True)
+    return result.stdout
+
+# Обновление как в конвейере: date_back заново оценивает сдвиг, результат
+# копируется во вход объединения, объединение идет с --incremental
+def refresh(work_dir, cutoff):
+    write_inputs(work_dir, cutoff)
+    run(work_dir, 'date_back.py')
+    shutil.copy(work_dir / 'output' / 'perten_data_shifted.csv', work_dir / 'input' / 'perten_data_v3.csv')
+    shifted = pd.read_csv(work_dir / 'input' / 'perten_data_v3.csv')
+    return shifted, run(work_dir, 'all_data_combine.py', '--incremental')
+
+# После дописывания данных сдвиг прежних проб пересчитывается, но объединение
+# продолжается с сохраненного состояния, а не строится заново
+def test_incremental_combine_resumes_after_date_back(tmp_path):
+    first, _ = refresh(tmp_path, '2024-08-14')
+    rows = len(pd.read_csv(tmp_path / 'output' / 'moistures_temps_mass.csv'))
+    second, log = refresh(tmp_path, '2024-08-16')
+
+    moved = first.merge(second, on='Perten_DateTime', suffixes=('_first', '_second'))
+    assert (moved['Time_first'] != moved['Time_second']).any()
+    assert 'строим заново' not in log
+    assert len(pd.read_csv(tmp_path / 'output' / 'moistures_temps_mass.csv')) > rows
@@ -0,0 +1,28 @@
+from perten_parser import export_columns, parse_lines, stream_export, empty_state
+
+header = '\t'.join(export_columns[:-1]) + '\t'
+sample = ('26-06-2024\t14:45:49\tNisu\tN/A\t12.88\t81.22\t21.4\t-0.2777\t-0.0342\t3.6138\t3.1262\t25.3\t21152\t3288\t'
+          '33872\t17317\t27077\t16564\t6125\t16344\t4788\t50647\t45859\t1344977')
+
+# Строка без табуляции после Unit s/n: в блоке нет колонки сообщения
+def test_line_without_message():
+    df, malformed = parse_lines([sample])
+    assert len(df) == 1
+    assert df['%mois'].tolist() == [12.88]
+    assert malformed == {'time': 0, 'missing': 0, 'number': 0}
+
+# Блок из одной некорректной строки: колонок меньше, чем в заголовке
+def test_block_with_only_malformed_line():
+    df, malformed = parse_lines(['26-06-2024\t14:45'])
+    assert df.empty
+    assert malformed == {'time': 1, 'missing': 0, 'number': 0}
+
+# Оборванная строка без обязательных значений отбрасывается, разбор продолжается
+def test_truncated_line_in_stream(tmp_path):
+    path = tmp_path / 'export.txt'
+    path.write_text(header + '\n' + sample + '\n' + '\t'.join(sample.split('\t')[:5]) + '\n')
+    state = empty_state()
+    blocks = list(stream_export(path, state))
+    assert sum(len(df) for df, _, _ in blocks) == 1
+    assert blocks[-1][1]['missing'] == 1
+    assert blocks[-1][2] == path.stat().st_size
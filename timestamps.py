@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+# Форматы времени конвейера: колонки Date и Time во всех таблицах
+# и метки в исходной выгрузке сушилки
+date_format = '%d-%m-%Y'
+clock_format = '%H:%M:%S'
+time_format = f'{date_format} {clock_format}'
+source_format = '%Y-%m-%d %H:%M:%S'
+
+# Метки в таблицах хранятся без пояса, в UTC. Для графиков и смен они
+# переводятся в местное время сушилки (летом UTC+3, зимой UTC+2)
+data_timezone = 'UTC'
+local_timezone = 'Europe/Tallinn'
+
+# Перевод наивных меток из пояса данных в местное время (тоже наивное)
+def to_local(date_time, tz=local_timezone):
+    return date_time.dt.tz_localize(data_timezone).dt.tz_convert(tz).dt.tz_localize(None)
+
+# Обратный перевод местного времени в пояс данных
+def from_local(date_time, tz=local_timezone):
+    return date_time.dt.tz_localize(tz).dt.tz_convert(data_timezone).dt.tz_localize(None)
+
+# Сборка DateTime из колонок Date и Time векторными вызовами.
+# Для формата конвейера различных дат всего несколько десятков: они разбираются
+# один раз, а время суток идет быстрым ISO-разбором pandas.
+# Некорректные метки становятся NaT (errors='coerce'), tz - перевод в местное время
+def parse_datetime(df, date_column='Date', time_column='Time', fmt=time_format, tz=None, errors='coerce'):
+    if fmt == time_format:
+        dates = df[date_column]
+        unique_dates = pd.Series(dates.dropna().unique())
+        days = dates.map(dict(zip(unique_dates, pd.to_datetime(unique_dates, format=date_format, errors=errors))))
+        clock = pd.to_datetime('1970-01-01 ' + df[time_column], format='%Y-%m-%d ' + clock_format, errors=errors)
+        date_time = days.astype('datetime64[ns]') + (clock - pd.Timestamp('1970-01-01'))
+    else:
+        date_time = pd.to_datetime(df[date_column] + ' ' + df[time_column], format=fmt, errors=errors)
+    return to_local(date_time, tz) if tz else date_time
+
+# Разбор одного столбца меток (например, timestamp исходной выгрузки)
+def parse_timestamps(values, fmt=source_format, tz=None, errors='coerce'):
+    date_time = pd.to_datetime(values, format=fmt, errors=errors)
+    return to_local(date_time, tz) if tz else date_time
+
+# Обратное разбиение DateTime на строки Date и Time. strftime по строкам
+# медленный, поэтому берем ISO-строки numpy и переставляем части даты
+def format_datetime(date_time):
+    date_time = pd.Series(date_time)
+    iso = pd.Series(np.datetime_as_string(date_time.to_numpy(dtype='datetime64[s]'), unit='s'), index=date_time.index)
+    valid = date_time.notna()
+    dates = (iso.str[8:10] + '-' + iso.str[5:7] + '-' + iso.str[:4]).where(valid)
+    times = iso.str[11:19].where(valid)
+    return dates, times